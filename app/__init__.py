@@ -17,12 +17,20 @@ def create_app(config=None):
         SECRET_KEY=os.environ.get('SECRET_KEY', 'dev_key'),
         SQLALCHEMY_DATABASE_URI=os.environ.get('DATABASE_URL', 'sqlite:///bus_data.db'),
         SQLALCHEMY_TRACK_MODIFICATIONS=False,
+        # Create tables and apply migrations at startup. Read-only web
+        # workers can turn this off when the scraper process owns the schema.
+        DB_AUTO_INIT=os.environ.get('BUS_DB_AUTO_INIT', 'true').lower() in ('1', 'true', 'yes'),
     )
     
     # Override config if provided
     if config:
         app.config.from_mapping(config)
     
+    # Pool settings for PostgreSQL, lock waits for SQLite (pragmas are set
+    # on connect, see app.database)
+    from app.database import engine_options
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config['SQLALCHEMY_DATABASE_URI']))
+    
     # Enable CORS
     CORS(app)
     
@@ -54,7 +62,15 @@ def create_app(config=None):
         app.logger.info('Bus Arrival Dashboard startup')
     
     # Setup database
-    with app.app_context():
-        db.create_all()
+    if app.config['DB_AUTO_INIT']:
+        with app.app_context():
+            init_db()
+    
+    return app
+
+def init_db():
+    """Create missing tables and apply pending migrations"""
+    db.create_all()
     
-    return app
\ No newline at end of file
+    from app.models.migrations import apply_migrations
+    apply_migrations()
\ No newline at end of file
@@ -1,33 +1,83 @@
-from flask import jsonify, current_app
+from flask import json, jsonify, current_app, request, stream_with_context
+from app import db
 from app.api import api_bp
 from app.models.bus_info import BusInfo
-from datetime import datetime
+from app.services.snapshot_cache import (
+    MAX_DESTINATION_BUSES, build_bus_info_snapshot, build_destination_index, destination_index, snapshot_cache
+)
+from app.services.scheduler_state import scheduler_state
+from app.services.stop_config import get_stop_pairs
+from app.services.delay_stats import delay_stats
+from app.services.recent_history import recent_history
+from datetime import datetime, timedelta, timezone
+import base64
+import csv
+import io
+import os
+import time
+
+# Server-Sent Events settings for /bus-info/stream
+SSE_HEARTBEAT_SECONDS = 15
+SSE_RETRY_MILLISECONDS = 5000
+# Streams are closed periodically so workers are not held forever;
+# EventSource reconnects and resumes with Last-Event-ID
+SSE_MAX_STREAM_SECONDS = 30 * 60
+# Each open stream holds a worker thread: keep some threads free for other
+# requests (gunicorn runs each worker with 16 threads, see Dockerfile)
+SSE_MAX_SUBSCRIBERS = int(os.environ.get('BUS_SSE_MAX_SUBSCRIBERS', 12))
+
+# History API settings
+HISTORY_DEFAULT_LIMIT = 100
+HISTORY_MAX_LIMIT = 1000
+HISTORY_STREAM_BATCH_SIZE = 500
+HISTORY_EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+HISTORY_CSV_COLUMNS = [
+    'id', 'created_at', 'origin', 'destination', 'bus_number', 'stop_number',
+    'scheduled_departure_time', 'predicted_departure_time',
+    'scheduled_arrival_time', 'predicted_arrival_time',
+    'estimated_departure_minutes', 'is_next_bus', 'is_active', 'last_seen_at',
+]
+
+# Recent history API settings
+RECENT_DEFAULT_MINUTES = 60
+RECENT_MAX_MINUTES = 24 * 60
+RECENT_MAX_POINTS = 500
 
 @api_bp.route('/bus-info', methods=['GET'])
 def get_bus_info():
     """
     Get the latest bus information for all destinations
+    
+    Optional query parameter ``origin`` limits the result to one stop.
+    The serialized body is served from the snapshot cache, which is
+    rebuilt when a scrape commits. Responses carry an ETag and
+    Last-Modified for the snapshot, answer conditional requests with
+    304, and may be cached until the next scheduled refresh or until the
+    snapshot expires, whichever comes first.
     """
     try:
-        # Get latest active bus info for each destination
-        bus_info = BusInfo.get_latest_active()
-        
-        # Format the response
-        response = {
-            "update_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "system_status": {
-                "data_source": "API",  # This will be updated dynamically in future
-                "last_successful_update": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "health": "OK"
-            },
-            "destinations": []
-        }
+        origin = request.args.get('origin') or None
+        # Only configured origins get a cache entry, so arbitrary query
+        # strings cannot grow the cache
+        if origin is not None and origin not in {pair.origin for pair in get_stop_pairs().values()}:
+            return jsonify({
+                "error": "Unknown origin",
+                "details": f"{origin} is not a configured stop"
+            }), 404
         
-        # Add destinations to response
-        for info in bus_info:
-            response["destinations"].append(info.to_dict())
+        snapshot = snapshot_cache.get(origin, lambda: build_bus_info_snapshot(origin))
         
-        return jsonify(response)
+        response = current_app.response_class(snapshot.body, mimetype='application/json')
+        response.set_etag(snapshot.etag)
+        if snapshot.last_modified:
+            response.last_modified = snapshot.last_modified.replace(tzinfo=timezone.utc)
+        response.cache_control.public = True
+        response.cache_control.max_age = _max_age(snapshot)
+        
+        return response.make_conditional(request)
     
     except Exception as e:
         current_app.logger.error(f"Error retrieving bus info: {str(e)}")
@@ -37,14 +87,189 @@ def get_bus_info():
         }), 500
 
 
+@api_bp.route('/bus-info/<destination>', methods=['GET'])
+def get_destination_bus_info(destination):
+    """
+    Get the upcoming buses (up to 3) for one destination
+    
+    Query parameters:
+    - ``origin``: required when several origins serve the destination
+    - ``limit`` / ``offset``: page through the upcoming buses
+    
+    Served from the per-destination index of pre-serialized payloads,
+    which is rebuilt once per published snapshot.
+    """
+    try:
+        limit = request.args.get('limit', MAX_DESTINATION_BUSES, type=int)
+        offset = request.args.get('offset', 0, type=int)
+        if not 1 <= limit <= MAX_DESTINATION_BUSES:
+            raise ValueError(f"limit must be between 1 and {MAX_DESTINATION_BUSES}")
+        if not 0 <= offset < MAX_DESTINATION_BUSES:
+            raise ValueError(f"offset must be between 0 and {MAX_DESTINATION_BUSES - 1}")
+        origin = request.args.get('origin') or None
+        
+        # Snapshots scraped by another process arrive through the shared file
+        snapshot_cache.sync()
+        payloads = destination_index.lookup(destination, build_destination_index)
+        
+        if origin is None and len(payloads) > 1:
+            raise ValueError(f"{destination} is served from several origins ({', '.join(sorted(payloads))}); specify origin")
+        payload = payloads.get(origin) if origin else next(iter(payloads.values()), None)
+        if payload is None:
+            return jsonify({
+                "error": "Unknown destination",
+                "details": f"No bus information for {destination}" + (f" from {origin}" if origin else "")
+            }), 404
+        
+        snapshot = payload.page(offset, limit)
+        response = current_app.response_class(snapshot.body, mimetype='application/json')
+        response.set_etag(snapshot.etag)
+        if snapshot.last_modified:
+            response.last_modified = snapshot.last_modified.replace(tzinfo=timezone.utc)
+        response.cache_control.public = True
+        response.cache_control.max_age = _max_age(snapshot)
+        
+        return response.make_conditional(request)
+    
+    except ValueError as e:
+        return jsonify({
+            "error": "Invalid bus information parameters",
+            "details": str(e)
+        }), 400
+    
+    except Exception as e:
+        current_app.logger.error(f"Error retrieving bus info for {destination}: {str(e)}")
+        return jsonify({
+            "error": "Failed to retrieve bus information",
+            "details": str(e)
+        }), 500
+
+
+@api_bp.route('/bus-info/stream', methods=['GET'])
+def stream_bus_info():
+    """
+    Push the bus information as Server-Sent Events
+    
+    One ``snapshot`` event (id = snapshot ETag, data = the /bus-info body)
+    is sent per published snapshot, with comment heartbeats in between.
+    A client reconnecting with a Last-Event-ID that matches the current
+    snapshot does not receive it again.
+    
+    At most ``SSE_MAX_SUBSCRIBERS`` streams are served per process; further
+    clients get 503 and fall back to polling /bus-info.
+    """
+    if not snapshot_cache.subscribe(limit=SSE_MAX_SUBSCRIBERS):
+        response = jsonify({
+            "error": "Too many open streams",
+            "details": "Poll /api/bus-info instead"
+        })
+        response.status_code = 503
+        response.headers['Retry-After'] = str(SSE_MAX_STREAM_SECONDS)
+        return response
+    
+    try:
+        snapshot = snapshot_cache.get(None, build_bus_info_snapshot)
+    except Exception as e:
+        snapshot_cache.unsubscribe()
+        current_app.logger.error(f"Error opening bus info stream: {str(e)}")
+        return jsonify({
+            "error": "Failed to open bus information stream",
+            "details": str(e)
+        }), 500
+    
+    last_event_id = request.headers.get('Last-Event-ID')
+    
+    def generate():
+        yield f"retry: {SSE_RETRY_MILLISECONDS}\n\n"
+        
+        current = snapshot
+        if current.etag != last_event_id:
+            yield _format_sse_event(current)
+        
+        deadline = time.monotonic() + SSE_MAX_STREAM_SECONDS
+        while time.monotonic() < deadline:
+            # The request's session is only removed when the stream closes:
+            # return the connection a snapshot build checked out before waiting
+            db.session.remove()
+            update = snapshot_cache.wait_for_update(current.etag, SSE_HEARTBEAT_SECONDS, build_bus_info_snapshot)
+            if update is None:
+                yield ": heartbeat\n\n"
+            else:
+                current = update
+                yield _format_sse_event(current)
+    
+    # Expired snapshots are rebuilt from the database inside the stream
+    response = current_app.response_class(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    # Runs when the response is closed, even if the stream never started
+    response.call_on_close(snapshot_cache.unsubscribe)
+    return response
+
+
+def _max_age(snapshot):
+    """Seconds a response may be cached: until the next refresh, or until the snapshot expires"""
+    max_age = scheduler_state.seconds_until_next_refresh()
+    if snapshot.expires is not None:
+        max_age = min(max_age, max(0, int((snapshot.expires - datetime.now()).total_seconds())))
+    return max_age
+
+
+def _format_sse_event(snapshot):
+    data = "\n".join(f"data: {line}" for line in snapshot.body.decode('utf-8').splitlines())
+    return f"id: {snapshot.etag}\nevent: snapshot\n{data}\n\n"
+
+
 @api_bp.route('/bus-info/history', methods=['GET'])
 def get_bus_history():
     """
-    Get historical bus information from the past 24 hours
+    Get historical bus information
+    
+    Query parameters:
+    - ``from`` / ``to``: ISO 8601 time range (naive values are local time;
+      default: the past 24 hours)
+    - ``origin`` / ``destination``: filter by stop pair
+    - ``limit`` / ``cursor``: keyset pagination for the JSON format
+    - ``format``: ``json`` (default, paginated), or ``ndjson`` / ``csv`` to
+      stream every row in the range
     """
     try:
-        # This will be implemented later
-        return jsonify({"message": "History endpoint not yet implemented"})
+        end = _parse_time_param('to') or datetime.utcnow()
+        start = _parse_time_param('from') or end - timedelta(hours=24)
+        filters = {
+            "start": start,
+            "end": end,
+            "origin": request.args.get('origin') or None,
+            "destination": request.args.get('destination') or None,
+        }
+        output_format = request.args.get('format', 'json')
+        
+        if output_format in HISTORY_EXPORT_FORMATS:
+            return _stream_history(filters, output_format)
+        if output_format != 'json':
+            raise ValueError(f"Unsupported format: {output_format}")
+        
+        limit = request.args.get('limit', HISTORY_DEFAULT_LIMIT, type=int)
+        if not 1 <= limit <= HISTORY_MAX_LIMIT:
+            raise ValueError(f"limit must be between 1 and {HISTORY_MAX_LIMIT}")
+        after = _decode_cursor(request.args.get('cursor'))
+        
+        rows = BusInfo.history_query(after=after, **filters).limit(limit).all()
+        next_cursor = _encode_cursor(rows[-1]) if len(rows) == limit else None
+        
+        return jsonify({
+            "from": start.isoformat(),
+            "to": end.isoformat(),
+            "count": len(rows),
+            "next_cursor": next_cursor,
+            "items": [row.to_history_dict() for row in rows]
+        })
+    
+    except ValueError as e:
+        return jsonify({
+            "error": "Invalid history parameters",
+            "details": str(e)
+        }), 400
     
     except Exception as e:
         current_app.logger.error(f"Error retrieving bus history: {str(e)}")
@@ -54,6 +279,185 @@ def get_bus_history():
         }), 500
 
 
+def _stream_history(filters, output_format):
+    """Stream all history rows matching ``filters`` in constant memory"""
+    def generate():
+        if output_format == 'csv':
+            yield _csv_line(HISTORY_CSV_COLUMNS)
+        
+        for batch in BusInfo.iter_history(batch_size=HISTORY_STREAM_BATCH_SIZE, **filters):
+            chunk = []
+            for row in batch:
+                item = row.to_history_dict()
+                if output_format == 'csv':
+                    chunk.append(_csv_line([item[column] for column in HISTORY_CSV_COLUMNS]))
+                else:
+                    chunk.append(json.dumps(item) + "\n")
+            # Release the batch (and the read transaction) before the next one
+            db.session.close()
+            yield "".join(chunk)
+    
+    response = current_app.response_class(
+        stream_with_context(generate()),
+        mimetype=HISTORY_EXPORT_FORMATS[output_format]
+    )
+    extension = 'csv' if output_format == 'csv' else 'ndjson'
+    response.headers['Content-Disposition'] = f'attachment; filename=bus_history.{extension}'
+    return response
+
+
+def _csv_line(values):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(['' if value is None else value for value in values])
+    return buffer.getvalue()
+
+
+def _parse_time_param(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError(f"{name} must be an ISO 8601 date/time")
+    if parsed.tzinfo is None:
+        parsed = parsed.astimezone()
+    # created_at is stored as naive UTC
+    return parsed.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _encode_cursor(row):
+    raw = f"{row.created_at.isoformat()}|{row.id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def _decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        created_at, row_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|')
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, UnicodeError):
+        raise ValueError("Invalid cursor")
+
+
+@api_bp.route('/bus-info/recent', methods=['GET'])
+def get_recent_bus_info():
+    """
+    Get recent samples and sparklines from the in-memory history
+    
+    Query parameters:
+    - ``origin`` / ``destination``: filter by stop pair
+    - ``minutes``: how far back to look (default 60)
+    - ``points``: number of sparkline buckets (default: one per minute)
+    - ``field``: ``estimated_departure_minutes`` (default) or
+      ``delay_minutes`` for the sparkline
+    - ``samples``: set to ``false`` to return only the sparklines
+    """
+    try:
+        minutes = request.args.get('minutes', RECENT_DEFAULT_MINUTES, type=int)
+        if not 1 <= minutes <= RECENT_MAX_MINUTES:
+            raise ValueError(f"minutes must be between 1 and {RECENT_MAX_MINUTES}")
+        points = request.args.get('points', min(minutes, RECENT_MAX_POINTS), type=int)
+        if not 1 <= points <= RECENT_MAX_POINTS:
+            raise ValueError(f"points must be between 1 and {RECENT_MAX_POINTS}")
+        field = request.args.get('field', 'estimated_departure_minutes')
+        if field not in ('estimated_departure_minutes', 'delay_minutes'):
+            raise ValueError(f"Unsupported field: {field}")
+        with_samples = request.args.get('samples', 'true').lower() not in ('0', 'false', 'no')
+        filters = {
+            "origin": request.args.get('origin') or None,
+            "destination": request.args.get('destination') or None,
+            "minutes": minutes,
+        }
+        
+        # Snapshots scraped by another process arrive through the shared file
+        snapshot_cache.sync()
+        
+        sparklines = recent_history.sparklines(points=points, field=field, **filters)
+        samples = recent_history.samples(**filters) if with_samples else {}
+        
+        destinations = []
+        for (origin, destination), sparkline in sparklines.items():
+            item = {
+                "origin": origin,
+                "destination": destination,
+                "sparkline": sparkline,
+            }
+            if with_samples:
+                item["samples"] = samples.get((origin, destination), [])
+            destinations.append(item)
+        
+        return jsonify({
+            "minutes": minutes,
+            "points": points,
+            "field": field,
+            "destinations": destinations
+        })
+    
+    except ValueError as e:
+        return jsonify({
+            "error": "Invalid recent history parameters",
+            "details": str(e)
+        }), 400
+    
+    except Exception as e:
+        current_app.logger.error(f"Error retrieving recent bus info: {str(e)}")
+        return jsonify({
+            "error": "Failed to retrieve recent bus information",
+            "details": str(e)
+        }), 500
+
+
+@api_bp.route('/stats', methods=['GET'])
+def get_delay_stats():
+    """
+    Get delay statistics from the incrementally maintained histograms
+    
+    Query parameters: ``origin``, ``destination``, ``route`` (bus number),
+    ``weekday`` (0 = Monday ... 6 = Sunday), ``hour`` (0-23) and
+    ``group_by`` (``destination``, ``route`` or ``hour_of_week``).
+    """
+    try:
+        weekday = request.args.get('weekday', type=int)
+        hour = request.args.get('hour', type=int)
+        if weekday is not None and not 0 <= weekday <= 6:
+            raise ValueError("weekday must be between 0 and 6")
+        if hour is not None and not 0 <= hour <= 23:
+            raise ValueError("hour must be between 0 and 23")
+        
+        filters = {
+            "origin": request.args.get('origin') or None,
+            "destination": request.args.get('destination') or None,
+            "bus_number": request.args.get('route') or None,
+            "weekday": weekday,
+            "hour": hour,
+        }
+        group_by = request.args.get('group_by') or None
+        stats = delay_stats.query(group_by=group_by, **filters)
+        
+        response = {"filters": filters}
+        if group_by:
+            response["group_by"] = group_by
+            response["groups"] = [dict(stats[key], key=key) for key in stats]
+        else:
+            response.update(stats)
+        return jsonify(response)
+    
+    except ValueError as e:
+        return jsonify({
+            "error": "Invalid stats parameters",
+            "details": str(e)
+        }), 400
+    
+    except Exception as e:
+        current_app.logger.error(f"Error retrieving delay stats: {str(e)}")
+        return jsonify({
+            "error": "Failed to retrieve delay statistics",
+            "details": str(e)
+        }), 500
+
+
 @api_bp.route('/system-status', methods=['GET'])
 def get_system_status():
     """
@@ -66,7 +470,10 @@ def get_system_status():
             "last_update": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             "uptime": "N/A",
             "data_source": "API",
-            "health": "OK"
+            "health": "OK",
+            "cache": dict(snapshot_cache.stats(), destination_index_rebuilds=destination_index.rebuilds),
+            "recent_history": recent_history.stats(),
+            "scheduler": scheduler_state.read() or {"role": "inactive"}
         })
     
     except Exception as e:
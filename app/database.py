@@ -0,0 +1,63 @@
+"""
+Engine settings per database backend
+
+SQLite (development and the Docker setup) is shared by the scraper, which
+writes, and the web workers, which read. Every new SQLite connection is
+switched to WAL journaling so readers never wait for the writer, with a
+busy timeout so concurrent writers wait instead of failing with
+"database is locked". PostgreSQL gets a bounded, pre-pinged connection
+pool. The values can be tuned through the environment.
+"""
+import os
+import sqlite3
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def sqlite_pragmas():
+    """PRAGMA statements run on every new SQLite connection, in order"""
+    return [
+        ('journal_mode', os.environ.get('BUS_SQLITE_JOURNAL_MODE', 'WAL')),
+        # With WAL, NORMAL only syncs at checkpoints: a power loss can drop
+        # the latest commits but never corrupts the database
+        ('synchronous', os.environ.get('BUS_SQLITE_SYNCHRONOUS', 'NORMAL')),
+        ('busy_timeout', _env_int('BUS_SQLITE_BUSY_TIMEOUT_MS', 5000)),
+        ('mmap_size', _env_int('BUS_SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    ]
+
+
+def engine_options(uri):
+    """
+    ``SQLALCHEMY_ENGINE_OPTIONS`` for the database at ``uri``
+    """
+    if uri.startswith('postgres'):
+        return {
+            'pool_size': _env_int('BUS_DB_POOL_SIZE', 5),
+            'max_overflow': _env_int('BUS_DB_MAX_OVERFLOW', 10),
+            'pool_timeout': _env_int('BUS_DB_POOL_TIMEOUT', 30),
+            # Replace connections before server or proxy idle timeouts close them
+            'pool_recycle': _env_int('BUS_DB_POOL_RECYCLE', 1800),
+            'pool_pre_ping': True,
+        }
+    if uri.startswith('sqlite') and ':memory:' not in uri and uri.rstrip('/') != 'sqlite:':
+        # The driver's own wait for locks, used before the busy_timeout pragma is set
+        return {'connect_args': {'timeout': _env_int('BUS_SQLITE_BUSY_TIMEOUT_MS', 5000) / 1000}}
+    return {}
+
+
+@event.listens_for(Engine, 'connect')
+def _configure_sqlite_connection(dbapi_connection, connection_record):
+    """Apply the SQLite pragmas to each new connection"""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in sqlite_pragmas():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
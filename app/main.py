@@ -1,6 +1,8 @@
+import os
 from flask import render_template, current_app
 from app import create_app
-from app.services.scheduler import bus_scheduler
+from app.services.recent_history import recent_history
+from app.services.snapshot_cache import snapshot_cache
 from app.utils.logging_config import setup_logging
 
 # Create the Flask application
@@ -9,8 +11,19 @@ app = create_app()
 # Set up logging
 setup_logging(app)
 
-# Initialize scheduler with the app
-bus_scheduler.init_app(app)
+if os.environ.get('BUS_RUN_SCHEDULER', 'true').lower() in ('1', 'true', 'yes'):
+    # Scrape in the web process (development). In production the scraper
+    # container (scraper.py) runs the scheduler and the browser instead.
+    from app.services.scheduler import bus_scheduler
+    bus_scheduler.init_app(app)
+else:
+    # Read-only web tier: snapshots published by the scraper arrive through
+    # the shared snapshot file, polled in the background so the recent
+    # history keeps sampling while no requests arrive
+    snapshot_cache.share()
+    with app.app_context():
+        recent_history.seed()
+    snapshot_cache.start_sync(float(os.environ.get('BUS_SNAPSHOT_SYNC_SECONDS', 5)))
 
 @app.route('/')
 def index():
@@ -18,4 +31,4 @@ def index():
     return render_template('index.html')
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0')
\ No newline at end of file
+    app.run(debug=True, host='0.0.0.0')
@@ -1,2 +1,4 @@
 # Import models
-from app.models.bus_info import BusInfo
\ No newline at end of file
+from app.models.bus_info import BusInfo
+from app.models.bus_info_hourly import BusInfoHourly
+from app.models.delay_histogram import DelayHistogram
\ No newline at end of file
@@ -1,11 +1,27 @@
 from datetime import datetime, timedelta
 from app import db
-from sqlalchemy import desc
+from sqlalchemy import and_, desc, func, or_, tuple_
+
+# Departures more than this many minutes off schedule count as delayed/early
+DELAY_THRESHOLD_MINUTES = 5
+
+# Predicted or scheduled times that moved by less than this are not a change
+CHANGE_TOLERANCE = timedelta(minutes=1)
+
 
 class BusInfo(db.Model):
     """Bus information model"""
     
+    __table_args__ = (
+        # Serves the latest-per-pair lookup in get_latest_active
+        db.Index('ix_bus_info_active_pair_created', 'is_active', 'origin', 'destination', 'created_at'),
+        # Serve keyset-paginated history scans, unfiltered and per pair
+        db.Index('ix_bus_info_created_id', 'created_at', 'id'),
+        db.Index('ix_bus_info_pair_created_id', 'origin', 'destination', 'created_at', 'id'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
+    origin = db.Column(db.String(64), nullable=True)
     destination = db.Column(db.String(64), nullable=False)
     bus_number = db.Column(db.String(16), nullable=False)
     stop_number = db.Column(db.String(8), nullable=True)
@@ -16,65 +32,257 @@ class BusInfo(db.Model):
     estimated_departure_minutes = db.Column(db.Integer, nullable=True)
     is_next_bus = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Last scrape (UTC) that still showed this row unchanged; the row was
+    # valid from created_at to last_seen_at
+    last_seen_at = db.Column(db.DateTime, nullable=True)
     is_active = db.Column(db.Boolean, default=True)
+    # Not stored: set on freshly scraped rows whose scheduled departure is a
+    # placeholder (neither the page nor the timetable had it), so their
+    # delay is not a measurement
+    is_placeholder = False
     
     @classmethod
-    def get_latest_active(cls):
+    def get_latest_active(cls, origin=None):
         """
-        Get the latest active bus info for each destination
+        Get the latest active bus info for each origin/destination pair
+        
+        Uses a single ROW_NUMBER() window query over the active rows instead
+        of one query per pair. The rows of one scrape share ``created_at``
+        (they are bulk inserted), so within the latest scrape the next bus
+        comes first, then the row scraped first.
         """
-        # The list of destinations from the spec
-        destinations = ["三鷹駅", "吉祥寺駅", "武蔵境駅南口", "調布駅北口"]
+        rank = func.row_number().over(
+            partition_by=(cls.origin, cls.destination),
+            order_by=(desc(cls.created_at), desc(cls.is_next_bus), cls.id)
+        ).label('rank')
         
-        results = []
-        for destination in destinations:
-            # Get the latest active record for each destination
-            bus = cls.query.filter_by(
-                destination=destination,
-                is_active=True
-            ).order_by(desc(cls.created_at)).first()
-            
-            if bus:
-                results.append(bus)
+        ranked = db.session.query(cls.id.label('id'), rank).filter(cls.is_active.is_(True))
+        if origin:
+            ranked = ranked.filter(cls.origin == origin)
+        ranked = ranked.subquery()
         
-        return results
+        return cls.query.join(ranked, cls.id == ranked.c.id).filter(
+            ranked.c.rank == 1
+        ).order_by(cls.origin, cls.destination).all()
     
     @classmethod
-    def get_history(cls, hours=24):
+    def get_active_by_pair(cls):
+        """
+        All active rows grouped by (origin, destination), in the order they
+        were scraped
+        """
+        rows_by_pair = {}
+        for row in cls._active_rows().order_by(cls.origin, cls.destination, cls.id):
+            rows_by_pair.setdefault((row.origin, row.destination), []).append(row)
+        return rows_by_pair
+    
+    @classmethod
+    def get_history(cls, hours=24, limit=None):
         """
         Get historical bus information from the past X hours
         """
         cutoff_time = datetime.utcnow() - timedelta(hours=hours)
         
-        return cls.query.filter(
-            cls.created_at >= cutoff_time
-        ).order_by(desc(cls.created_at)).all()
+        query = cls.history_query(start=cutoff_time)
+        if limit:
+            query = query.limit(limit)
+        return query.all()
     
     @classmethod
-    def deactivate_all(cls):
+    def history_query(cls, start=None, end=None, origin=None, destination=None, after=None):
+        """
+        Query rows created in [start, end) (UTC), newest first
+        
+        ``after`` is a (created_at, id) keyset cursor: only rows that sort
+        after it in (created_at DESC, id DESC) order are returned.
         """
-        Deactivate all currently active bus info
+        query = cls.query
+        if start is not None:
+            query = query.filter(cls.created_at >= start)
+        if end is not None:
+            query = query.filter(cls.created_at < end)
+        if origin:
+            query = query.filter(cls.origin == origin)
+        if destination:
+            query = query.filter(cls.destination == destination)
+        if after is not None:
+            created_at, row_id = after
+            query = query.filter(or_(
+                cls.created_at < created_at,
+                and_(cls.created_at == created_at, cls.id < row_id)
+            ))
+        
+        return query.order_by(desc(cls.created_at), desc(cls.id))
+    
+    @classmethod
+    def iter_history(cls, batch_size=500, **filters):
         """
-        active_buses = cls.query.filter_by(is_active=True).all()
-        for bus in active_buses:
-            bus.is_active = False
+        Yield history rows in batches of ``batch_size`` using keyset
+        pagination, so memory use does not grow with the size of the range
         
+        Accepts the same filters as ``history_query``.
+        """
+        after = filters.pop('after', None)
+        while True:
+            batch = cls.history_query(after=after, **filters).limit(batch_size).all()
+            if not batch:
+                return
+            
+            yield batch
+            
+            if len(batch) < batch_size:
+                return
+            after = (batch[-1].created_at, batch[-1].id)
+    
+    @classmethod
+    def deactivate_all(cls, pairs=None):
+        """
+        Deactivate all currently active bus info, optionally limited to the
+        given (origin, destination) pairs
+        """
+        cls._active_rows(pairs).update({cls.is_active: False}, synchronize_session=False)
         db.session.commit()
     
+    @classmethod
+    def publish_snapshot(cls, rows_by_pair, now=None):
+        """
+        Replace the active rows of each (origin, destination) pair in
+        ``rows_by_pair`` with the new, unsaved rows in a single transaction
+        
+        Pairs that are not in ``rows_by_pair`` keep their current rows, so a
+        failed scrape never removes the last known data and readers see
+        either the previous snapshot or the new one, never a mix. A pair
+        with an empty list (no departures left) loses its active rows.
+        
+        New rows are compared with the active ones by trip (route and
+        scheduled departure). A pair showing the same trips with the same
+        times only gets a heartbeat: its active rows are kept and their
+        ``last_seen_at`` and minutes to departure are updated. Pairs with any
+        change are replaced as a whole. Returns the set of replaced pairs.
+        """
+        if not rows_by_pair:
+            return set()
+        
+        now = now or datetime.utcnow()
+        try:
+            current = {}
+            for row in cls._active_rows(rows_by_pair):
+                current.setdefault((row.origin, row.destination), []).append(row)
+            
+            changed = set()
+            for pair, rows in rows_by_pair.items():
+                active = current.get(pair, [])
+                if _same_trips(active, rows):
+                    by_trip = {row.trip_key: row for row in active}
+                    for row in rows:
+                        kept = by_trip[row.trip_key]
+                        kept.estimated_departure_minutes = row.estimated_departure_minutes
+                        kept.is_next_bus = row.is_next_bus
+                        kept.last_seen_at = now
+                else:
+                    changed.add(pair)
+            
+            if changed:
+                cls._active_rows(changed).update({cls.is_active: False}, synchronize_session=False)
+                # One executemany INSERT instead of flushing ORM objects one by
+                # one; the new rows are never read back through these objects
+                values = [row.insert_values(now) for pair in changed for row in rows_by_pair[pair]]
+                if values:
+                    db.session.execute(cls.__table__.insert(), values)
+            db.session.commit()
+            return changed
+        except Exception:
+            db.session.rollback()
+            raise
+    
+    @classmethod
+    def _active_rows(cls, pairs=None):
+        query = cls.query.filter(cls.is_active.is_(True))
+        if pairs is not None:
+            query = query.filter(tuple_(cls.origin, cls.destination).in_(list(pairs)))
+        return query
+    
+    def insert_values(self, now):
+        """
+        Column values for a bulk insert of this unsaved row as active and
+        seen at ``now`` (column defaults do not apply to bulk inserts)
+        """
+        values = {
+            column.key: getattr(self, column.key)
+            for column in self.__table__.columns if column.key != 'id'
+        }
+        values.update(created_at=now, last_seen_at=now, is_active=True, is_next_bus=bool(self.is_next_bus))
+        return values
+    
+    @property
+    def trip_key(self):
+        """Identifies the same departure across scrapes of one pair"""
+        return (self.bus_number, self.scheduled_departure_time)
+    
+    def same_prediction(self, other):
+        """
+        Whether ``other`` shows this trip with the same stop and times
+        (within ``CHANGE_TOLERANCE``)
+        """
+        if self.stop_number != other.stop_number:
+            return False
+        for name in ('predicted_departure_time', 'scheduled_arrival_time', 'predicted_arrival_time'):
+            mine, theirs = getattr(self, name), getattr(other, name)
+            if (mine is None) != (theirs is None):
+                return False
+            if mine is not None and abs(mine - theirs) >= CHANGE_TOLERANCE:
+                return False
+        return True
+    
+    @property
+    def delay_minutes(self):
+        """
+        Predicted minus scheduled departure in minutes, if both are known
+        """
+        if self.predicted_departure_time and self.scheduled_departure_time:
+            return (self.predicted_departure_time - self.scheduled_departure_time).total_seconds() / 60
+        return None
+    
+    def to_history_dict(self):
+        """
+        Convert the model to a flat dictionary with full timestamps for the
+        history API and exports
+        """
+        def iso(value):
+            return value.isoformat() if value else None
+        
+        return {
+            "id": self.id,
+            "created_at": iso(self.created_at),
+            "origin": self.origin,
+            "destination": self.destination,
+            "bus_number": self.bus_number,
+            "stop_number": self.stop_number,
+            "scheduled_departure_time": iso(self.scheduled_departure_time),
+            "predicted_departure_time": iso(self.predicted_departure_time),
+            "scheduled_arrival_time": iso(self.scheduled_arrival_time),
+            "predicted_arrival_time": iso(self.predicted_arrival_time),
+            "estimated_departure_minutes": self.estimated_departure_minutes,
+            "is_next_bus": self.is_next_bus,
+            "is_active": self.is_active,
+            "last_seen_at": iso(self.last_seen_at)
+        }
+    
     def to_dict(self):
         """
         Convert the model to a dictionary for API response
         """
         # Calculate delay status
         delay_status = "ON_TIME"
-        if self.predicted_departure_time and self.scheduled_departure_time:
-            delay = (self.predicted_departure_time - self.scheduled_departure_time).total_seconds() / 60
-            if delay > 5:
+        delay = self.delay_minutes
+        if delay is not None:
+            if delay > DELAY_THRESHOLD_MINUTES:
                 delay_status = "DELAYED"
-            elif delay < -5:
+            elif delay < -DELAY_THRESHOLD_MINUTES:
                 delay_status = "EARLY"
         
         return {
+            "origin": self.origin,
             "destination": self.destination,
             "bus_number": self.bus_number,
             "stop_number": self.stop_number,
@@ -85,4 +293,14 @@ class BusInfo(db.Model):
             "estimated_departure_minutes": self.estimated_departure_minutes,
             "is_next_bus": self.is_next_bus,
             "delay_status": delay_status
-        }
\ No newline at end of file
+        }
+
+
+def _same_trips(active, rows):
+    """Whether the new rows of a pair show exactly its active trips, unchanged"""
+    if not active or len(active) != len(rows):
+        return False
+    by_trip = {row.trip_key: row for row in active}
+    if len(by_trip) != len(active):
+        return False
+    return all(row.trip_key in by_trip and by_trip[row.trip_key].same_prediction(row) for row in rows)
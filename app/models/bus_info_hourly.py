@@ -0,0 +1,60 @@
+from app import db
+
+
+class BusInfoHourly(db.Model):
+    """Hourly roll-up of compacted bus_info rows per stop pair and route"""
+    
+    __tablename__ = 'bus_info_hourly'
+    __table_args__ = (
+        db.UniqueConstraint('origin', 'destination', 'bus_number', 'hour', name='uq_bus_info_hourly_key'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    origin = db.Column(db.String(64), nullable=True)
+    destination = db.Column(db.String(64), nullable=False)
+    bus_number = db.Column(db.String(16), nullable=False)
+    hour = db.Column(db.DateTime, nullable=False)  # UTC, truncated to the hour
+    sample_count = db.Column(db.Integer, nullable=False, default=0)
+    delay_sample_count = db.Column(db.Integer, nullable=False, default=0)
+    delay_sum_minutes = db.Column(db.Float, nullable=False, default=0.0)
+    delay_min_minutes = db.Column(db.Float, nullable=True)
+    delay_max_minutes = db.Column(db.Float, nullable=True)
+    delayed_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    @property
+    def delay_avg_minutes(self):
+        if not self.delay_sample_count:
+            return None
+        return self.delay_sum_minutes / self.delay_sample_count
+    
+    def add_delays(self, sample_count, delays, delayed_threshold):
+        """
+        Merge ``sample_count`` raw rows and their delays (minutes) into this
+        roll-up
+        """
+        self.sample_count = (self.sample_count or 0) + sample_count
+        if not delays:
+            return
+        
+        self.delay_sample_count = (self.delay_sample_count or 0) + len(delays)
+        self.delay_sum_minutes = (self.delay_sum_minutes or 0.0) + sum(delays)
+        self.delayed_count = (self.delayed_count or 0) + sum(1 for delay in delays if delay > delayed_threshold)
+        low, high = min(delays), max(delays)
+        self.delay_min_minutes = low if self.delay_min_minutes is None else min(self.delay_min_minutes, low)
+        self.delay_max_minutes = high if self.delay_max_minutes is None else max(self.delay_max_minutes, high)
+    
+    def to_dict(self):
+        """
+        Convert the model to a dictionary for API response
+        """
+        return {
+            "origin": self.origin,
+            "destination": self.destination,
+            "bus_number": self.bus_number,
+            "hour": self.hour.isoformat(),
+            "sample_count": self.sample_count,
+            "delay_avg_minutes": self.delay_avg_minutes,
+            "delay_min_minutes": self.delay_min_minutes,
+            "delay_max_minutes": self.delay_max_minutes,
+            "delayed_count": self.delayed_count
+        }
@@ -0,0 +1,49 @@
+import json
+from app import db
+
+# Delay histogram bins: one bin per minute from DELAY_BIN_MIN to DELAY_BIN_MAX.
+# Values outside the range are counted in the first/last bin.
+DELAY_BIN_MIN = -15
+DELAY_BIN_MAX = 60
+DELAY_BIN_COUNT = DELAY_BIN_MAX - DELAY_BIN_MIN + 1
+
+
+class DelayHistogram(db.Model):
+    """Delay distribution per stop pair, route and hour of the week"""
+    
+    __tablename__ = 'delay_histogram'
+    __table_args__ = (
+        db.UniqueConstraint('origin', 'destination', 'bus_number', 'hour_of_week', name='uq_delay_histogram_key'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    origin = db.Column(db.String(64), nullable=True)
+    destination = db.Column(db.String(64), nullable=False)
+    bus_number = db.Column(db.String(16), nullable=False)
+    hour_of_week = db.Column(db.Integer, nullable=False)  # Monday 0:00 = 0 ... Sunday 23:00 = 167
+    sample_count = db.Column(db.Integer, nullable=False, default=0)
+    delay_sum_minutes = db.Column(db.Float, nullable=False, default=0.0)
+    bins_json = db.Column(db.Text, nullable=False, default='[]')
+    updated_at = db.Column(db.DateTime, nullable=True)
+    
+    @property
+    def bins(self):
+        counts = json.loads(self.bins_json or '[]')
+        return counts if len(counts) == DELAY_BIN_COUNT else [0] * DELAY_BIN_COUNT
+    
+    def add(self, delays):
+        """
+        Add delay observations (minutes) to the histogram
+        """
+        counts = self.bins
+        for delay in delays:
+            counts[delay_bin(delay)] += 1
+        self.bins_json = json.dumps(counts)
+        self.sample_count = (self.sample_count or 0) + len(delays)
+        self.delay_sum_minutes = (self.delay_sum_minutes or 0.0) + sum(delays)
+
+
+def delay_bin(delay):
+    """Index of the histogram bin for a delay in minutes"""
+    index = int(round(delay)) - DELAY_BIN_MIN
+    return min(max(index, 0), DELAY_BIN_COUNT - 1)
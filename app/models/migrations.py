@@ -0,0 +1,84 @@
+"""
+Lightweight schema migrations applied at startup
+
+``db.create_all()`` only creates missing tables, so changes to existing
+tables (new columns, indexes) are applied here. Each migration runs once
+and is recorded in the ``schema_migrations`` table; migrations must also be
+safe to run against a database freshly created by ``create_all``.
+"""
+import logging
+from datetime import datetime
+from sqlalchemy import inspect, text
+from app import db
+
+logger = logging.getLogger(__name__)
+
+
+def _column_names(connection, table):
+    return {column['name'] for column in inspect(connection).get_columns(table)}
+
+
+def _add_bus_info_origin(connection):
+    """Add bus_info.origin; rows written before it existed all came from 野崎"""
+    if 'origin' not in _column_names(connection, 'bus_info'):
+        connection.execute(text("ALTER TABLE bus_info ADD COLUMN origin VARCHAR(64)"))
+    connection.execute(text("UPDATE bus_info SET origin = '野崎' WHERE origin IS NULL"))
+
+
+def _add_bus_info_latest_index(connection):
+    """Composite index backing BusInfo.get_latest_active"""
+    connection.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_bus_info_active_pair_created "
+        "ON bus_info (is_active, origin, destination, created_at)"
+    ))
+
+
+def _add_bus_info_history_indexes(connection):
+    """Indexes backing keyset-paginated history queries"""
+    connection.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_bus_info_created_id ON bus_info (created_at, id)"
+    ))
+    connection.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_bus_info_pair_created_id "
+        "ON bus_info (origin, destination, created_at, id)"
+    ))
+
+
+def _add_bus_info_last_seen(connection):
+    """Add bus_info.last_seen_at; older rows were last seen when written"""
+    if 'last_seen_at' not in _column_names(connection, 'bus_info'):
+        connection.execute(text("ALTER TABLE bus_info ADD COLUMN last_seen_at TIMESTAMP"))
+    connection.execute(text("UPDATE bus_info SET last_seen_at = created_at WHERE last_seen_at IS NULL"))
+
+
+# Ordered list of (version, migration function)
+MIGRATIONS = [
+    ('0001_bus_info_origin', _add_bus_info_origin),
+    ('0002_bus_info_latest_index', _add_bus_info_latest_index),
+    ('0003_bus_info_history_indexes', _add_bus_info_history_indexes),
+    ('0004_bus_info_last_seen', _add_bus_info_last_seen),
+]
+
+
+def apply_migrations():
+    """
+    Apply any migrations that have not been recorded yet
+    """
+    with db.engine.begin() as connection:
+        connection.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "version VARCHAR(64) PRIMARY KEY, applied_at TIMESTAMP NOT NULL)"
+        ))
+        applied = {row[0] for row in connection.execute(text("SELECT version FROM schema_migrations"))}
+
+    for version, migration in MIGRATIONS:
+        if version in applied:
+            continue
+
+        with db.engine.begin() as connection:
+            migration(connection)
+            connection.execute(
+                text("INSERT INTO schema_migrations (version, applied_at) VALUES (:version, :applied_at)"),
+                {'version': version, 'applied_at': datetime.utcnow()}
+            )
+        logger.info(f"Applied database migration {version}")
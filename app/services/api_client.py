@@ -0,0 +1,105 @@
+import logging
+import re
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+# エンドポイントのJSONで使われるフィールド名の候補（先に見つかったものを使用）
+FIELD_ALIASES = {
+    'bus_number': ('routeNo', 'route_no', 'busNumber', 'bus_number', 'keitoName'),
+    'stop_number': ('platform', 'poleNo', 'stopNumber', 'stop_number', 'noriba'),
+    'departure_time': ('departureTime', 'departure_time', 'depTime', 'startTime'),
+    'arrival_time': ('arrivalTime', 'arrival_time', 'arrTime', 'endTime'),
+    'remaining': ('remainingMinutes', 'remaining_minutes', 'remainMin', 'remainingTime', 'timeLeft'),
+}
+
+# 結果の一覧が格納されているキーの候補
+RESULT_KEYS = ('routes', 'results', 'items', 'data')
+
+
+class BusApiClient:
+    """
+    バス情報ページが内部で呼び出しているJSONエンドポイントのクライアント
+
+    requests.Sessionでコネクションをプールし、keep-aliveで再利用する
+    """
+
+    def __init__(self, endpoint, api_key=None, timeout=10, connect_timeout=3.05,
+                 retry_count=3, pool_size=10):
+        self.endpoint = endpoint
+        self.api_key = api_key
+        self.timeout = (connect_timeout, timeout)
+
+        retry = Retry(
+            total=retry_count,
+            backoff_factor=0.5,
+            status_forcelist=(500, 502, 503, 504)
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({
+            'Accept': 'application/json',
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+        })
+        if api_key:
+            self.session.headers['X-Api-Key'] = api_key
+
+    def fetch_departures(self, origin, destination, to_type=1):
+        """
+        出発地から目的地への発車予定を取得し、正規化したエントリーのリストを返す
+        """
+        params = {
+            'from': origin,
+            'to': destination,
+            'toType': to_type,
+            'locale': 'ja',
+        }
+        response = self.session.get(self.endpoint, params=params, timeout=self.timeout)
+        response.raise_for_status()
+        return self.parse_departures(response.json())
+
+    def close(self):
+        """
+        プールしているコネクションを閉じる
+        """
+        self.session.close()
+
+    @staticmethod
+    def parse_departures(payload):
+        """
+        JSONレスポンスを共通のエントリー形式に変換
+        """
+        items = payload
+        if isinstance(payload, dict):
+            items = next((payload[key] for key in RESULT_KEYS if isinstance(payload.get(key), list)), [])
+
+        entries = []
+        for item in items or []:
+            if not isinstance(item, dict):
+                continue
+
+            entry = {}
+            for field, aliases in FIELD_ALIASES.items():
+                value = next((item[alias] for alias in aliases if item.get(alias) not in (None, '')), None)
+                entry[field] = str(value).strip() if value is not None else None
+
+            remaining = entry.pop('remaining')
+            entry['estimated_minutes'] = _parse_minutes(remaining)
+            entries.append(entry)
+
+        return entries
+
+
+def _parse_minutes(value):
+    """
+    "13" や "あと13分" のような値から分数を取り出す
+    """
+    if value is None:
+        return None
+    match = re.search(r'(\d+)', value)
+    return int(match.group(1)) if match else None
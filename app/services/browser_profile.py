@@ -0,0 +1,95 @@
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# 軽量モードでブロックするリクエスト（バス情報の抽出に不要な画像・フォント・CSS・計測タグなど）
+# Network.setBlockedURLs のワイルドカード形式
+BLOCKED_URL_PATTERNS = (
+    '*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.svg', '*.ico',
+    '*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot',
+    '*.css',
+    '*.mp4', '*.webm', '*.mp3',
+    '*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*',
+)
+
+# 結果一覧の状態（行数、本文の長さ、「該当なし」の表示の有無）を返すスクリプト。一覧がなければnull
+_ROWS_SIGNATURE_SCRIPT = """
+var list = document.querySelector(arguments[0]);
+if (!list) { return null; }
+var empty = arguments[2] ? document.querySelector(arguments[2]) !== null : false;
+return [list.querySelectorAll(arguments[1]).length, list.textContent.length, empty];
+"""
+
+
+def lean_mode_enabled():
+    """
+    軽量モード（BUS_BROWSER_LEAN、既定は有効）
+    """
+    return os.environ.get('BUS_BROWSER_LEAN', 'true').lower() in ('1', 'true', 'yes')
+
+
+def apply_lean_options(chrome_options):
+    """
+    ページの読み込みを軽くするChromeのオプションを設定する
+
+    DOMの構築が終わった時点で読み込み完了とし（eager）、画像を読み込まず、
+    ウィンドウも小さくする。
+    """
+    chrome_options.page_load_strategy = 'eager'
+    chrome_options.add_argument("--window-size=800,600")
+    chrome_options.add_argument("--blink-settings=imagesEnabled=false")
+    chrome_options.add_argument("--mute-audio")
+    chrome_options.add_experimental_option('prefs', {
+        'profile.managed_default_content_settings.images': 2,
+        'profile.managed_default_content_settings.fonts': 2,
+    })
+    return chrome_options
+
+
+def block_resources(driver, patterns=BLOCKED_URL_PATTERNS):
+    """
+    DevToolsプロトコルで不要なリソースへのリクエストをブロックする
+
+    セッションごとに1回呼べばよい（再利用されるセッションにも設定が残る）。
+    """
+    try:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': list(patterns)})
+        return True
+    except Exception as e:
+        # CDPに対応していないドライバーでは通常の読み込みのまま続ける
+        logger.warning(f"リソースのブロックを設定できませんでした: {str(e)}")
+        return False
+
+
+class RowsStable:
+    """
+    結果一覧の行が変化しなくなったら真になるWebDriverWaitの条件
+
+    一覧に1行以上の結果（または empty_selector の「該当なし」の表示）が
+    現れてから、行数と本文の長さが settle_seconds 以上変わらなければ、
+    JavaScriptによる描画が終わったとみなす。固定時間の待機の代わりに使う。
+    """
+
+    def __init__(self, list_selector, row_selector, settle_seconds=0.5, empty_selector=None, clock=time.monotonic):
+        self.list_selector = list_selector
+        self.row_selector = row_selector
+        self.settle_seconds = settle_seconds
+        self.empty_selector = empty_selector
+        self.clock = clock
+        self._signature = None
+        self._since = None
+
+    def __call__(self, driver):
+        state = driver.execute_script(_ROWS_SIGNATURE_SCRIPT, self.list_selector, self.row_selector,
+                                      self.empty_selector)
+        now = self.clock()
+        # 結果の行がまだ読み込まれていない一覧は安定とみなさない
+        signature = tuple(state[:2]) if state and (state[0] > 0 or state[2]) else None
+        if signature is None or signature != self._signature:
+            self._signature = signature
+            self._since = now
+            return False
+        return now - self._since >= self.settle_seconds
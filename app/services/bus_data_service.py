@@ -1,20 +1,21 @@
+import atexit
 import logging
-import requests
+import os
+import threading
 import time
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, WebDriverException
-from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError, as_completed
 from datetime import datetime, timedelta
-import re
-import json
 from flask import current_app
 from app.models.bus_info import BusInfo
-from app import db
+from app.services.browser_profile import RowsStable, apply_lean_options, block_resources, lean_mode_enabled
+from app.services.circuit_breaker import CircuitBreakers
+from app.services.delay_stats import delay_stats
+from app.services.html_parser import LIST_CLASS, get_html_parser
+from app.services.refresh_policy import RefreshPolicy
+from app.services.snapshot_cache import snapshot_cache, build_bus_info_snapshot
+from app.services.stop_config import get_stop_pairs
+from app.services.timetable import timetable_store
+from app.services.webdriver_pool import WebDriverPool
 
 logger = logging.getLogger(__name__)
 
@@ -22,34 +23,87 @@ class BusDataService:
     """Service for fetching bus data from dynamic JavaScript-based website"""
     
     def __init__(self):
-        self.source = "野崎"
-        self.destinations = {
-            "三鷹駅": {"url_suffix": "bus.htm?tabName=searchTab&from=%E9%87%8E%E5%B4%8E&to=%E4%B8%89%E9%B7%B9%E9%A7%85&toType=1&locale=ja"},
-            "吉祥寺駅": {"url_suffix": "bus.htm?tabName=searchTab&from=%E9%87%8E%E5%B4%8E&to=%E5%90%89%E7%A5%A5%E5%AF%BA%E9%A7%85&toType=1&locale=ja"},
-            "武蔵境駅南口": {"url_suffix": "bus.htm?tabName=searchTab&from=%E9%87%8E%E5%B4%8E&to=%E6%AD%A6%E8%94%B5%E5%A2%83%E9%A7%85%E5%8D%97%E5%8F%A3&toType=1&locale=ja"},
-            "調布駅北口": {"url_suffix": "bus.htm?tabName=searchTab&from=%E9%87%8E%E5%B4%8E&to=%E8%AA%BF%E5%B8%83%E9%A7%85%E5%8C%97%E5%8F%A3&toType=1&locale=ja"}
-        }
+        # 監視する停留所の組み合わせ（config/stops.yml から読み込む）
+        self.stop_pairs = get_stop_pairs()
         self.base_url = "https://odakyu.bus-navigation.jp/wgsys/wgp"
         self.retry_count = 3
         self.page_load_timeout = 30  # seconds
         self.element_wait_timeout = 20  # seconds
+        # 結果一覧の行がこの時間変化しなければ描画完了とみなす（秒）
+        self.rows_settle_seconds = float(os.environ.get('BUS_ROWS_SETTLE_SECONDS', 0.5))
+        # 一覧に結果の行が現れるまで待つ時間（秒）。現れなければ結果なしとして扱う
+        self.rows_wait_timeout = float(os.environ.get('BUS_ROWS_WAIT_SECONDS', 10))
+        # 「該当なし」の表示のCSSセレクタ（任意）。表示されたら行の出現を待たない
+        self.no_results_selector = os.environ.get('BUS_NO_RESULTS_SELECTOR') or None
+        # 画像・フォント・CSSなどを読み込まない軽量モード（BUS_BROWSER_LEAN）
+        self.lean_browser = lean_mode_enabled()
+        # 同時に起動するブラウザセッション数の上限
+        self.max_concurrency = int(os.environ.get('BUS_DATA_MAX_CONCURRENCY', 4))
+        # ブラウザセッションを再作成するまでの使用回数とメモリ上限（MB）
+        self.driver_max_uses = int(os.environ.get('BUS_DRIVER_MAX_USES', 50))
+        self.driver_max_memory_mb = int(os.environ.get('BUS_DRIVER_MAX_MEMORY_MB', 512))
+        
+        # 取得処理をまたいで再利用するブラウザセッションのプール
+        self._driver_pool = None
+        self._driver_pool_lock = threading.Lock()
+        # プロセス終了時にブラウザを確実に終了させる
+        atexit.register(self.shutdown)
+        
+        # 直近の取得結果（停留所の組み合わせごとの成否）と最終取得時刻
+        self.last_results = {}
+        self._last_fetched = {}
+        # 直近の取得処理にかかった時間（秒）
+        self.last_duration = 0.0
+        # 更新間隔の判定に使う許容誤差（スケジューラの実行時刻のずれを吸収する）
+        self.schedule_slack = timedelta(seconds=30)
+        # 可変更新の判定に使う許容誤差。定期実行の間隔（既定30秒）の半分より十分小さくし、
+        # 1分間隔の組み合わせが毎回の定期実行で取得されないようにする
+        self.adaptive_slack = timedelta(seconds=3)
+        # 次のバスまでの時間と予測の変化に応じて組み合わせごとの更新間隔を決める
+        self.refresh_policy = RefreshPolicy()
+        # 失敗が続く組み合わせを一定時間スキップするサーキットブレーカー
+        self.breakers = CircuitBreakers()
+        # 1回の取得処理全体の制限時間（秒）。超えた組み合わせは失敗として扱う
+        self.run_deadline_seconds = float(os.environ.get('BUS_FETCH_DEADLINE_SECONDS', 120))
+        self._deadline = None
+        # 直近の取得処理で失敗した組み合わせのエラー内容
+        self.last_errors = {}
+        
+        # JSONエンドポイント（設定されている場合はブラウザを使わずに取得）
+        self.api_endpoint = os.environ.get('BUS_API_ENDPOINT')
+        self.api_key = os.environ.get('BUS_API_KEY')
+        self.api_timeout = int(os.environ.get('BUS_API_TIMEOUT', 10))  # seconds
+        self.api_available = bool(self.api_endpoint)
+        # 目的地ごとの取得方式の既定値（"api" または "selenium"）
+        # 目的地の設定に "backend" があればそちらを優先する
+        self.default_backend = os.environ.get('BUS_DATA_BACKEND', 'api')
+        self._api_client = None
         
-        # API関連（将来的な実装用）
-        self.api_available = False
-        self.api_endpoint = None
-        self.api_key = None
+        # 時刻表（取得できなかった予定時刻の補完に使用）
+        self.timetable = timetable_store
+        
+        # HTMLからバス情報を抽出する関数（BUS_HTML_PARSER: lxml / bs4）
+        self.html_parser = get_html_parser()
     
     def _setup_webdriver(self):
         """
         Seleniumのwebdriverをセットアップ
         """
+        # Seleniumはブラウザを使うときにだけ読み込む（起動時間の短縮）
+        from selenium import webdriver
+        from selenium.webdriver.chrome.options import Options
+        from selenium.webdriver.chrome.service import Service
+        
         try:
             chrome_options = Options()
             chrome_options.add_argument("--headless")
             chrome_options.add_argument("--no-sandbox")
             chrome_options.add_argument("--disable-dev-shm-usage")
             chrome_options.add_argument("--disable-gpu")
-            chrome_options.add_argument("--window-size=1920,1080")
+            if self.lean_browser:
+                apply_lean_options(chrome_options)
+            else:
+                chrome_options.add_argument("--window-size=1920,1080")
             chrome_options.add_argument("--disable-extensions")
             chrome_options.add_argument("--disable-infobars")
             chrome_options.add_argument(f"user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36")
@@ -60,74 +114,287 @@ class BusDataService:
             
             driver = webdriver.Chrome(service=service, options=chrome_options)
             driver.set_page_load_timeout(self.page_load_timeout)
+            if self.lean_browser:
+                block_resources(driver)
             return driver
         except Exception as e:
             logger.error(f"Webdriverのセットアップに失敗しました: {str(e)}")
             raise
     
-    def fetch_all_bus_data(self):
+    def _get_driver_pool(self):
+        """
+        ブラウザセッションのプールを取得（初回呼び出し時に作成）
+        """
+        with self._driver_pool_lock:
+            if self._driver_pool is None:
+                self._driver_pool = WebDriverPool(
+                    self._setup_webdriver,
+                    self.max_concurrency,
+                    max_uses=self.driver_max_uses,
+                    max_memory_mb=self.driver_max_memory_mb
+                )
+            return self._driver_pool
+    
+    def shutdown(self):
         """
-        すべての目的地のバスデータを取得
+        保持しているブラウザセッションをすべて終了
+        """
+        with self._driver_pool_lock:
+            pool, self._driver_pool = self._driver_pool, None
+        
+        if pool:
+            pool.close()
+            logger.info("ブラウザセッションのプールを終了しました")
+        
+        if self._api_client:
+            self._api_client.close()
+            self._api_client = None
+    
+    def fetch_all_bus_data(self, only_due=False):
         """
-        logger.info("全目的地のバスデータ取得を開始します")
+        すべての停留所の組み合わせのバスデータを取得
         
-        # 現在のデータを非アクティブ化
-        BusInfo.deactivate_all()
+        only_due=True の場合は、設定された更新間隔を過ぎた組み合わせのみ取得する
+        """
+        now = datetime.now()
+        pairs = self._due_pairs(now) if only_due else dict(self.stop_pairs)
         
-        success_count = 0
-        driver = None
+        # サーキットブレーカーが開いている組み合わせは取得しない
+        skipped = [key for key in pairs if not self.breakers.allow(key)]
+        for key in skipped:
+            del pairs[key]
+        if skipped:
+            logger.warning(f"失敗が続いているため取得を見送ります: {', '.join(skipped)}")
+        
+        if not pairs:
+            logger.info("更新が必要な停留所の組み合わせはありません")
+            return True
+        
+        logger.info(f"バスデータ取得を開始します（{len(pairs)}/{len(self.stop_pairs)}件）")
+        started = time.monotonic()
+        self._deadline = started + self.run_deadline_seconds
+        self.last_errors = {}
+        
+        # 組み合わせごとの新しいバス情報（取得に失敗した組み合わせは含まない）
+        snapshot = {}
+        published = False
         
         try:
-            # 公式APIが利用可能か最初に確認
-            if self.api_available and self.api_endpoint:
-                logger.info("公式APIを使用してデータを取得します")
-                success_count = self._fetch_all_from_api()
-            else:
-                # APIが利用できない場合はSeleniumでスクレイピング
-                logger.info("Seleniumを使用してデータを取得します")
-                driver = self._setup_webdriver()
-                
-                # 各目的地のデータを取得
-                for destination, config in self.destinations.items():
-                    try:
-                        logger.info(f"目的地のデータを取得します: {destination}")
-                        if self._fetch_destination_data_with_selenium(driver, destination, config):
-                            success_count += 1
-                    except Exception as e:
-                        logger.error(f"{destination}のデータ取得エラー: {str(e)}")
+            # JSONエンドポイントを使う組み合わせを先に取得
+            api_pairs = {key: pair for key, pair in pairs.items() if self._backend_for(pair) == 'api'}
+            if api_pairs:
+                logger.info(f"APIを使用してデータを取得します（{len(api_pairs)}件）")
+                snapshot.update(self._fetch_all_from_api(api_pairs))
+            
+            # APIを使わない組み合わせと、APIで取得できなかった組み合わせはSeleniumでスクレイピング
+            selenium_pairs = {key: pair for key, pair in pairs.items() if key not in snapshot}
+            if selenium_pairs:
+                logger.info(f"Seleniumを使用してデータを取得します（{len(selenium_pairs)}件）")
+                snapshot.update(self._fetch_all_with_selenium(selenium_pairs))
+            
         except Exception as e:
             logger.error(f"バスデータ取得中のエラー: {str(e)}")
-        finally:
-            # ドライバーを閉じる
-            if driver:
+        else:
+            try:
+                # 取得できた組み合わせのデータを1つのトランザクションで入れ替える
+                # 取得に失敗した組み合わせは以前のデータをそのまま残す
+                self._publish_snapshot(pairs, snapshot)
+                published = True
+            except Exception as e:
+                logger.error(f"バス情報の保存中のエラー: {str(e)}")
+        
+        # サーキットブレーカーには取得・解析の結果だけを記録する（保存の失敗はサイトの障害ではない）
+        for key in pairs:
+            if key in snapshot:
+                self.breakers.record_success(key)
+            else:
+                self.breakers.record_failure(key, self.last_errors.get(key))
+        
+        # 取得できても保存できなかった組み合わせは次の周期で再取得する
+        results = {key: published and key in snapshot for key in pairs}
+        for key, success in results.items():
+            if success:
+                self._last_fetched[key] = now
+            if success or key not in snapshot:
+                self.refresh_policy.record(key, snapshot.get(key), now)
+        
+        self.last_results = results
+        self.last_duration = time.monotonic() - started
+        success_count = sum(1 for success in results.values() if success)
+        logger.info(f"バスデータ取得完了。{success_count}/{len(pairs)}件の停留所の組み合わせを更新しました")
+        
+        return success_count == len(pairs)
+    
+    def _publish_snapshot(self, pairs, snapshot):
+        """
+        取得したバス情報をまとめて保存し、対象の組み合わせの現在のデータと入れ替える
+        """
+        if not snapshot:
+            logger.warning("保存するバス情報がありません")
+            return
+        
+        rows_by_pair = {
+            (pairs[key].origin, pairs[key].destination): bus_infos
+            for key, bus_infos in snapshot.items()
+        }
+        # 前回から変化のない組み合わせは行を追加せず、確認時刻だけを更新する
+        changed = BusInfo.publish_snapshot(rows_by_pair)
+        
+        for key, bus_infos in snapshot.items():
+            if (pairs[key].origin, pairs[key].destination) not in changed:
+                continue
+            for bus_info in bus_infos:
+                logger.info(f"バス情報を追加しました: {key} - {bus_info.bus_number} (残り{bus_info.estimated_departure_minutes}分)")
+        logger.info(
+            f"{len(snapshot)}件の停留所の組み合わせのバス情報を保存しました"
+            f"（変化あり {len(changed)}件、変化なし {len(snapshot) - len(changed)}件）"
+        )
+        
+        # APIレスポンスのキャッシュを新しいデータで作り直す
+        snapshot_cache.refresh(build_bus_info_snapshot)
+        
+        # 発車したバスの遅延を統計に反映（失敗しても取得処理は継続する）
+        try:
+            delay_stats.observe(rows_by_pair)
+        except Exception as e:
+            logger.error(f"遅延統計の更新エラー: {str(e)}")
+    
+    def _due_pairs(self, now):
+        """
+        更新間隔を過ぎた停留所の組み合わせを返す
+        
+        間隔の指定がない組み合わせは、可変更新が有効ならその予定時刻で、
+        無効なら常に対象とする
+        """
+        due = {}
+        for key, pair in self.stop_pairs.items():
+            if pair.interval_minutes is None and self.refresh_policy.enabled:
+                if self.refresh_policy.is_due(key, now + self.adaptive_slack):
+                    due[key] = pair
+                continue
+            
+            last_fetched = self._last_fetched.get(key)
+            if (pair.interval_minutes is None or last_fetched is None
+                    or now + self.schedule_slack >= last_fetched + timedelta(minutes=pair.interval_minutes)):
+                due[key] = pair
+        return due
+    
+    def _backend_for(self, pair):
+        """
+        組み合わせの取得方式を決定（APIが設定されていなければ常にSelenium）
+        """
+        if not self.api_available:
+            return 'selenium'
+        return pair.backend or self.default_backend
+    
+    def _fetch_concurrently(self, pairs, fetch, process, max_workers):
+        """
+        組み合わせごとの取得処理を並行して実行し、取得できた組み合わせの
+        BusInfoのリスト（発車予定のバスがなければ空のリスト）を返す
+        
+        取得処理（fetch）はワーカースレッドで行い、結果の処理（process）は
+        アプリケーションコンテキストを持つ呼び出し元スレッドで行う
+        """
+        results = {}
+        if not pairs:
+            return results
+        
+        max_workers = max(1, min(max_workers, len(pairs)))
+        executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='bus-fetch')
+        futures = {executor.submit(fetch, pair): pair for pair in pairs.values()}
+        try:
+            for future in as_completed(futures, timeout=self._remaining_time()):
+                pair = futures[future]
                 try:
-                    driver.quit()
-                except:
-                    pass
+                    bus_infos = process(pair, future.result())
+                    if bus_infos is None:
+                        self.last_errors[pair.key] = "バス情報を取得できませんでした"
+                    else:
+                        # 空のリストは運行のない時間帯：以前の行を無効にするため結果に含める
+                        results[pair.key] = bus_infos
+                except Exception as e:
+                    logger.error(f"{pair.key}のデータ取得エラー: {str(e)}")
+                    self.last_errors[pair.key] = str(e)
+        except FuturesTimeoutError:
+            pending = [pair.key for future, pair in futures.items() if not future.done()]
+            logger.error(f"制限時間を超えたため取得を打ち切りました: {', '.join(pending)}")
+            for key in pending:
+                self.last_errors[key] = "制限時間超過"
+        finally:
+            # 制限時間を超えた処理の完了は待たない（実行中の処理は各自のタイムアウトで終了する）
+            executor.shutdown(wait=False, cancel_futures=True)
         
-        logger.info(f"バスデータ取得完了。{success_count}/{len(self.destinations)}の目的地を更新しました")
+        return results
+    
+    def _remaining_time(self):
+        """
+        取得処理の制限時間までの残り秒数（制限がなければNone）
+        """
+        if self._deadline is None:
+            return None
+        return max(0.0, self._deadline - time.monotonic())
+    
+    def _fetch_all_with_selenium(self, pairs):
+        """
+        複数の組み合わせのページをブラウザで並行して取得
+        """
+        pool = self._get_driver_pool()
         
-        return success_count == len(self.destinations)
+        def fetch(pair):
+            logger.info(f"目的地のデータを取得します: {pair.key}")
+            with pool.session() as driver:
+                return self._fetch_destination_page_with_selenium(driver, pair)
+        
+        return self._fetch_concurrently(pairs, fetch, self._process_html_response, self.max_concurrency)
+    
+    def _get_api_client(self):
+        """
+        JSONエンドポイントのクライアントを取得（初回呼び出し時に作成）
+        """
+        if self._api_client is None:
+            from app.services.api_client import BusApiClient
+            self._api_client = BusApiClient(
+                self.api_endpoint,
+                api_key=self.api_key,
+                timeout=self.api_timeout,
+                retry_count=self.retry_count,
+                pool_size=self.max_concurrency
+            )
+        return self._api_client
     
-    def _fetch_all_from_api(self):
+    def _fetch_all_from_api(self, pairs):
         """
-        公式APIからすべての目的地のデータを取得（将来的な実装用）
+        JSONエンドポイントから複数の組み合わせのデータを並行して取得
         """
-        # この部分は公式APIが提供された場合に実装
-        logger.info("公式API取得機能は未実装です")
-        return 0
+        client = self._get_api_client()
+        
+        def fetch(pair):
+            logger.info(f"APIから目的地のデータを取得します: {pair.key}")
+            return client.fetch_departures(pair.origin, pair.destination, to_type=pair.to_type)
+        
+        return self._fetch_concurrently(pairs, fetch, self._process_api_response, self.max_concurrency)
     
-    def _fetch_destination_data_with_selenium(self, driver, destination, config):
+    def _fetch_destination_page_with_selenium(self, driver, pair):
         """
-        特定の目的地のバスデータをSeleniumを使って取得
+        特定の組み合わせのページをSeleniumで読み込み、HTMLを返す
         """
-        url = f"{self.base_url}/{config['url_suffix']}"
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.common.exceptions import TimeoutException, WebDriverException
+        
+        url = f"{self.base_url}/{pair.url_suffix}"
         
         # リトライロジック
         for attempt in range(self.retry_count):
+            if self._remaining_time() == 0:
+                raise TimeoutException("取得処理の制限時間を超えました")
+            
             try:
                 logger.info(f"URL {url} にアクセスします（試行 {attempt+1}/{self.retry_count}）")
+                started = time.monotonic()
                 driver.get(url)
+                loaded = time.monotonic()
                 
                 # ページが完全に読み込まれるまで待機
                 logger.info("ページの読み込みを待機しています...")
@@ -138,21 +405,33 @@ class BusDataService:
                     WebDriverWait(driver, self.element_wait_timeout).until(
                         EC.presence_of_element_located((By.CSS_SELECTOR, ".route-result-list"))
                     )
+                    listed = time.monotonic()
                     
-                    # さらに少し待機してJavaScriptの処理を確実に完了させる
-                    time.sleep(3)
-                    
-                    logger.info("ページが完全に読み込まれました")
+                    # 結果の行が現れて変化しなくなるまで待機してJavaScriptの描画完了を確認する
+                    try:
+                        WebDriverWait(driver, self.rows_wait_timeout, poll_frequency=0.1).until(
+                            RowsStable(".route-result-list", ".route-result-item", self.rows_settle_seconds,
+                                       empty_selector=self.no_results_selector)
+                        )
+                        logger.info("ページが完全に読み込まれました")
+                    except TimeoutException:
+                        # 運行のない時間帯などは一覧が空のまま：再試行せず結果なしとして処理する
+                        logger.info(f"{pair.key}の結果の行が表示されないまま待機時間を過ぎました")
+                    settled = time.monotonic()
                 except TimeoutException:
                     logger.warning("ページ要素の待機中にタイムアウトしました")
                     if attempt == self.retry_count - 1:
                         raise
                     continue  # 次のリトライへ
                 
-                # ページのHTMLを取得し処理
-                page_source = driver.page_source
-                self._process_html_response(destination, page_source)
-                return True
+                # ページのHTMLを取得
+                html = driver.page_source
+                logger.info(
+                    f"{pair.key}のページ取得時間: 読み込み {loaded - started:.2f}秒, "
+                    f"一覧の表示 {listed - loaded:.2f}秒, 描画の完了 {settled - listed:.2f}秒, "
+                    f"HTML取得 {time.monotonic() - settled:.2f}秒"
+                )
+                return html
                 
             except (WebDriverException, Exception) as e:
                 logger.warning(f"試行 {attempt+1}/{self.retry_count} が失敗しました: {str(e)}")
@@ -162,134 +441,168 @@ class BusDataService:
                 # 一時停止してから再試行
                 time.sleep(2)
         
-        return False
+        return None
     
-    def _process_html_response(self, destination, html_content):
+    def _process_html_response(self, pair, html_content):
         """
-        バス情報ウェブサイトからのHTML内容を処理
+        バス情報ウェブサイトからのHTML内容を処理し、未保存のBusInfoのリストを返す
         
-        注: 実際のウェブサイト構造に基づいたセレクタが必要になります
+        一覧が空（運行のない時間帯など）なら空のリスト、ページを解析できなければNoneを返す
+        
+        注: セレクタは app/services/html_parser.py に定義しています
         """
         try:
-            soup = BeautifulSoup(html_content, 'lxml')
-            
-            # バスエントリーを探す
-            # 実際のサイト構造に基づいて更新が必要です
-            # 例: route-result-list内のroute-itemなど
-            bus_entries = soup.select('.route-result-item')
+            # バスエントリー（.route-result-item）のみを抽出し、最初の3件を取り出す
+            found, rows = self.html_parser(html_content, limit=3)
             
-            if not bus_entries:
-                logger.warning(f"{destination}のバス情報が見つかりませんでした")
-                return False
+            if not found:
+                if not html_content or LIST_CLASS not in html_content:
+                    logger.warning(f"{pair.key}の結果一覧が見つかりませんでした")
+                    return None
+                logger.info(f"{pair.key}の発車予定のバスはありません")
+                return []
             
-            logger.info(f"{len(bus_entries)}件のバス情報が見つかりました")
+            logger.info(f"{found}件のバス情報が見つかりました")
             
             # 各バスエントリーを処理
-            for i, entry in enumerate(bus_entries[:3]):  # 最初の3件のみ処理
+            bus_infos = []
+            for i, row in enumerate(rows):
                 try:
-                    # バス番号を抽出 (例: "鷹52")
-                    # 実際のセレクタを調整する必要があります
-                    bus_number_elem = entry.select_one('.route-no, .bus-number')
-                    bus_number = bus_number_elem.text.strip() if bus_number_elem else "不明"
-                    
-                    # 停留所番号
-                    stop_number_elem = entry.select_one('.stop-number, .platform-number')
-                    stop_number = stop_number_elem.text.strip() if stop_number_elem else "1"
-                    
-                    # 発車予定時刻
-                    departure_elem = entry.select_one('.departure-time, .start-time')
-                    departure_time_str = departure_elem.text.strip() if departure_elem else ""
-                    
-                    # 到着予定時刻
-                    arrival_elem = entry.select_one('.arrival-time, .end-time')
-                    arrival_time_str = arrival_elem.text.strip() if arrival_elem else ""
-                    
-                    # 発車までの残り時間
-                    remaining_elem = entry.select_one('.remaining-time, .time-left')
-                    remaining_text = remaining_elem.text.strip() if remaining_elem else ""
-                    
-                    # 残り時間から分数を抽出
-                    minutes_match = re.search(r'(\d+)分', remaining_text)
-                    estimated_minutes = int(minutes_match.group(1)) if minutes_match else None
-                    
-                    # 現在時刻から時間を計算
-                    now = datetime.now()
-                    
-                    # 発車予定時刻を解析
-                    scheduled_departure = None
-                    if departure_time_str:
-                        try:
-                            # "HH:MM" 形式を解析
-                            hour, minute = map(int, departure_time_str.split(':'))
-                            scheduled_departure = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
-                            
-                            # 日付をまたぐ場合の処理 (現在時刻より前なら翌日と判断)
-                            if scheduled_departure < now:
-                                scheduled_departure = scheduled_departure + timedelta(days=1)
-                        except Exception as e:
-                            logger.warning(f"発車時刻の解析に失敗しました: {departure_time_str}, エラー: {str(e)}")
-                            scheduled_departure = now + timedelta(minutes=30)  # フォールバック
-                    else:
-                        scheduled_departure = now + timedelta(minutes=30)  # 時刻不明の場合のダミーデータ
-                    
-                    # 予測発車時刻を計算
-                    predicted_departure = None
-                    if estimated_minutes is not None:
-                        predicted_departure = now + timedelta(minutes=estimated_minutes)
-                    else:
-                        predicted_departure = scheduled_departure  # 推定時間がなければ予定時刻を使用
-                    
-                    # 到着予定時刻を解析
-                    scheduled_arrival = None
-                    if arrival_time_str:
-                        try:
-                            # "HH:MM" 形式を解析
-                            hour, minute = map(int, arrival_time_str.split(':'))
-                            scheduled_arrival = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
-                            
-                            # 日付をまたぐ場合の処理
-                            if scheduled_arrival < scheduled_departure:
-                                scheduled_arrival = scheduled_arrival + timedelta(days=1)
-                        except Exception as e:
-                            logger.warning(f"到着時刻の解析に失敗しました: {arrival_time_str}, エラー: {str(e)}")
-                            scheduled_arrival = scheduled_departure + timedelta(minutes=20)  # フォールバック
-                    else:
-                        scheduled_arrival = scheduled_departure + timedelta(minutes=20)  # 時刻不明の場合のダミーデータ
-                    
-                    # 予測到着時刻を推定 (実際のデータがない場合は簡易計算)
-                    arrival_delay = (predicted_departure - scheduled_departure).total_seconds() if predicted_departure and scheduled_departure else 0
-                    predicted_arrival = scheduled_arrival + timedelta(seconds=arrival_delay) if scheduled_arrival else None
-                    
-                    # 新しいBusInfoオブジェクトを作成
-                    bus_info = BusInfo(
-                        destination=destination,
-                        bus_number=bus_number,
-                        stop_number=stop_number,
-                        scheduled_departure_time=scheduled_departure,
-                        predicted_departure_time=predicted_departure,
-                        scheduled_arrival_time=scheduled_arrival,
-                        predicted_arrival_time=predicted_arrival,
-                        estimated_departure_minutes=estimated_minutes,
-                        is_next_bus=(i == 0),  # 最初のバスが次のバス
-                        is_active=True
-                    )
-                    
-                    # データベースに保存
-                    db.session.add(bus_info)
-                    logger.info(f"バス情報を追加しました: {destination} - {bus_number} (残り{estimated_minutes}分)")
+                    bus_infos.append(self._create_bus_info(
+                        pair, i, row.bus_number, row.stop_number,
+                        row.departure_time, row.arrival_time, row.estimated_minutes
+                    ))
                 
                 except Exception as e:
-                    logger.error(f"{destination}のバスエントリー処理エラー: {str(e)}")
+                    logger.error(f"{pair.key}のバスエントリー処理エラー: {str(e)}")
             
-            # すべての変更をコミット
-            db.session.commit()
-            logger.info(f"{destination}のバス情報をデータベースに保存しました")
-            
-            return True
+            # 行はあるのに1件も処理できなければ解析の失敗とする
+            return bus_infos or None
             
         except Exception as e:
             logger.error(f"HTML処理中のエラー: {str(e)}")
-            return False
+            return None
+    
+    def _process_api_response(self, pair, entries):
+        """
+        JSONエンドポイントから取得したエントリーを処理し、未保存のBusInfoのリストを返す
+        
+        エントリーがなければNoneを返し、Seleniumでの取得に切り替える
+        """
+        try:
+            if not entries:
+                logger.warning(f"{pair.key}のバス情報が見つかりませんでした")
+                return None
+            
+            logger.info(f"{len(entries)}件のバス情報が見つかりました")
+            
+            bus_infos = []
+            for i, entry in enumerate(entries[:3]):  # 最初の3件のみ処理
+                try:
+                    bus_infos.append(self._create_bus_info(
+                        pair, i,
+                        entry.get('bus_number') or "不明",
+                        entry.get('stop_number') or "1",
+                        entry.get('departure_time') or "",
+                        entry.get('arrival_time') or "",
+                        entry.get('estimated_minutes')
+                    ))
+                except Exception as e:
+                    logger.error(f"{pair.key}のバスエントリー処理エラー: {str(e)}")
+            
+            return bus_infos or None
+            
+        except Exception as e:
+            logger.error(f"APIレスポンス処理中のエラー: {str(e)}")
+            return None
+    
+    def _create_bus_info(self, pair, index, bus_number, stop_number,
+                         departure_time_str, arrival_time_str, estimated_minutes):
+        """
+        取得した文字列から時刻を計算してBusInfoオブジェクトを作成
+        """
+        # 現在時刻から時間を計算
+        now = datetime.now()
+        
+        # 予測発車時刻を計算
+        predicted_departure = None
+        if estimated_minutes is not None:
+            predicted_departure = now + timedelta(minutes=estimated_minutes)
+        
+        # 発車予定時刻を解析
+        scheduled_departure = None
+        if departure_time_str:
+            try:
+                # "HH:MM" 形式を解析
+                hour, minute = map(int, departure_time_str.split(':'))
+                scheduled_departure = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+                
+                # 日付をまたぐ場合の処理 (現在時刻より前なら翌日と判断)
+                if scheduled_departure < now:
+                    scheduled_departure = scheduled_departure + timedelta(days=1)
+            except Exception as e:
+                logger.warning(f"発車時刻の解析に失敗しました: {departure_time_str}, エラー: {str(e)}")
+        
+        # 時刻が取得できなかった場合は時刻表から該当する便を探す
+        timetable_entry = None
+        is_placeholder = False
+        if scheduled_departure is None:
+            timetable_entry = self.timetable.find(pair, predicted_departure or now, bus_number=bus_number)
+            if timetable_entry:
+                scheduled_departure = timetable_entry.departure
+            else:
+                scheduled_departure = now + timedelta(minutes=30)  # 時刻表にもない場合のダミーデータ
+                is_placeholder = True
+        
+        if predicted_departure is None:
+            predicted_departure = scheduled_departure  # 推定時間がなければ予定時刻を使用
+        
+        # 到着予定時刻を解析
+        scheduled_arrival = None
+        if arrival_time_str:
+            try:
+                # "HH:MM" 形式を解析
+                hour, minute = map(int, arrival_time_str.split(':'))
+                scheduled_arrival = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+                
+                # 日付をまたぐ場合の処理
+                if scheduled_arrival < scheduled_departure:
+                    scheduled_arrival = scheduled_arrival + timedelta(days=1)
+            except Exception as e:
+                logger.warning(f"到着時刻の解析に失敗しました: {arrival_time_str}, エラー: {str(e)}")
+        
+        if scheduled_arrival is None:
+            # 時刻表の所要時間を使い、それもなければ20分とする
+            if timetable_entry is None:
+                timetable_entry = self.timetable.find(
+                    pair, scheduled_departure, bus_number=bus_number, window=timedelta(minutes=1)
+                )
+            if timetable_entry and timetable_entry.arrival:
+                scheduled_arrival = scheduled_departure + (timetable_entry.arrival - timetable_entry.departure)
+            else:
+                scheduled_arrival = scheduled_departure + timedelta(minutes=20)  # 時刻不明の場合のダミーデータ
+        
+        # 予測到着時刻を推定 (実際のデータがない場合は簡易計算)
+        arrival_delay = (predicted_departure - scheduled_departure).total_seconds() if predicted_departure and scheduled_departure else 0
+        predicted_arrival = scheduled_arrival + timedelta(seconds=arrival_delay) if scheduled_arrival else None
+        
+        # 新しいBusInfoオブジェクトを作成
+        bus_info = BusInfo(
+            origin=pair.origin,
+            destination=pair.destination,
+            bus_number=bus_number,
+            stop_number=stop_number,
+            scheduled_departure_time=scheduled_departure,
+            predicted_departure_time=predicted_departure,
+            scheduled_arrival_time=scheduled_arrival,
+            predicted_arrival_time=predicted_arrival,
+            estimated_departure_minutes=estimated_minutes,
+            is_next_bus=(index == 0),  # 最初のバスが次のバス
+            is_active=True
+        )
+        # ダミーの予定時刻は遅延の統計に含めない
+        bus_info.is_placeholder = is_placeholder
+        return bus_info
 
 
 # サービスのインスタンスを作成
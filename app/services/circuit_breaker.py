@@ -0,0 +1,90 @@
+import logging
+import os
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreakers:
+    """
+    One circuit breaker per stop pair
+
+    After ``failure_threshold`` consecutive failed fetches a pair's breaker
+    opens and the pair is skipped for an exponentially growing, jittered
+    back-off. When that expires a single trial fetch is allowed (half open):
+    success closes the breaker, failure opens it again for longer.
+    """
+
+    def __init__(self):
+        self.failure_threshold = int(os.environ.get('BUS_BREAKER_FAILURES', 3))
+        self.base_seconds = float(os.environ.get('BUS_BREAKER_BACKOFF_SECONDS', 60))
+        self.max_seconds = float(os.environ.get('BUS_BREAKER_MAX_BACKOFF_SECONDS', 1800))
+        self._lock = threading.Lock()
+        self._random = random.Random()
+        self._breakers = {}
+
+    def allow(self, key, now=None):
+        """
+        Whether ``key`` may be fetched now (moves an expired open breaker to
+        half open)
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            breaker = self._breakers.get(key)
+            if breaker is None or breaker['state'] == CLOSED:
+                return True
+            if breaker['state'] == OPEN and now >= breaker['open_until']:
+                breaker['state'] = HALF_OPEN
+                return True
+            # Open, or half open with the trial fetch still pending
+            return False
+
+    def record_success(self, key):
+        with self._lock:
+            breaker = self._breakers.get(key)
+            if breaker is not None and breaker['state'] != CLOSED:
+                logger.info(f"Circuit breaker for {key} closed")
+            self._breakers[key] = self._closed()
+
+    def record_failure(self, key, error=None, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            breaker = self._breakers.setdefault(key, self._closed())
+            breaker['failures'] += 1
+            breaker['last_error'] = str(error) if error else None
+
+            if breaker['state'] == HALF_OPEN or breaker['failures'] >= self.failure_threshold:
+                breaker['opened'] += 1
+                backoff = min(self.max_seconds, self.base_seconds * 2 ** (breaker['opened'] - 1))
+                # Equal jitter: keep half the back-off, randomize the rest so
+                # pairs that failed together do not retry together
+                delay = backoff / 2 + self._random.uniform(0, backoff / 2)
+                breaker['state'] = OPEN
+                breaker['open_until'] = now + delay
+                logger.warning(f"Circuit breaker for {key} opened for {delay:.0f}s after {breaker['failures']} failures")
+
+    def status(self, now=None):
+        """
+        Breaker state per stop pair for the status endpoint
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            return {
+                key: {
+                    'state': breaker['state'],
+                    'failures': breaker['failures'],
+                    'retry_in_seconds': max(0, int(breaker['open_until'] - now)) if breaker['state'] == OPEN else 0,
+                    'last_error': breaker['last_error'],
+                }
+                for key, breaker in self._breakers.items()
+            }
+
+    @staticmethod
+    def _closed():
+        return {'state': CLOSED, 'failures': 0, 'opened': 0, 'open_until': 0.0, 'last_error': None}
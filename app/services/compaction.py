@@ -0,0 +1,106 @@
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+from app import db
+from app.models.bus_info import BusInfo, DELAY_THRESHOLD_MINUTES
+from app.models.bus_info_hourly import BusInfoHourly
+
+logger = logging.getLogger(__name__)
+
+
+class HistoryCompactor:
+    """
+    Retention job for the bus_info table
+
+    Inactive rows older than the retention window are rolled up into
+    ``bus_info_hourly`` (per stop pair, route and hour) and deleted in
+    bounded batches, each in its own transaction. On SQLite the freed pages
+    are then returned to the OS with an incremental vacuum.
+    """
+
+    def __init__(self):
+        self.retention_hours = int(os.environ.get('BUS_HISTORY_RETENTION_HOURS', 24 * 7))
+        self.batch_size = int(os.environ.get('BUS_COMPACTION_BATCH_SIZE', 1000))
+        # Pages released per run by PRAGMA incremental_vacuum (0 = all free pages)
+        self.vacuum_pages = int(os.environ.get('BUS_COMPACTION_VACUUM_PAGES', 0))
+
+    def compact(self, now=None):
+        """
+        Roll up and delete expired rows; returns a summary of the run
+        """
+        now = now or datetime.utcnow()
+        # Only compact whole hours so an hour is never split across runs
+        cutoff = (now - timedelta(hours=self.retention_hours)).replace(minute=0, second=0, microsecond=0)
+
+        logger.info(f"Compacting bus_info rows older than {cutoff.isoformat()}")
+        compacted = 0
+        while True:
+            rows = BusInfo.query.filter(
+                BusInfo.created_at < cutoff,
+                BusInfo.is_active.is_(False)
+            ).order_by(BusInfo.created_at, BusInfo.id).limit(self.batch_size).all()
+            if not rows:
+                break
+
+            try:
+                self._roll_up(rows)
+                BusInfo.query.filter(BusInfo.id.in_([row.id for row in rows])).delete(synchronize_session=False)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+
+            compacted += len(rows)
+            # Drop references to the deleted rows before the next batch
+            db.session.expunge_all()
+
+        vacuumed = self._incremental_vacuum() if compacted else False
+        logger.info(f"Compacted {compacted} bus_info rows")
+
+        return {
+            "cutoff": cutoff.isoformat(),
+            "compacted_rows": compacted,
+            "vacuumed": vacuumed,
+        }
+
+    def _roll_up(self, rows):
+        """Merge a batch of raw rows into the hourly aggregates"""
+        groups = defaultdict(list)
+        for row in rows:
+            hour = row.created_at.replace(minute=0, second=0, microsecond=0)
+            groups[(row.origin, row.destination, row.bus_number, hour)].append(row)
+
+        for (origin, destination, bus_number, hour), group in groups.items():
+            aggregate = BusInfoHourly.query.filter_by(
+                origin=origin,
+                destination=destination,
+                bus_number=bus_number,
+                hour=hour
+            ).first()
+            if aggregate is None:
+                aggregate = BusInfoHourly(origin=origin, destination=destination, bus_number=bus_number, hour=hour)
+                db.session.add(aggregate)
+
+            delays = [row.delay_minutes for row in group if row.delay_minutes is not None]
+            aggregate.add_delays(len(group), delays, DELAY_THRESHOLD_MINUTES)
+
+    def _incremental_vacuum(self):
+        """Return free pages to the OS (SQLite only)"""
+        if db.engine.dialect.name != 'sqlite':
+            return False
+
+        with db.engine.connect() as connection:
+            mode = connection.exec_driver_sql("PRAGMA auto_vacuum").scalar()
+            if mode != 2:
+                # Switching an existing database to incremental mode needs one full VACUUM
+                logger.info("Enabling SQLite incremental auto-vacuum (one-time full VACUUM)")
+                connection.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+                connection.exec_driver_sql("VACUUM")
+            else:
+                connection.exec_driver_sql(f"PRAGMA incremental_vacuum({self.vacuum_pages})")
+        return True
+
+
+# Create an instance of the compactor
+history_compactor = HistoryCompactor()
@@ -0,0 +1,167 @@
+import logging
+import threading
+from collections import defaultdict
+from datetime import datetime
+from app import db
+from app.models.bus_info import DELAY_THRESHOLD_MINUTES
+from app.models.delay_histogram import DelayHistogram, DELAY_BIN_COUNT, DELAY_BIN_MIN
+
+logger = logging.getLogger(__name__)
+
+# Percentiles reported by the stats API
+PERCENTILES = (50, 75, 90, 95)
+
+
+class DelayStatsEngine:
+    """
+    Incrementally maintained delay distributions
+
+    Every scrape reports the upcoming buses of each stop pair. The latest
+    observed delay of each trip (pair, route, scheduled departure) is kept
+    in memory, and once the trip no longer appears in its pair's snapshot
+    (it has departed) that final delay is added to the histogram for its
+    route and hour of the week. Each departure is therefore counted once,
+    and stats queries only read the histograms, never the raw history.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (origin, destination) -> {(bus_number, scheduled_departure): delay}
+        self._pending = defaultdict(dict)
+
+    def observe(self, rows_by_pair):
+        """
+        Feed the rows of a published snapshot, keyed by (origin, destination)
+        """
+        departed = []
+        with self._lock:
+            for (origin, destination), rows in rows_by_pair.items():
+                current = {}
+                for row in rows:
+                    # Rows with a placeholder schedule would record made-up trips
+                    if row.is_placeholder:
+                        continue
+                    if row.scheduled_departure_time and row.delay_minutes is not None:
+                        current[(row.bus_number, row.scheduled_departure_time)] = row.delay_minutes
+
+                pending = self._pending[(origin, destination)]
+                for (bus_number, scheduled), delay in pending.items():
+                    if (bus_number, scheduled) not in current:
+                        departed.append((origin, destination, bus_number, hour_of_week(scheduled), delay))
+                self._pending[(origin, destination)] = current
+
+        if departed:
+            self._record(departed)
+        return len(departed)
+
+    def _record(self, departed):
+        """Add finalized trip delays to the stored histograms"""
+        groups = defaultdict(list)
+        for origin, destination, bus_number, how, delay in departed:
+            groups[(origin, destination, bus_number, how)].append(delay)
+
+        try:
+            now = datetime.utcnow()
+            for (origin, destination, bus_number, how), delays in groups.items():
+                histogram = DelayHistogram.query.filter_by(
+                    origin=origin,
+                    destination=destination,
+                    bus_number=bus_number,
+                    hour_of_week=how
+                ).first()
+                if histogram is None:
+                    histogram = DelayHistogram(
+                        origin=origin, destination=destination, bus_number=bus_number, hour_of_week=how
+                    )
+                    db.session.add(histogram)
+                histogram.add(delays)
+                histogram.updated_at = now
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def query(self, origin=None, destination=None, bus_number=None, weekday=None, hour=None, group_by=None):
+        """
+        Merge the matching histograms and summarize them
+
+        ``weekday`` is 0 (Monday) to 6 (Sunday); ``hour`` is 0-23 and matches
+        that hour on every selected weekday. ``group_by`` may be
+        ``destination``, ``route`` or ``hour_of_week`` to get one summary per
+        group instead of a single one.
+        """
+        query = DelayHistogram.query
+        if origin:
+            query = query.filter_by(origin=origin)
+        if destination:
+            query = query.filter_by(destination=destination)
+        if bus_number:
+            query = query.filter_by(bus_number=bus_number)
+        if weekday is not None and hour is not None:
+            query = query.filter_by(hour_of_week=weekday * 24 + hour)
+        elif weekday is not None:
+            query = query.filter(DelayHistogram.hour_of_week.between(weekday * 24, weekday * 24 + 23))
+        elif hour is not None:
+            query = query.filter(DelayHistogram.hour_of_week.in_([day * 24 + hour for day in range(7)]))
+
+        key_funcs = {
+            'destination': lambda h: h.destination,
+            'route': lambda h: h.bus_number,
+            'hour_of_week': lambda h: h.hour_of_week,
+        }
+        if group_by is None:
+            return summarize(query.all())
+        if group_by not in key_funcs:
+            raise ValueError(f"Unsupported group_by: {group_by}")
+
+        groups = defaultdict(list)
+        for histogram in query.all():
+            groups[key_funcs[group_by](histogram)].append(histogram)
+        return {key: summarize(histograms) for key, histograms in sorted(groups.items())}
+
+
+def hour_of_week(moment):
+    """Monday 0:00-0:59 = 0 ... Sunday 23:00-23:59 = 167"""
+    return moment.weekday() * 24 + moment.hour
+
+
+def summarize(histograms):
+    """Combine histograms into count, mean, percentiles and on-time rates"""
+    counts = [0] * DELAY_BIN_COUNT
+    total = 0
+    delay_sum = 0.0
+    for histogram in histograms:
+        for index, count in enumerate(histogram.bins):
+            counts[index] += count
+        total += histogram.sample_count or 0
+        delay_sum += histogram.delay_sum_minutes or 0.0
+
+    if not total:
+        return {"sample_count": 0, "mean_delay_minutes": None, "percentiles": {}, "delayed_rate": None, "early_rate": None}
+
+    delayed = sum(count for index, count in enumerate(counts) if DELAY_BIN_MIN + index > DELAY_THRESHOLD_MINUTES)
+    early = sum(count for index, count in enumerate(counts) if DELAY_BIN_MIN + index < -DELAY_THRESHOLD_MINUTES)
+
+    return {
+        "sample_count": total,
+        "mean_delay_minutes": round(delay_sum / total, 2),
+        "percentiles": {f"p{p}": round(_percentile(counts, total, p), 2) for p in PERCENTILES},
+        "delayed_rate": round(delayed / total, 3),
+        "early_rate": round(early / total, 3),
+    }
+
+
+def _percentile(counts, total, percentile):
+    """Percentile of a 1-minute histogram, interpolated within the bin"""
+    target = total * percentile / 100
+    cumulative = 0
+    for index, count in enumerate(counts):
+        if count and cumulative + count >= target:
+            # Bin i covers [value - 0.5, value + 0.5)
+            return DELAY_BIN_MIN + index - 0.5 + (target - cumulative) / count
+        cumulative += count
+    return DELAY_BIN_MIN + len(counts) - 1
+
+
+# Create an instance of the engine
+delay_stats = DelayStatsEngine()
@@ -0,0 +1,125 @@
+import logging
+import os
+import re
+from collections import namedtuple
+from lxml import etree
+
+logger = logging.getLogger(__name__)
+
+# バス情報ページから取り出す1件分のデータ
+BusRow = namedtuple('BusRow', 'bus_number stop_number departure_time arrival_time estimated_minutes')
+
+# 結果一覧のクラス名（行が0件でも一覧があればページは読み込めている）
+LIST_CLASS = 'route-result-list'
+# バスエントリーと各項目のクラス名（カンマ区切りのセレクタと同じく、先に現れた要素を使用）
+ENTRY_CLASS = 'route-result-item'
+FIELD_CLASSES = {
+    'bus_number': ('route-no', 'bus-number'),
+    'stop_number': ('stop-number', 'platform-number'),
+    'departure_time': ('departure-time', 'start-time'),
+    'arrival_time': ('arrival-time', 'end-time'),
+    'remaining': ('remaining-time', 'time-left'),
+}
+
+# 要素が見つからない場合の既定値
+FIELD_DEFAULTS = {
+    'bus_number': "不明",
+    'stop_number': "1",
+    'departure_time': "",
+    'arrival_time': "",
+    'remaining': "",
+}
+
+MINUTES_PATTERN = re.compile(r'(\d+)分')
+
+
+def _has_class(name):
+    # CSSのクラスセレクタ（.name）と同じ判定をするXPath式
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+# XPathは読み込み時に一度だけコンパイルする
+_ENTRY_XPATH = etree.XPath(f"//*[{_has_class(ENTRY_CLASS)}]")
+_FIELD_XPATHS = {
+    field: etree.XPath(f"(.//*[{' or '.join(_has_class(name) for name in names)}])[1]")
+    for field, names in FIELD_CLASSES.items()
+}
+_STRING_XPATH = etree.XPath("string()")
+
+
+def parse_bus_rows_lxml(html_content, limit=3):
+    """
+    lxmlとコンパイル済みXPathでバスエントリーを抽出する
+
+    戻り値は（見つかったエントリー数, 先頭limit件のBusRowのリスト）
+    """
+    if not html_content or ENTRY_CLASS not in html_content:
+        return 0, []
+
+    if isinstance(html_content, str):
+        # エンコーディング宣言を含む文字列はlxmlが受け付けないため、バイト列として渡す
+        html_content = html_content.encode('utf-8')
+    root = etree.fromstring(html_content, etree.HTMLParser(encoding='utf-8'))
+    if root is None:
+        return 0, []
+
+    entries = _ENTRY_XPATH(root)
+    rows = []
+    for entry in entries[:limit]:
+        values = {}
+        for field, xpath in _FIELD_XPATHS.items():
+            found = xpath(entry)
+            values[field] = _STRING_XPATH(found[0]).strip() if found else FIELD_DEFAULTS[field]
+        rows.append(_make_row(values))
+
+    return len(entries), rows
+
+
+def parse_bus_rows_bs4(html_content, limit=3):
+    """
+    BeautifulSoupでページ全体のツリーを作成してバスエントリーを抽出する（従来の方式）
+
+    戻り値は parse_bus_rows_lxml と同じ
+    """
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html_content, 'lxml')
+    entries = soup.select(f'.{ENTRY_CLASS}')
+    rows = []
+    for entry in entries[:limit]:
+        values = {}
+        for field, names in FIELD_CLASSES.items():
+            elem = entry.select_one(', '.join(f'.{name}' for name in names))
+            values[field] = elem.text.strip() if elem else FIELD_DEFAULTS[field]
+        rows.append(_make_row(values))
+
+    return len(entries), rows
+
+
+def _make_row(values):
+    # 残り時間から分数を抽出
+    minutes_match = MINUTES_PATTERN.search(values['remaining'])
+    return BusRow(
+        bus_number=values['bus_number'],
+        stop_number=values['stop_number'],
+        departure_time=values['departure_time'],
+        arrival_time=values['arrival_time'],
+        estimated_minutes=int(minutes_match.group(1)) if minutes_match else None
+    )
+
+
+PARSERS = {
+    'lxml': parse_bus_rows_lxml,
+    'bs4': parse_bus_rows_bs4,
+}
+
+
+def get_html_parser(name=None):
+    """
+    名前（省略時は環境変数 BUS_HTML_PARSER、既定値 lxml）から抽出関数を取得
+    """
+    name = name or os.environ.get('BUS_HTML_PARSER', 'lxml')
+    if name not in PARSERS:
+        logger.warning(f"不明なHTMLパーサー {name} が指定されたため lxml を使用します")
+        name = 'lxml'
+    return PARSERS[name]
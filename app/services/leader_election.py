@@ -0,0 +1,112 @@
+import json
+import logging
+import os
+import socket
+import threading
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Shared between gunicorn workers and, through the ./data volume, between
+# containers on the same host
+DEFAULT_LOCK_PATH = os.path.join('data', 'scheduler.lock')
+
+
+class LeaderElection:
+    """
+    Elect a single scraping process with an exclusive file lock
+
+    The process holding a non-blocking ``flock`` on ``lock_path`` is the
+    leader and records its identity in the file. The operating system drops
+    the lock when the process exits or dies, so a follower that retries
+    ``try_acquire`` periodically takes over without any lease bookkeeping.
+    """
+
+    def __init__(self, lock_path=None, identity=None):
+        self.lock_path = lock_path or os.environ.get('BUS_LEADER_LOCK_PATH', DEFAULT_LOCK_PATH)
+        self._identity = identity
+        self.since = None
+        self._file = None
+        self._lock = threading.Lock()
+
+    @property
+    def identity(self):
+        # Resolved lazily so forked workers report their own pid
+        return self._identity or f"{socket.gethostname()}:{os.getpid()}"
+
+    @property
+    def is_leader(self):
+        return self._file is not None
+
+    def try_acquire(self):
+        """
+        Become the leader if no other process is; returns whether this
+        process is the leader
+        """
+        with self._lock:
+            if self._file is not None:
+                return True
+
+            if fcntl is None:
+                logger.warning("File locking is unavailable; assuming scheduler leadership")
+                self._file = open(os.devnull, 'w')
+                self.since = datetime.utcnow()
+                return True
+
+            directory = os.path.dirname(os.path.abspath(self.lock_path))
+            os.makedirs(directory, exist_ok=True)
+
+            lock_file = open(self.lock_path, 'a+')
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                return False
+
+            self.since = datetime.utcnow()
+            lock_file.seek(0)
+            lock_file.truncate()
+            json.dump({"identity": self.identity, "since": self.since.isoformat()}, lock_file)
+            lock_file.flush()
+            self._file = lock_file
+
+            logger.info(f"Acquired scheduler leadership as {self.identity}")
+            return True
+
+    def release(self):
+        """
+        Give up leadership so another process can take over
+        """
+        with self._lock:
+            if self._file is None:
+                return
+
+            try:
+                if fcntl is not None:
+                    self._file.seek(0)
+                    self._file.truncate()
+                    self._file.flush()
+                    fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            finally:
+                self._file.close()
+                self._file = None
+                self.since = None
+            logger.info(f"Released scheduler leadership as {self.identity}")
+
+    def current_leader(self):
+        """
+        The leader recorded in the lock file (``None`` if there is none yet)
+        """
+        if self._file is not None:
+            return {"identity": self.identity, "since": self.since.isoformat()}
+
+        try:
+            with open(self.lock_path) as f:
+                return json.loads(f.read() or 'null')
+        except (OSError, ValueError):
+            return None
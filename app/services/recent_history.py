@@ -0,0 +1,256 @@
+import json
+import logging
+import os
+import threading
+from array import array
+from datetime import datetime, timedelta, timezone
+from app.models.bus_info import BusInfo
+from app.services.snapshot_cache import snapshot_cache
+
+logger = logging.getLogger(__name__)
+
+# Marks a missing value in the packed int16 columns
+MISSING = -32768
+
+SOURCE_LIVE = 0
+SOURCE_TIMETABLE = 1
+SOURCE_NAMES = ('live', 'timetable')
+
+
+class RingBuffer:
+    """
+    Fixed-size buffer of samples for one stop pair in packed columns
+
+    Each sample is a UTC timestamp (int64 seconds), the minutes until the
+    shown bus leaves and its delay in minutes (int16, ``MISSING`` when
+    unknown), and the data source (int8): 13 bytes per sample. Appends
+    overwrite the oldest sample once the buffer is full.
+    """
+
+    __slots__ = ('capacity', 'times', 'minutes', 'delays', 'sources', 'start', 'size')
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.times = array('q', [0]) * capacity
+        self.minutes = array('h', [MISSING]) * capacity
+        self.delays = array('h', [MISSING]) * capacity
+        self.sources = array('b', [SOURCE_LIVE]) * capacity
+        self.start = 0
+        self.size = 0
+
+    def append(self, timestamp, minutes, delay, source):
+        if self.size < self.capacity:
+            index = (self.start + self.size) % self.capacity
+            self.size += 1
+        else:
+            index = self.start
+            self.start = (self.start + 1) % self.capacity
+        self.times[index] = timestamp
+        self.minutes[index] = minutes
+        self.delays[index] = delay
+        self.sources[index] = source
+
+    def last_time(self):
+        return self.times[(self.start + self.size - 1) % self.capacity] if self.size else None
+
+    def since(self, timestamp):
+        """Physical indices of the samples at or after ``timestamp``, oldest first"""
+        # Samples are appended in time order: walk back from the newest
+        count = 0
+        while count < self.size and self.times[(self.start + self.size - 1 - count) % self.capacity] >= timestamp:
+            count += 1
+        return [(self.start + self.size - count + i) % self.capacity for i in range(count)]
+
+
+class RecentHistory:
+    """
+    Recent samples of the /api/bus-info snapshot per stop pair
+
+    Every snapshot this process publishes or picks up from the shared file
+    appends one sample of the next bus per destination, so "last hour"
+    views and sparklines are answered from memory without querying
+    ``bus_info`` or building model objects.
+    """
+
+    def __init__(self, capacity=None):
+        self.capacity = capacity or int(os.environ.get('BUS_RECENT_CAPACITY', 720))
+        self._lock = threading.Lock()
+        self._buffers = {}
+
+    def record_snapshot(self, entry):
+        """
+        Append the destinations of a published snapshot (``CachedSnapshot``)
+        """
+        if entry.last_modified is None:
+            return
+        try:
+            destinations = json.loads(entry.body).get('destinations', [])
+        except ValueError as e:
+            logger.error(f"Failed to read snapshot for recent history: {str(e)}")
+            return
+        timestamp = int(entry.last_modified.replace(tzinfo=timezone.utc).timestamp())
+
+        with self._lock:
+            for destination in destinations:
+                # Sample the next bus of each pair, as seed() does
+                if not destination.get('is_next_bus', True):
+                    continue
+                self._append(
+                    (destination.get('origin'), destination.get('destination')),
+                    timestamp,
+                    _int16(destination.get('estimated_departure_minutes')),
+                    _delay_minutes(destination),
+                    SOURCE_TIMETABLE if destination.get('data_source') == 'timetable' else SOURCE_LIVE
+                )
+
+    def append(self, origin, destination, moment, minutes=None, delay=None, source=SOURCE_LIVE):
+        """
+        Append one sample; ``moment`` is a naive UTC datetime
+        """
+        timestamp = int(moment.replace(tzinfo=timezone.utc).timestamp())
+        with self._lock:
+            self._append((origin, destination), timestamp, _int16(minutes), _int16(delay), source)
+
+    def _append(self, key, timestamp, minutes, delay, source):
+        buffer = self._buffers.get(key)
+        if buffer is None:
+            buffer = self._buffers[key] = RingBuffer(self.capacity)
+        # The same snapshot can be seen more than once (rebuilds, shared file)
+        last = buffer.last_time()
+        if last is not None and timestamp <= last:
+            return
+        buffer.append(timestamp, minutes, delay, source)
+
+    def seed(self, minutes=24 * 60, now=None):
+        """
+        Fill the buffers from the next-bus rows stored in the last
+        ``minutes``, so a restarted process does not start empty. Needs an
+        application context.
+        """
+        start = (now or datetime.utcnow()) - timedelta(minutes=minutes)
+        query = BusInfo.query.session.query(
+            BusInfo.origin, BusInfo.destination, BusInfo.created_at, BusInfo.estimated_departure_minutes,
+            BusInfo.scheduled_departure_time, BusInfo.predicted_departure_time
+        ).filter(
+            BusInfo.is_next_bus.is_(True), BusInfo.created_at >= start
+        ).order_by(BusInfo.created_at, BusInfo.id)
+
+        count = 0
+        try:
+            with self._lock:
+                for origin, destination, created_at, minutes_left, scheduled, predicted in query:
+                    delay = (predicted - scheduled).total_seconds() / 60 if scheduled and predicted else None
+                    self._append(
+                        (origin, destination),
+                        int(created_at.replace(tzinfo=timezone.utc).timestamp()),
+                        _int16(minutes_left),
+                        _int16(delay),
+                        SOURCE_LIVE
+                    )
+                    count += 1
+        except Exception as e:
+            logger.error(f"Failed to seed recent history: {str(e)}")
+        return count
+
+    def samples(self, origin=None, destination=None, minutes=60, now=None):
+        """
+        Samples of the last ``minutes`` per stop pair, as
+        ``{(origin, destination): [sample dict, ...]}``
+        """
+        cutoff = _cutoff(minutes, now)
+        result = {}
+        with self._lock:
+            for key, buffer in self._matching(origin, destination):
+                result[key] = [
+                    {
+                        "time": _isoformat(buffer.times[i]),
+                        "estimated_departure_minutes": _value(buffer.minutes[i]),
+                        "delay_minutes": _value(buffer.delays[i]),
+                        "data_source": SOURCE_NAMES[buffer.sources[i]],
+                    }
+                    for i in buffer.since(cutoff)
+                ]
+        return result
+
+    def sparklines(self, origin=None, destination=None, minutes=60, points=60, field='estimated_departure_minutes',
+                   now=None):
+        """
+        ``field`` over the last ``minutes`` in ``points`` equal buckets per
+        stop pair (the latest sample in each bucket, ``None`` when empty)
+        """
+        column = {'estimated_departure_minutes': 'minutes', 'delay_minutes': 'delays'}[field]
+        cutoff = _cutoff(minutes, now)
+        width = minutes * 60 / points
+        result = {}
+        with self._lock:
+            for key, buffer in self._matching(origin, destination):
+                values = [None] * points
+                series = getattr(buffer, column)
+                for i in buffer.since(cutoff):
+                    values[min(points - 1, int((buffer.times[i] - cutoff) / width))] = _value(series[i])
+                result[key] = values
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pairs": len(self._buffers),
+                "samples": sum(buffer.size for buffer in self._buffers.values()),
+                "capacity": self.capacity,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._buffers = {}
+
+    def _matching(self, origin, destination):
+        for key, buffer in self._buffers.items():
+            if (origin is None or key[0] == origin) and (destination is None or key[1] == destination):
+                yield key, buffer
+
+
+def _cutoff(minutes, now):
+    now = now or datetime.utcnow()
+    return int((now - timedelta(minutes=minutes)).replace(tzinfo=timezone.utc).timestamp())
+
+
+def _isoformat(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat(timespec='seconds')
+
+
+def _int16(value):
+    if value is None:
+        return MISSING
+    return max(MISSING + 1, min(32767, int(round(value))))
+
+
+def _value(packed):
+    return None if packed == MISSING else packed
+
+
+def _delay_minutes(destination):
+    """Predicted minus scheduled departure from the HH:MM strings of a snapshot row"""
+    scheduled = destination.get('scheduled_departure_time')
+    predicted = destination.get('predicted_departure_time')
+    if not scheduled or not predicted:
+        return MISSING
+    try:
+        delay = _minutes_of_day(predicted) - _minutes_of_day(scheduled)
+    except ValueError:
+        return MISSING
+    # Departures around midnight
+    if delay > 720:
+        delay -= 1440
+    elif delay < -720:
+        delay += 1440
+    return _int16(delay)
+
+
+def _minutes_of_day(value):
+    hour, minute = map(int, value.split(':'))
+    return hour * 60 + minute
+
+
+# Create an instance of the history, fed with every new snapshot
+recent_history = RecentHistory()
+snapshot_cache.on_publish(recent_history.record_snapshot)
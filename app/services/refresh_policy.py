@@ -0,0 +1,124 @@
+import logging
+import os
+import threading
+from datetime import timedelta
+
+logger = logging.getLogger(__name__)
+
+
+class RefreshPolicy:
+    """
+    Per stop pair refresh intervals driven by the scraped data
+
+    After every fetch of a pair the next refresh time is chosen from its
+    rows: soon when the next bus is close or its predictions moved since the
+    previous fetch, proportionally later when the next bus is far away, not
+    until shortly before the next bus during a service gap, every
+    ``max_seconds`` while the page lists no buses at all (e.g. overnight), so
+    the first buses of the day are not missed, and with an exponential
+    back-off when nothing could be read.
+    """
+
+    def __init__(self):
+        self.enabled = os.environ.get('BUS_ADAPTIVE_REFRESH', 'true').lower() in ('1', 'true', 'yes')
+        self.min_seconds = int(os.environ.get('BUS_REFRESH_MIN_SECONDS', 60))
+        self.max_seconds = int(os.environ.get('BUS_REFRESH_MAX_SECONDS', 600))
+        # Refresh at the minimum interval while the next bus is this close
+        self.near_minutes = int(os.environ.get('BUS_REFRESH_NEAR_MINUTES', 10))
+        # A next bus further away than this is a service gap
+        self.gap_minutes = int(os.environ.get('BUS_REFRESH_GAP_MINUTES', 45))
+        self.gap_max_seconds = int(os.environ.get('BUS_REFRESH_GAP_MAX_SECONDS', 3600))
+        # Fraction of the time to the next bus (beyond near_minutes) to wait
+        self.scale = float(os.environ.get('BUS_REFRESH_SCALE', 0.5))
+        self._lock = threading.Lock()
+        self._pairs = {}
+
+    def record(self, key, bus_infos, now):
+        """
+        Schedule the next refresh of ``key`` after a fetch at ``now``;
+        ``bus_infos`` is empty when the page listed no buses and ``None``
+        when nothing could be read
+        """
+        with self._lock:
+            previous = self._pairs.get(key, {})
+            predictions = {
+                (info.bus_number, info.scheduled_departure_time): info.predicted_departure_time
+                for info in bus_infos or []
+            }
+
+            if bus_infos:
+                interval, reason = self._interval_for(bus_infos, previous.get('predictions', {}), predictions)
+                misses = 0
+            elif bus_infos is not None:
+                interval, reason = self.max_seconds, 'no_service'
+                misses = 0
+            else:
+                misses = previous.get('misses', 0) + 1
+                interval = min(self.min_seconds * 2 ** misses, self.gap_max_seconds)
+                reason = 'no_data'
+
+            self._pairs[key] = {
+                'predictions': predictions,
+                'misses': misses,
+                'fetches': previous.get('fetches', 0) + 1,
+                'interval_seconds': interval,
+                'reason': reason,
+                'next_refresh': now + timedelta(seconds=interval),
+            }
+            return self._pairs[key]['next_refresh']
+
+    def _interval_for(self, bus_infos, old_predictions, new_predictions):
+        minutes = [
+            info.estimated_departure_minutes for info in bus_infos
+            if info.estimated_departure_minutes is not None
+        ]
+        if not minutes:
+            return self.max_seconds, 'unknown'
+        next_minutes = min(minutes)
+
+        if next_minutes <= self.near_minutes:
+            return self.min_seconds, 'near'
+
+        lead_seconds = (next_minutes - self.near_minutes) * 60
+        if next_minutes >= self.gap_minutes:
+            # Nothing to watch until shortly before the next bus
+            return max(self.min_seconds, min(lead_seconds, self.gap_max_seconds)), 'gap'
+
+        interval = max(self.min_seconds, min(lead_seconds * self.scale, self.max_seconds))
+        if _predictions_changed(old_predictions, new_predictions):
+            return max(self.min_seconds, interval / 2), 'changing'
+        return interval, 'scaled'
+
+    def is_due(self, key, now):
+        with self._lock:
+            state = self._pairs.get(key)
+            return state is None or now >= state['next_refresh']
+
+    def next_due(self):
+        """The earliest scheduled refresh over all recorded pairs, or ``None``"""
+        with self._lock:
+            return min((state['next_refresh'] for state in self._pairs.values()), default=None)
+
+    def status(self):
+        """
+        Per pair schedule for the status endpoint
+        """
+        with self._lock:
+            return {
+                key: {
+                    'next_refresh': state['next_refresh'].isoformat(timespec='seconds'),
+                    'interval_seconds': int(state['interval_seconds']),
+                    'reason': state['reason'],
+                    'fetches': state['fetches'],
+                }
+                for key, state in self._pairs.items()
+            }
+
+
+def _predictions_changed(old_predictions, new_predictions):
+    """Whether any trip seen in both fetches moved by a minute or more"""
+    for trip, predicted in new_predictions.items():
+        old = old_predictions.get(trip)
+        if old is not None and predicted is not None and abs((predicted - old).total_seconds()) >= 60:
+            return True
+    return False
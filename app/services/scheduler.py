@@ -1,17 +1,36 @@
+import atexit
 import logging
+import os
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
-from datetime import datetime
+from datetime import datetime, timezone
 from app.services.bus_data_service import bus_data_service
+from app.services.compaction import history_compactor
+from app.services.leader_election import LeaderElection
+from app.services.scheduler_state import scheduler_state
+from app.services.snapshot_cache import snapshot_cache
 
 logger = logging.getLogger(__name__)
 
 class BusScheduler:
-    """Scheduler for bus data fetching"""
+    """
+    Scheduler for bus data fetching
+    
+    Every process (gunicorn worker or replica) creates one, but only the
+    elected leader runs the fetch and compaction jobs. Followers retry the
+    election periodically and take over when the leader exits.
+    """
     
     def __init__(self, app=None):
         self.app = app
-        self.scheduler = BackgroundScheduler()
+        # A fetch still running when its next run is due skips that run
+        # instead of piling up overlapping or queued catch-up runs
+        self.scheduler = BackgroundScheduler(job_defaults={'coalesce': True, 'max_instances': 1})
+        self.election = LeaderElection()
+        # How often followers try to take over leadership (seconds)
+        self.election_interval = int(os.environ.get('BUS_LEADER_RETRY_SECONDS', 15))
+        # How often due stop pairs are checked with adaptive refresh (seconds)
+        self.refresh_tick = int(os.environ.get('BUS_REFRESH_TICK_SECONDS', 30))
         
         if app:
             self.init_app(app)
@@ -20,26 +39,74 @@ class BusScheduler:
         """Initialize with Flask app"""
         self.app = app
         
+        # Other processes only see this one's scrapes through the shared
+        # snapshot file
+        snapshot_cache.share()
+        
         # Set up the scheduler
         self._setup_scheduler()
         
-        # Register shutdown function
-        app.teardown_appcontext(self._shutdown_scheduler)
+        # Shut down when the process exits (not per app context, which
+        # would stop the scheduler after the first request)
+        atexit.register(self.shutdown)
     
     def _setup_scheduler(self):
-        """Set up the scheduler jobs"""
-        # Schedule daytime job (every 5 minutes from 6:00 to 24:00)
-        self.scheduler.add_job(
-            self._fetch_bus_data,
-            CronTrigger(minute='*/5', hour='6-23'),
-            id='daytime_fetch'
-        )
+        """Start the scheduler as leader or as a follower waiting to take over"""
+        if self.election.try_acquire():
+            self._add_jobs()
+        else:
+            logger.info(f"Scheduler leader is {self.election.current_leader()}; running as follower")
+            self.scheduler.add_job(
+                self._campaign,
+                'interval',
+                seconds=self.election_interval,
+                id='leader_election'
+            )
         
-        # Schedule nighttime job (every 15 minutes from 0:00 to 6:00)
+        # Start the scheduler
+        self.scheduler.start()
+        logger.info("Bus data scheduler started")
+        self._publish_state()
+    
+    def _campaign(self):
+        """Take over the scraping jobs if the leader has gone away"""
+        if self.election.try_acquire():
+            logger.info("Scheduler leadership acquired; starting bus data jobs")
+            self.scheduler.remove_job('leader_election')
+            self._add_jobs()
+            self._publish_state()
+    
+    def _add_jobs(self):
+        """Add the leader's jobs"""
+        if bus_data_service.refresh_policy.enabled:
+            # Check frequently; each stop pair is only fetched when the
+            # refresh policy says it is due
+            self.scheduler.add_job(
+                self._fetch_bus_data,
+                'interval',
+                seconds=self.refresh_tick,
+                id='refresh_tick'
+            )
+        else:
+            # Schedule daytime job (every 5 minutes from 6:00 to 24:00)
+            self.scheduler.add_job(
+                self._fetch_bus_data,
+                CronTrigger(minute='*/5', hour='6-23'),
+                id='daytime_fetch'
+            )
+            
+            # Schedule nighttime job (every 15 minutes from 0:00 to 6:00)
+            self.scheduler.add_job(
+                self._fetch_bus_data,
+                CronTrigger(minute='*/15', hour='0-5'),
+                id='nighttime_fetch'
+            )
+        
+        # Schedule history compaction (daily at 3:30, outside peak hours)
         self.scheduler.add_job(
-            self._fetch_bus_data,
-            CronTrigger(minute='*/15', hour='0-5'),
-            id='nighttime_fetch'
+            self._compact_history,
+            CronTrigger(hour=3, minute=30),
+            id='history_compaction'
         )
         
         # Schedule a job to run at startup
@@ -49,29 +116,85 @@ class BusScheduler:
             run_date=datetime.now(),
             id='startup_fetch'
         )
-        
-        # Start the scheduler
-        self.scheduler.start()
-        logger.info("Bus data scheduler started")
     
     def _fetch_bus_data(self):
         """Fetch bus data with app context"""
         with self.app.app_context():
             try:
                 logger.info("Scheduled bus data fetch triggered")
-                success = bus_data_service.fetch_all_bus_data()
+                success = bus_data_service.fetch_all_bus_data(only_due=True)
                 if success:
                     logger.info("Scheduled bus data fetch completed successfully")
                 else:
                     logger.warning("Scheduled bus data fetch completed with errors")
             except Exception as e:
                 logger.error(f"Error in scheduled bus data fetch: {str(e)}")
+            finally:
+                self._publish_state()
+    
+    def _compact_history(self):
+        """Roll up and delete expired history with app context"""
+        with self.app.app_context():
+            try:
+                logger.info("Scheduled history compaction triggered")
+                summary = history_compactor.compact()
+                logger.info(f"Scheduled history compaction completed: {summary}")
+            except Exception as e:
+                logger.error(f"Error in scheduled history compaction: {str(e)}")
+    
+    def next_refresh(self):
+        """The next scheduled fetch in this process, or ``None``"""
+        if not self.scheduler.running:
+            return None
+        
+        run_times = [
+            job.next_run_time for job in self.scheduler.get_jobs()
+            if job.next_run_time and job.func == self._fetch_bus_data
+        ]
+        if not run_times:
+            return None
+        
+        next_run = min(run_times)
+        # With adaptive refresh, the first check at or after the earliest
+        # due stop pair (the tick is short, so this is close enough)
+        due = bus_data_service.refresh_policy.next_due() if bus_data_service.refresh_policy.enabled else None
+        if due is not None:
+            next_run = max(next_run, due.astimezone(next_run.tzinfo))
+        return next_run
+    
+    def status(self):
+        """
+        Leadership and refresh schedule for the status endpoint
+        """
+        if self.election.is_leader:
+            role = "leader"
+        elif self.scheduler.running:
+            role = "follower"
+        else:
+            role = "inactive"
+        
+        next_refresh = self.next_refresh()
+        return {
+            "role": role,
+            "identity": self.election.identity,
+            "leader": self.election.current_leader(),
+            "next_refresh": next_refresh.astimezone(timezone.utc).isoformat() if next_refresh else None,
+            "last_duration": bus_data_service.last_duration,
+            "refresh": bus_data_service.refresh_policy.status(),
+            "breakers": bus_data_service.breakers.status(),
+        }
+    
+    def _publish_state(self):
+        """Share the leader's schedule with the web workers"""
+        if self.election.is_leader:
+            scheduler_state.publish(self.status())
     
-    def _shutdown_scheduler(self, exception=None):
-        """Shut down the scheduler when the app context tears down"""
+    def shutdown(self):
+        """Shut down the scheduler and hand leadership to another process"""
         if self.scheduler.running:
-            self.scheduler.shutdown()
+            self.scheduler.shutdown(wait=False)
             logger.info("Bus data scheduler shutdown")
+        self.election.release()
 
 
 # Create an instance of the scheduler
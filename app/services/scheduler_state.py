@@ -0,0 +1,96 @@
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STATE_PATH = os.path.join('data', 'scheduler_state.json')
+
+
+class SchedulerState:
+    """
+    Refresh schedule and scheduler status shared with the web tier
+
+    The process running the scheduler publishes its status (role, leader,
+    next fetch time, duration of the last fetch) to a small JSON file, and
+    web workers, which do not import the scheduler or the browser stack,
+    read it to set Cache-Control and to report the scraper's status.
+    """
+
+    def __init__(self, path=None, check_interval=1.0):
+        self.path = path or os.environ.get('BUS_SCHEDULER_STATE_PATH', DEFAULT_STATE_PATH)
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._state = None
+        self._published = False
+        self._next_check = 0.0
+
+    def publish(self, state):
+        """
+        Record the scheduler status of this process and share it
+        """
+        with self._lock:
+            self._state = dict(state, updated_at=_utc_isoformat(datetime.now(timezone.utc)))
+            self._published = True
+            body = json.dumps(self._state)
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(body)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.error(f"Failed to write scheduler state: {str(e)}")
+
+    def read(self):
+        """
+        The latest published status, or ``None`` if no scheduler has
+        published one
+        """
+        with self._lock:
+            if self._published:
+                return self._state
+
+            now = time.monotonic()
+            if now < self._next_check:
+                return self._state
+            self._next_check = now + self.check_interval
+
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = None
+
+        with self._lock:
+            self._state = state
+        return state
+
+    def seconds_until_next_refresh(self, default=60):
+        """
+        Seconds until fresh data is expected: the next scheduled fetch plus
+        the duration of the last one. Returns ``default`` when unknown.
+        """
+        state = self.read()
+        if not state or not state.get('next_refresh'):
+            return default
+
+        next_refresh = datetime.fromisoformat(state['next_refresh'])
+        remaining = (next_refresh - datetime.now(timezone.utc)).total_seconds()
+        if remaining < 0:
+            # The scheduler has not published since that fetch was due
+            return default
+        return int(remaining + (state.get('last_duration') or 0))
+
+
+def _utc_isoformat(moment):
+    return moment.astimezone(timezone.utc).isoformat(timespec='seconds')
+
+
+# Create an instance of the shared state
+scheduler_state = SchedulerState()
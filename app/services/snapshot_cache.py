@@ -0,0 +1,559 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from flask import json
+from app.models.bus_info import BusInfo
+from app.services.stop_config import get_stop_pairs
+from app.services.timetable import timetable_store
+
+logger = logging.getLogger(__name__)
+
+# Shared snapshot file used when processes are split (see SnapshotCache.share)
+DEFAULT_SHARED_PATH = os.path.join('data', 'bus_info_snapshot.json')
+
+# Upcoming buses kept per stop pair (BusDataService stores the first three)
+MAX_DESTINATION_BUSES = 3
+
+# After a failed rebuild of an expired snapshot, serve the stale body and try
+# again after this many seconds
+REBUILD_RETRY_SECONDS = 30
+
+
+class CachedSnapshot:
+    """
+    A serialized response body with its content version
+
+    ``etag`` is derived from the body, so it only changes when the data does.
+    ``last_modified`` is the (UTC) time the underlying snapshot was scraped.
+    ``expires`` (local time) is when the body goes out of date even without
+    a new scrape, e.g. because the bus it shows has left.
+    """
+
+    __slots__ = ('body', 'etag', 'last_modified', 'expires')
+
+    def __init__(self, body, last_modified=None, expires=None):
+        self.body = body
+        self.etag = hashlib.sha1(body).hexdigest()
+        self.last_modified = last_modified
+        self.expires = expires
+
+    def expired(self, now=None):
+        return self.expires is not None and (now or datetime.now()) >= self.expires
+
+
+class SnapshotCache:
+    """
+    Read-through cache of serialized /api/bus-info responses
+
+    Entries are keyed by the ``origin`` filter (``None`` for all pairs) and
+    dropped whenever a scrape publishes a new snapshot. When ``shared_path``
+    is set, the process that publishes also writes the unfiltered body to
+    that file, and other processes (e.g. gunicorn workers) pick it up from
+    there instead of querying the database again.
+
+    ``wait_for_update`` lets streaming clients block until the unfiltered
+    snapshot changes.
+    """
+
+    def __init__(self, shared_path=None, check_interval=1.0):
+        self.shared_path = shared_path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._rebuild_lock = threading.Lock()
+        self._entries = {}
+        self._shared_version = None
+        self._next_check = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.rebuilds = 0
+        self.subscribers = 0
+        self._listeners = []
+        self._sync_thread = None
+        self._stop_sync = threading.Event()
+
+    def share(self, path=None):
+        """
+        Share snapshots through ``path`` (default ``data/bus_info_snapshot.json``)
+        unless a shared file is already configured
+        """
+        if not self.shared_path:
+            self.shared_path = path or DEFAULT_SHARED_PATH
+
+    def on_publish(self, callback):
+        """
+        Call ``callback(entry)`` with every new unfiltered snapshot, whether
+        published by this process or picked up from the shared file
+        """
+        self._listeners.append(callback)
+
+    def sync(self):
+        """
+        Pick up a snapshot published by another process, if there is one
+        """
+        self._sync_shared()
+
+    def start_sync(self, interval):
+        """
+        Call ``sync`` every ``interval`` seconds in a daemon thread, so
+        snapshots from another process reach the listeners even while no
+        request arrives (the read-only web tier)
+        """
+        with self._lock:
+            if self._sync_thread is not None:
+                return
+            self._stop_sync.clear()
+            self._sync_thread = threading.Thread(
+                target=self._sync_loop, args=(interval,), name='snapshot-sync', daemon=True
+            )
+        self._sync_thread.start()
+
+    def stop_sync(self):
+        with self._lock:
+            thread, self._sync_thread = self._sync_thread, None
+        if thread is not None:
+            self._stop_sync.set()
+            thread.join()
+
+    def _sync_loop(self, interval):
+        while not self._stop_sync.wait(interval):
+            try:
+                self.sync()
+            except Exception as e:
+                logger.error(f"Snapshot sync failed: {str(e)}")
+
+    def get(self, key, builder):
+        """
+        Return the cached snapshot for ``key``, building it with ``builder()``
+        (which returns a ``CachedSnapshot``) on a miss
+        """
+        self._sync_shared()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not entry.expired():
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        entry = builder()
+        with self._lock:
+            self._entries[key] = entry
+        return entry
+
+    def refresh(self, builder):
+        """
+        Drop all entries and rebuild the unfiltered snapshot after a scrape
+        has committed
+        """
+        entry = builder()
+
+        with self._lock:
+            self._entries = {None: entry}
+            self.rebuilds += 1
+            self._changed.notify_all()
+
+        if self.shared_path:
+            self._write_shared(entry)
+
+        self._notify(entry)
+        return entry
+
+    def wait_for_update(self, etag, timeout, builder=None):
+        """
+        Block until the unfiltered snapshot differs from ``etag`` and return
+        it, or return ``None`` after ``timeout`` seconds
+
+        With a ``builder``, an entry that expires while waiting (its bus has
+        left) is rebuilt, so streaming clients get the new body even when
+        no scrape publishes one.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            self._sync_shared()
+
+            with self._lock:
+                entry = self._entries.get(None)
+                if entry is not None and entry.etag != etag:
+                    return entry
+
+                expired = builder is not None and entry is not None and entry.expired()
+                if not expired:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return None
+
+                    # Snapshots from other processes only show up through the
+                    # shared file, so poll it while waiting
+                    if self.shared_path:
+                        remaining = min(remaining, max(self.check_interval, 0.05))
+                    if builder is not None and entry is not None and entry.expires is not None:
+                        until_expiry = (entry.expires - datetime.now()).total_seconds()
+                        remaining = min(remaining, max(until_expiry, 0.05))
+                    self._changed.wait(remaining)
+                    continue
+
+            self._rebuild_expired(entry, builder)
+
+    def _rebuild_expired(self, entry, builder):
+        """Replace the expired unfiltered ``entry``, one rebuild at a time"""
+        if not self._rebuild_lock.acquire(blocking=False):
+            # Another waiter is rebuilding it and will notify
+            with self._lock:
+                self._changed.wait(0.05)
+            return
+
+        try:
+            fresh = builder()
+        except Exception as e:
+            logger.error(f"Failed to rebuild expired snapshot: {str(e)}")
+            fresh = CachedSnapshot(
+                entry.body, entry.last_modified, datetime.now() + timedelta(seconds=REBUILD_RETRY_SECONDS)
+            )
+        finally:
+            self._rebuild_lock.release()
+
+        with self._lock:
+            if self._entries.get(None) is entry:
+                self._entries[None] = fresh
+                self._changed.notify_all()
+
+    def invalidate(self):
+        """
+        Drop all cached entries
+        """
+        with self._lock:
+            self._entries = {}
+
+    def subscribe(self, limit=None):
+        """
+        Count a new stream subscriber; returns False (and does not count
+        it) when ``limit`` subscribers are already connected
+        """
+        with self._lock:
+            if limit is not None and self.subscribers >= limit:
+                return False
+            self.subscribers += 1
+            return True
+
+    def unsubscribe(self):
+        with self._lock:
+            self.subscribers -= 1
+
+    def stats(self):
+        """
+        Hit/miss counters for the status endpoint
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "rebuilds": self.rebuilds,
+                "entries": len(self._entries),
+                "subscribers": self.subscribers,
+                "shared": bool(self.shared_path),
+            }
+
+    def _write_shared(self, entry):
+        directory = os.path.dirname(os.path.abspath(self.shared_path))
+        os.makedirs(directory, exist_ok=True)
+
+        # Write to a temporary file and rename so readers never see a partial body.
+        # The file's mtime carries the snapshot's Last-Modified time.
+        tmp_path = f"{self.shared_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(entry.body)
+            if entry.last_modified:
+                timestamp = entry.last_modified.replace(tzinfo=timezone.utc).timestamp()
+                os.utime(tmp_path, (timestamp, timestamp))
+            os.replace(tmp_path, self.shared_path)
+            with self._lock:
+                self._shared_version = _file_version(os.stat(self.shared_path))
+        except OSError as e:
+            logger.error(f"Failed to write shared snapshot cache: {str(e)}")
+
+    def _sync_shared(self):
+        """Load a snapshot published by another process, if there is a newer one"""
+        if not self.shared_path:
+            return
+
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.check_interval
+
+        try:
+            stat = os.stat(self.shared_path)
+            if _file_version(stat) == self._shared_version:
+                return
+            with open(self.shared_path, 'rb') as f:
+                body = f.read()
+        except OSError:
+            return
+
+        last_modified = datetime.fromtimestamp(stat.st_mtime, timezone.utc).replace(tzinfo=None)
+        entry = CachedSnapshot(body, last_modified, _body_expires(body))
+        with self._lock:
+            self._entries = {None: entry}
+            self._shared_version = _file_version(stat)
+            self._changed.notify_all()
+
+        self._notify(entry)
+
+    def _notify(self, entry):
+        for callback in self._listeners:
+            try:
+                callback(entry)
+            except Exception as e:
+                logger.error(f"Snapshot listener failed: {str(e)}")
+
+
+def _file_version(stat):
+    # The file is replaced (new inode) on every publish, so this changes even
+    # when two snapshots share the same mtime
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+class DestinationPayload:
+    """
+    Pre-serialized /api/bus-info/<destination> response for one stop pair
+
+    ``head`` is the JSON object without its closing brace and ``buses`` the
+    serialized upcoming buses, so any page of buses is served by joining
+    bytes. ``full`` is the default response with every bus.
+    """
+
+    __slots__ = ('head', 'buses', 'last_modified', 'expires', 'full')
+
+    def __init__(self, header, buses, last_modified=None, expires=None):
+        self.head = json.dumps(header).encode('utf-8')[:-1]
+        self.buses = [json.dumps(bus).encode('utf-8') for bus in buses]
+        self.last_modified = last_modified
+        self.expires = expires
+        self.full = self._join(0, MAX_DESTINATION_BUSES)
+
+    def page(self, offset=0, limit=MAX_DESTINATION_BUSES):
+        if offset == 0 and limit == MAX_DESTINATION_BUSES:
+            return self.full
+        return self._join(offset, limit)
+
+    def _join(self, offset, limit):
+        body = b''.join((
+            self.head,
+            b', "offset": %d, "limit": %d, "buses": [' % (offset, limit),
+            b', '.join(self.buses[offset:offset + limit]),
+            b']}',
+        ))
+        return CachedSnapshot(body, self.last_modified, self.expires)
+
+
+class DestinationIndex:
+    """
+    /api/bus-info/<destination> payloads keyed by destination, then origin
+
+    The whole index is built with one query on the first request after a
+    snapshot is published (it listens to ``SnapshotCache.on_publish``), and
+    again once the earliest bus it shows has left, so requests are a dict
+    lookup and a byte join.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = None
+        self._expires = None
+        self._generation = 0
+        self.rebuilds = 0
+
+    def invalidate(self, entry=None):
+        with self._lock:
+            self._index = None
+            self._generation += 1
+
+    def lookup(self, destination, builder):
+        """
+        ``{origin: DestinationPayload}`` for ``destination`` (empty when
+        unknown), building the index with ``builder()`` if needed
+        """
+        with self._lock:
+            index = self._index
+            if index is not None and self._expires is not None and datetime.now() >= self._expires:
+                index = None
+            generation = self._generation
+
+        if index is None:
+            index, expires = builder()
+            with self._lock:
+                # Keep it unless a newer snapshot was published meanwhile
+                if generation == self._generation:
+                    self._index, self._expires = index, expires
+                self.rebuilds += 1
+
+        return index.get(destination, {})
+
+
+def build_bus_info_snapshot(origin=None, now=None):
+    """
+    Serialize the /api/bus-info response for the current active snapshot
+
+    The timestamps in the body come from the data itself, so the body (and
+    its ETag) stays the same until a scrape publishes new rows. Pairs whose
+    scraped bus has already left (or that were never scraped) show the next
+    departure from the timetable instead, so the API keeps answering while
+    the scraper is down; such bodies expire when that bus leaves.
+    """
+    now = now or datetime.now()
+    pairs = [pair for pair in get_stop_pairs().values() if origin is None or pair.origin == origin]
+
+    # Get latest active bus info for each origin/destination pair,
+    # ordered as the pairs appear in the stop configuration
+    pair_order = {(pair.origin, pair.destination): i for i, pair in enumerate(pairs)}
+    live = {(info.origin, info.destination): info for info in BusInfo.get_latest_active(origin=origin)}
+
+    destinations = []
+    expires = []
+    for key in sorted(live.keys() | pair_order.keys(), key=lambda key: pair_order.get(key, len(pair_order))):
+        info = live.get(key)
+        departure = info and (info.predicted_departure_time or info.scheduled_departure_time)
+        if info is not None and (departure is None or departure > now or key not in pair_order):
+            destinations.append(info.to_dict())
+            if departure:
+                expires.append(departure)
+            continue
+
+        fallback = _timetable_bus_info(pairs[pair_order[key]], now)
+        if fallback is not None:
+            destinations.append(dict(fallback.to_dict(), data_source="timetable"))
+            # Minutes to departure change every minute
+            expires.append(now.replace(second=0, microsecond=0) + timedelta(minutes=1))
+        elif info is not None:
+            destinations.append(info.to_dict())
+
+    # Unchanged rows are kept across scrapes, so the last scrape that saw
+    # them is the time of the data (stored in UTC)
+    last_modified = max(
+        (info.last_seen_at or info.created_at for info in live.values() if info.created_at), default=None
+    )
+    update_time = _format_local(last_modified)
+    expires_at = min(expires, default=None)
+    from_timetable = any(destination.get("data_source") == "timetable" for destination in destinations)
+
+    # Format the response
+    response = {
+        "update_time": update_time,
+        "expires_at": expires_at.isoformat(timespec='seconds') if expires_at else None,
+        "system_status": {
+            "data_source": "API",  # This will be updated dynamically in future
+            "last_successful_update": update_time,
+            "health": "DEGRADED" if from_timetable else "OK"
+        },
+        "destinations": destinations
+    }
+
+    return CachedSnapshot(json.dumps(response).encode('utf-8'), last_modified, expires_at)
+
+
+def build_destination_index(now=None):
+    """
+    Build the DestinationIndex contents from the active snapshot
+
+    Each stop pair shows its scraped buses that have not left yet, or the
+    next departures from the timetable when none are left. Returns
+    ``({destination: {origin: DestinationPayload}}, expires)``.
+    """
+    now = now or datetime.now()
+    pairs = {(pair.origin, pair.destination): pair for pair in get_stop_pairs().values()}
+    rows_by_pair = BusInfo.get_active_by_pair()
+
+    index = defaultdict(dict)
+    expires = []
+    for key in rows_by_pair.keys() | pairs.keys():
+        rows = rows_by_pair.get(key, [])
+        buses = [row for row in rows if _departure(row) is None or _departure(row) > now]
+        data_source = "live"
+        pair_expires = min((_departure(row) for row in buses if _departure(row)), default=None)
+
+        if not buses and key in pairs:
+            fallback = _timetable_bus_infos(pairs[key], now, MAX_DESTINATION_BUSES)
+            if fallback:
+                buses, data_source = fallback, "timetable"
+                # Minutes to departure change every minute
+                pair_expires = now.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        if not buses:
+            # Nothing better to show than the last scrape
+            buses = rows
+        if not buses:
+            continue
+
+        last_modified = max((row.last_seen_at or row.created_at for row in rows if row.created_at), default=None)
+        header = {
+            "origin": key[0],
+            "destination": key[1],
+            "update_time": _format_local(last_modified),
+            "expires_at": pair_expires.isoformat(timespec='seconds') if pair_expires else None,
+            "data_source": data_source,
+            "total": min(len(buses), MAX_DESTINATION_BUSES),
+        }
+        index[key[1]][key[0]] = DestinationPayload(
+            header, [bus.to_dict() for bus in buses[:MAX_DESTINATION_BUSES]], last_modified, pair_expires
+        )
+        if pair_expires:
+            expires.append(pair_expires)
+
+    return dict(index), min(expires, default=None)
+
+
+def _departure(info):
+    return info.predicted_departure_time or info.scheduled_departure_time
+
+
+def _timetable_bus_info(pair, now):
+    """An unsaved BusInfo for the next departure of ``pair`` from the timetable"""
+    infos = _timetable_bus_infos(pair, now, count=1)
+    return infos[0] if infos else None
+
+
+def _timetable_bus_infos(pair, now, count):
+    """Unsaved BusInfo rows for the next ``count`` departures of ``pair`` from the timetable"""
+    return [
+        BusInfo(
+            origin=pair.origin,
+            destination=pair.destination,
+            bus_number=entry.bus_number,
+            stop_number=entry.stop_number,
+            scheduled_departure_time=entry.departure,
+            predicted_departure_time=entry.departure,
+            scheduled_arrival_time=entry.arrival,
+            predicted_arrival_time=entry.arrival,
+            estimated_departure_minutes=int((entry.departure - now).total_seconds() // 60),
+            is_next_bus=index == 0
+        )
+        for index, entry in enumerate(timetable_store.upcoming(pair, now, count=count))
+    ]
+
+
+def _body_expires(body):
+    """The ``expires_at`` of a serialized snapshot read from the shared file"""
+    try:
+        expires_at = json.loads(body).get("expires_at")
+        return datetime.fromisoformat(expires_at) if expires_at else None
+    except (ValueError, AttributeError):
+        return None
+
+
+def _format_local(utc_time):
+    if utc_time is None:
+        return None
+    return utc_time.replace(tzinfo=timezone.utc).astimezone().strftime("%Y-%m-%d %H:%M:%S")
+
+
+# Create an instance of the cache
+snapshot_cache = SnapshotCache(shared_path=os.environ.get('BUS_SNAPSHOT_CACHE_PATH') or None)
+
+# Per-destination payloads, rebuilt after every published snapshot
+destination_index = DestinationIndex()
+snapshot_cache.on_publish(destination_index.invalidate)
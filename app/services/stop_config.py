@@ -0,0 +1,92 @@
+import logging
+import os
+from urllib.parse import quote, urlencode
+import yaml
+
+logger = logging.getLogger(__name__)
+
+# 停留所設定ファイルの既定パス（リポジトリ直下の config/stops.yml）
+DEFAULT_CONFIG_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    'config', 'stops.yml'
+)
+
+
+class StopPair:
+    """出発停留所と目的地の組み合わせ"""
+
+    __slots__ = ('origin', 'destination', 'backend', 'interval_minutes', 'to_type')
+
+    def __init__(self, origin, destination, backend=None, interval_minutes=None, to_type=1):
+        self.origin = origin
+        self.destination = destination
+        self.backend = backend
+        self.interval_minutes = interval_minutes
+        self.to_type = to_type
+
+    @property
+    def key(self):
+        """
+        組み合わせを一意に識別するキー
+        """
+        return f"{self.origin}→{self.destination}"
+
+    @property
+    def url_suffix(self):
+        """
+        バスナビの検索ページのURL（base_urlからの相対パス）
+        """
+        params = {
+            'tabName': 'searchTab',
+            'from': self.origin,
+            'to': self.destination,
+            'toType': self.to_type,
+            'locale': 'ja',
+        }
+        return 'bus.htm?' + urlencode(params, quote_via=quote)
+
+    def __repr__(self):
+        return f"<StopPair {self.key}>"
+
+
+def load_stop_pairs(path=None):
+    """
+    設定ファイルから停留所の組み合わせを読み込み、キー順を保った辞書で返す
+    """
+    path = path or os.environ.get('BUS_STOPS_CONFIG', DEFAULT_CONFIG_PATH)
+    with open(path, encoding='utf-8') as f:
+        config = yaml.safe_load(f) or {}
+
+    pairs = {}
+    for stop in config.get('stops', []):
+        origin = stop['origin']
+        for destination in stop.get('destinations', []):
+            if isinstance(destination, str):
+                destination = {'name': destination}
+
+            pair = StopPair(
+                origin,
+                destination['name'],
+                backend=destination.get('backend', stop.get('backend')),
+                interval_minutes=destination.get('interval_minutes', stop.get('interval_minutes')),
+                to_type=destination.get('to_type', stop.get('to_type', 1))
+            )
+            if pair.key in pairs:
+                logger.warning(f"停留所の組み合わせが重複しています: {pair.key}")
+            pairs[pair.key] = pair
+
+    logger.info(f"{len(pairs)}件の停留所の組み合わせを読み込みました: {path}")
+    return pairs
+
+
+_stop_pairs = None
+
+
+def get_stop_pairs():
+    """
+    読み込み済みの停留所の組み合わせを取得（初回呼び出し時に読み込む）
+    """
+    global _stop_pairs
+    if _stop_pairs is None:
+        _stop_pairs = load_stop_pairs()
+    return _stop_pairs
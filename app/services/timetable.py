@@ -0,0 +1,209 @@
+import bisect
+import glob
+import logging
+import os
+import threading
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+import yaml
+
+logger = logging.getLogger(__name__)
+
+# 時刻表ファイルの既定の置き場所（リポジトリ直下の config/timetables）
+DEFAULT_TIMETABLE_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    'config', 'timetables'
+)
+
+# 時刻表の1便分のデータ
+TimetableEntry = namedtuple('TimetableEntry', 'bus_number stop_number departure arrival')
+
+# ダイヤの種類ごとに、定義がない場合に代わりに使うダイヤ
+DAY_TYPE_FALLBACKS = {
+    'weekday': ('weekday', 'daily'),
+    'saturday': ('saturday', 'holiday', 'daily'),
+    'holiday': ('holiday', 'daily'),
+}
+
+
+class TimetableStore:
+    """
+    停留所の組み合わせごとの時刻表
+
+    config/timetables/*.yml を読み込み、運行日（深夜の便は前日扱い）ごとに
+    平日・土曜・休日ダイヤを選んで発車時刻順の一覧をメモリ上に作成する。
+    検索は二分探索で行う。ファイルは運行日が変わるたびに読み直す。
+    """
+
+    def __init__(self, directory=None, day_start_hour=3):
+        self.directory = directory or os.environ.get('BUS_TIMETABLE_DIR', DEFAULT_TIMETABLE_DIR)
+        # この時刻より前の便は前日の運行日に属する
+        self.day_start_hour = day_start_hour
+        self._lock = threading.Lock()
+        self._loaded_for = None
+        self._timetables = {}
+        self._holidays = set()
+        self._days = {}
+
+    def service_date(self, moment):
+        """
+        時刻が属する運行日
+        """
+        return (moment - timedelta(hours=self.day_start_hour)).date()
+
+    def day_type(self, service_date):
+        """
+        運行日のダイヤの種類（weekday / saturday / holiday）
+        """
+        if service_date in self._holidays or service_date.weekday() == 6:
+            return 'holiday'
+        if service_date.weekday() == 5:
+            return 'saturday'
+        return 'weekday'
+
+    def upcoming(self, pair, now, count=3):
+        """
+        now 以降に発車する便を発車時刻順に最大 count 件返す
+        """
+        result = []
+        with self._lock:
+            service_date = self.service_date(now)
+            self._ensure_loaded(service_date)
+            for day in (service_date, service_date + timedelta(days=1)):
+                departures, entries = self._day(pair.key, day)
+                start = bisect.bisect_left(departures, now)
+                result.extend(entries[start:start + count - len(result)])
+                if len(result) >= count:
+                    break
+        return result
+
+    def find(self, pair, around, bus_number=None, window=timedelta(minutes=30)):
+        """
+        around に最も近い発車時刻の便を返す（window 以内に見つからなければNone）
+
+        bus_number を指定した場合はその系統の便のみを対象とする
+        """
+        best = None
+        with self._lock:
+            service_date = self.service_date(around)
+            self._ensure_loaded(service_date)
+            for offset in (-1, 0, 1):
+                departures, entries = self._day(pair.key, service_date + timedelta(days=offset))
+                lo = bisect.bisect_left(departures, around - window)
+                hi = bisect.bisect_right(departures, around + window)
+                for entry in entries[lo:hi]:
+                    if bus_number and entry.bus_number != bus_number:
+                        continue
+                    if best is None or abs(entry.departure - around) < abs(best.departure - around):
+                        best = entry
+        return best
+
+    def _ensure_loaded(self, service_date):
+        """運行日が変わったら時刻表ファイルを読み直す"""
+        if self._loaded_for == service_date:
+            return
+        self._timetables, self._holidays = load_timetables(self.directory)
+        self._days = {}
+        self._loaded_for = service_date
+
+    def _day(self, pair_key, service_date):
+        """運行日の便の一覧（発車時刻のリストと便のリスト）を作成してキャッシュする"""
+        key = (pair_key, service_date)
+        if key not in self._days:
+            # 前日より古い運行日の一覧は不要
+            for old in [k for k in self._days if k[1] < service_date - timedelta(days=1)]:
+                del self._days[old]
+            self._days[key] = self._build_day(pair_key, service_date)
+        return self._days[key]
+
+    def _build_day(self, pair_key, service_date):
+        timetable = self._timetables.get(pair_key)
+        if not timetable:
+            return [], []
+
+        day_type = self.day_type(service_date)
+        trips = next((timetable[name] for name in DAY_TYPE_FALLBACKS[day_type] if name in timetable), [])
+
+        midnight = datetime.combine(service_date, datetime.min.time())
+        entries = sorted(
+            (
+                TimetableEntry(
+                    bus_number=bus_number,
+                    stop_number=stop_number,
+                    departure=midnight + timedelta(minutes=minutes),
+                    arrival=midnight + timedelta(minutes=minutes + ride_minutes) if ride_minutes is not None else None
+                )
+                for minutes, bus_number, stop_number, ride_minutes in trips
+            ),
+            key=lambda entry: entry.departure
+        )
+        return [entry.departure for entry in entries], entries
+
+
+def load_timetables(directory):
+    """
+    時刻表ファイルを読み込み、（組み合わせのキー → ダイヤの種類 → 便の一覧）と祝日の集合を返す
+
+    ファイルの形式:
+
+        origin: 野崎
+        destination: 三鷹駅
+        weekday:
+          鷹52:
+            stop_number: "4"
+            ride_minutes: 20
+            departures: ["06:05", "06:25", "24:10"]
+        holiday: ...
+        holidays: [2025-05-05, 2025-05-06]   # 休日ダイヤで運行する日（任意）
+    """
+    timetables = {}
+    holidays = set()
+    for path in sorted(glob.glob(os.path.join(directory, '*.yml'))):
+        try:
+            with open(path, encoding='utf-8') as f:
+                config = yaml.safe_load(f) or {}
+
+            holidays.update(_parse_date(value) for value in config.get('holidays') or [])
+            if 'origin' not in config or 'destination' not in config:
+                continue
+
+            key = f"{config['origin']}→{config['destination']}"
+            timetable = {}
+            for day_type in ('weekday', 'saturday', 'holiday', 'daily'):
+                routes = config.get(day_type)
+                if not routes:
+                    continue
+                timetable[day_type] = [
+                    (_parse_minutes(departure), str(bus_number), str(route.get('stop_number', '1')),
+                     route.get('ride_minutes'))
+                    for bus_number, route in routes.items()
+                    for departure in route.get('departures', [])
+                ]
+            timetables[key] = timetable
+        except Exception as e:
+            logger.error(f"時刻表ファイルの読み込みに失敗しました: {path}, エラー: {str(e)}")
+
+    if timetables:
+        logger.info(f"{len(timetables)}件の停留所の組み合わせの時刻表を読み込みました: {directory}")
+    return timetables, holidays
+
+
+def _parse_minutes(value):
+    """
+    "HH:MM" を運行日の0時からの分数に変換（24時以降の深夜便は "24:10" のように書く）
+    """
+    if isinstance(value, int):
+        # 引用符なしの 06:05 はYAMLで60進数（= 分数）として読み込まれる
+        return value
+    hour, minute = map(int, str(value).split(':'))
+    return hour * 60 + minute
+
+
+def _parse_date(value):
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value), '%Y-%m-%d').date()
+
+
+# Create an instance of the store
+timetable_store = TimetableStore()
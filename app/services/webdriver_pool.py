@@ -0,0 +1,148 @@
+import logging
+import queue
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# ブラウザのJSヒープ使用量を取得するスクリプト（Chrome専用のAPI）
+_MEMORY_SCRIPT = "return (window.performance && performance.memory) ? performance.memory.usedJSHeapSize : null;"
+
+
+class WebDriverPool:
+    """
+    同時に起動するWebDriverセッション数を制限し、セッションを再利用するプール
+
+    返却されたセッションは破棄せずに保持し、次回の取得時にヘルスチェックを
+    行ってから再利用する。一定回数使用したセッションや、メモリ使用量が
+    上限を超えたセッションは終了して作り直す。
+    """
+
+    def __init__(self, factory, max_size, max_uses=None, max_memory_mb=None):
+        self.factory = factory
+        self.max_size = max(1, max_size)
+        self.max_uses = max_uses
+        self.max_memory_mb = max_memory_mb
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.max_size)
+        self._lock = threading.Lock()
+        self._uses = {}
+        self._closed = False
+        self.created_count = 0
+        self.recycled_count = 0
+
+    def acquire(self):
+        """
+        空いているドライバーを取得（なければ上限までの範囲で新規作成）
+        """
+        self._slots.acquire()
+        try:
+            while True:
+                try:
+                    driver = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+
+                if self._is_healthy(driver):
+                    return driver
+                logger.warning("応答しないブラウザセッションを破棄します")
+                self._quit(driver)
+
+            driver = self.factory()
+            with self._lock:
+                self._uses[driver] = 0
+                self.created_count += 1
+            return driver
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, driver, discard=False):
+        """
+        ドライバーをプールに返却（discard=Trueの場合や再作成が必要な場合は破棄）
+        """
+        try:
+            with self._lock:
+                uses = self._uses.get(driver, 0) + 1
+                self._uses[driver] = uses
+
+            if discard or self._closed:
+                self._quit(driver)
+            elif self._needs_recycle(driver, uses):
+                with self._lock:
+                    self.recycled_count += 1
+                self._quit(driver)
+            else:
+                self._idle.put(driver)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def session(self):
+        """
+        with文でドライバーを借りるためのヘルパー
+
+        処理中に例外が発生したセッションは壊れている可能性があるため破棄する
+        """
+        driver = self.acquire()
+        discard = False
+        try:
+            yield driver
+        except Exception:
+            discard = True
+            raise
+        finally:
+            self.release(driver, discard=discard)
+
+    def size(self):
+        """
+        現在起動しているドライバーの数
+        """
+        with self._lock:
+            return len(self._uses)
+
+    def close(self):
+        """
+        プール内のすべてのドライバーを終了
+        """
+        self._closed = True
+        with self._lock:
+            drivers = list(self._uses)
+        for driver in drivers:
+            self._quit(driver)
+
+    def _is_healthy(self, driver):
+        try:
+            driver.current_url
+            return True
+        except Exception as e:
+            logger.debug(f"ブラウザセッションのヘルスチェックに失敗しました: {str(e)}")
+            return False
+
+    def _needs_recycle(self, driver, uses):
+        if self.max_uses and uses >= self.max_uses:
+            logger.info(f"使用回数が上限（{self.max_uses}回）に達したため、ブラウザセッションを再作成します")
+            return True
+
+        if self.max_memory_mb:
+            memory_mb = self._memory_usage_mb(driver)
+            if memory_mb is not None and memory_mb > self.max_memory_mb:
+                logger.info(f"メモリ使用量（{memory_mb:.0f}MB）が上限を超えたため、ブラウザセッションを再作成します")
+                return True
+
+        return False
+
+    def _memory_usage_mb(self, driver):
+        try:
+            used = driver.execute_script(_MEMORY_SCRIPT)
+        except Exception:
+            return None
+        return used / (1024 * 1024) if used else None
+
+    def _quit(self, driver):
+        with self._lock:
+            self._uses.pop(driver, None)
+        try:
+            driver.quit()
+        except Exception as e:
+            logger.debug(f"ドライバーの終了に失敗しました: {str(e)}")
@@ -1,7 +1,9 @@
 // Configuration
 const API_URL = '/api/bus-info';
+const STREAM_URL = '/api/bus-info/stream';
 const SYSTEM_STATUS_URL = '/api/system-status';
 const REFRESH_INTERVAL = 60000; // 1 minute in milliseconds
+const STREAM_RETRY_INTERVAL = 300000; // Retry a refused stream after 5 minutes
 
 // DOM Elements
 const busInfoContainer = document.getElementById('bus-info-container');
@@ -13,6 +15,7 @@ const busCardTemplate = document.getElementById('bus-card-template');
 let busData = [];
 let lastUpdateTime = null;
 let updateTimer = null;
+let eventSource = null;
 let countdownIntervals = [];
 
 // Initialize
@@ -21,15 +24,62 @@ document.addEventListener('DOMContentLoaded', function() {
 });
 
 function initializeApp() {
-    fetchBusData();
-    
-    // Set up regular refresh
-    updateTimer = setInterval(fetchBusData, REFRESH_INTERVAL);
+    if (window.EventSource) {
+        // Receive a push for every new snapshot; the stream also delivers
+        // the current data as soon as it connects
+        connectStream();
+    } else {
+        fetchBusData();
+        startPolling();
+    }
     
     // Set up visibility change detection (to pause/resume when tab is inactive)
     document.addEventListener('visibilitychange', handleVisibilityChange);
 }
 
+function connectStream() {
+    eventSource = new EventSource(STREAM_URL);
+    
+    eventSource.addEventListener('snapshot', function(event) {
+        try {
+            handleBusData(JSON.parse(event.data));
+        } catch (error) {
+            console.error('Error handling bus data event:', error);
+        }
+    });
+    
+    eventSource.addEventListener('open', function() {
+        // The stream is live again, so polling is no longer needed
+        stopPolling();
+    });
+    
+    eventSource.addEventListener('error', function() {
+        // EventSource reconnects by itself; poll in the meantime
+        if (!updateTimer) {
+            fetchBusData();
+            startPolling();
+        }
+        // Refused streams (e.g. 503 when the server is at its stream limit)
+        // are not retried by EventSource: keep polling and try again later
+        if (eventSource.readyState === EventSource.CLOSED) {
+            setTimeout(connectStream, STREAM_RETRY_INTERVAL);
+        }
+    });
+}
+
+function startPolling() {
+    if (!updateTimer) {
+        updateTimer = setInterval(fetchBusData, REFRESH_INTERVAL);
+    }
+}
+
+function stopPolling() {
+    if (updateTimer) {
+        clearInterval(updateTimer);
+        updateTimer = null;
+    }
+}
+
 function handleVisibilityChange() {
     if (document.hidden) {
         // Pause countdown timers when tab is not visible
@@ -47,22 +97,16 @@ async function fetchBusData() {
             busInfoContainer.innerHTML = '<div class="loading">データを読み込み中...</div>';
         }
         
-        // Fetch the bus data
-        const response = await fetch(API_URL);
+        // Fetch the bus data. 'no-cache' makes the browser revalidate its
+        // cached copy with If-None-Match, so unchanged data costs a 304.
+        const response = await fetch(API_URL, { cache: 'no-cache' });
         
         if (!response.ok) {
             throw new Error(`API responded with status: ${response.status}`);
         }
         
         const data = await response.json();
-        
-        // Update the UI
-        updateBusInfo(data);
-        updateSystemStatus(data.system_status);
-        
-        // Update last update time
-        lastUpdateTime = data.update_time;
-        updateTimeElement.textContent = formatTime(lastUpdateTime);
+        handleBusData(data);
         
     } catch (error) {
         console.error('Error fetching bus data:', error);
@@ -71,6 +115,16 @@ async function fetchBusData() {
     }
 }
 
+function handleBusData(data) {
+    // Update the UI
+    updateBusInfo(data);
+    updateSystemStatus(data.system_status);
+    
+    // Update last update time
+    lastUpdateTime = data.update_time;
+    updateTimeElement.textContent = formatTime(lastUpdateTime);
+}
+
 function updateBusInfo(data) {
     // Clear existing content and intervals
     busInfoContainer.innerHTML = '';
@@ -1,5 +1,7 @@
 import pytest
 from app import create_app, db
+from app.services.recent_history import recent_history
+from app.services.snapshot_cache import destination_index, snapshot_cache
 
 @pytest.fixture
 def app():
@@ -13,6 +15,11 @@ def app():
     with app.app_context():
         db.create_all()
     
+    # Cached responses must not leak between test apps
+    snapshot_cache.invalidate()
+    destination_index.invalidate()
+    recent_history.clear()
+    
     yield app
     
     # Clean up
@@ -1,5 +1,9 @@
 import json
+import time
+from app.api import routes
 from app.models.bus_info import BusInfo
+from app.services import snapshot_cache as snapshot_cache_module
+from app.services.snapshot_cache import build_bus_info_snapshot, snapshot_cache
 from datetime import datetime, timedelta
 
 def test_get_bus_info_empty(client):
@@ -58,4 +62,249 @@ def test_system_status(client):
     
     assert 'status' in data
     assert 'last_update' in data
-    assert 'health' in data
\ No newline at end of file
+    assert 'health' in data
+
+def test_get_bus_info_shows_the_next_bus(client, app):
+    """Of a scrape's rows, which share created_at, the API shows the next bus"""
+    with app.app_context():
+        now = datetime.now()
+        BusInfo.publish_snapshot({
+            ('野崎', '三鷹駅'): [
+                BusInfo(origin='野崎', destination='三鷹駅', bus_number=f'鷹5{n}',
+                        scheduled_departure_time=now + timedelta(minutes=5 + 10 * n),
+                        predicted_departure_time=now + timedelta(minutes=5 + 10 * n),
+                        estimated_departure_minutes=5 + 10 * n, is_next_bus=(n == 0))
+                for n in range(3)
+            ]
+        })
+        snapshot_cache.invalidate()
+
+    data = json.loads(client.get('/api/bus-info').data)
+    assert len(data['destinations']) == 1
+    assert data['destinations'][0]['bus_number'] == '鷹50'
+    assert data['destinations'][0]['is_next_bus'] is True
+
+def test_get_bus_info_conditional(client, app):
+    """The bus info API supports ETag/Last-Modified revalidation"""
+    with app.app_context():
+        BusInfo.query.session.add(BusInfo(
+            origin='野崎',
+            destination='三鷹駅',
+            bus_number='鷹52',
+            created_at=datetime(2025, 5, 8, 3, 30, 40),
+            is_active=True
+        ))
+        BusInfo.query.session.commit()
+
+    response = client.get('/api/bus-info')
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    assert response.headers['Last-Modified'] == 'Thu, 08 May 2025 03:30:40 GMT'
+    assert 'max-age' in response.headers['Cache-Control']
+
+    # The body does not change between requests while the snapshot is the same
+    assert client.get('/api/bus-info').data == response.data
+
+    not_modified = client.get('/api/bus-info', headers={'If-None-Match': etag})
+    assert not_modified.status_code == 304
+    assert not_modified.data == b''
+
+    changed = client.get('/api/bus-info', headers={'If-None-Match': '"stale"'})
+    assert changed.status_code == 200
+
+def test_bus_info_stream(client, app, monkeypatch):
+    """The SSE stream sends the current snapshot, heartbeats and new snapshots"""
+    monkeypatch.setattr(routes, 'SSE_HEARTBEAT_SECONDS', 0.05)
+
+    response = client.get('/api/bus-info/stream', buffered=False)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+
+    events = iter(response.response)
+    assert next(events).startswith(b'retry:')
+    first = next(events).decode('utf-8')
+    assert first.startswith('id: ')
+    assert 'event: snapshot' in first
+    etag = first.split('\n')[0][len('id: '):]
+    assert next(events) == b': heartbeat\n\n'
+
+    with app.app_context():
+        BusInfo.publish_snapshot({('野崎', '三鷹駅'): [
+            BusInfo(origin='野崎', destination='三鷹駅', bus_number='鷹52', is_active=True)
+        ]})
+        snapshot_cache.refresh(build_bus_info_snapshot)
+
+    update = next(events).decode('utf-8')
+    assert f'id: {etag}' not in update
+    data = json.loads(update.split('data: ', 1)[1])
+    assert data['destinations'][0]['bus_number'] == '鷹52'
+    response.close()
+
+    # Resuming with the current id skips straight to heartbeats
+    current_etag = update.split('\n')[0][len('id: '):]
+    resumed = client.get('/api/bus-info/stream', headers={'Last-Event-ID': current_etag}, buffered=False)
+    events = iter(resumed.response)
+    next(events)
+    assert next(events) == b': heartbeat\n\n'
+    resumed.close()
+
+def test_bus_info_stream_rebuilds_expired_snapshot(client, app, monkeypatch):
+    """Stream clients get the timetable fallback once the shown bus has left"""
+    monkeypatch.setattr(routes, 'SSE_HEARTBEAT_SECONDS', 5)
+    monkeypatch.setattr(snapshot_cache_module, '_timetable_bus_infos', lambda pair, now, count: [
+        BusInfo(origin=pair.origin, destination=pair.destination, bus_number='鷹51',
+                scheduled_departure_time=now + timedelta(minutes=10), estimated_departure_minutes=10)
+    ])
+
+    with app.app_context():
+        BusInfo.publish_snapshot({('野崎', '三鷹駅'): [
+            BusInfo(origin='野崎', destination='三鷹駅', bus_number='鷹52',
+                    predicted_departure_time=datetime.now() + timedelta(seconds=1.5))
+        ]})
+        snapshot_cache.refresh(build_bus_info_snapshot)
+
+    # The stream hands its database connection back between waits
+    removals = []
+    remove = routes.db.session.remove
+    monkeypatch.setattr(routes.db.session, 'remove', lambda: removals.append(1) or remove())
+
+    response = client.get('/api/bus-info/stream', buffered=False)
+    try:
+        events = iter(response.response)
+        next(events)
+        first = json.loads(next(events).decode('utf-8').split('data: ', 1)[1])
+        assert [d['bus_number'] for d in first['destinations'] if d['destination'] == '三鷹駅'] == ['鷹52']
+
+        # The other pairs' timetable countdowns also expire at each minute:
+        # read updates until the departure of 鷹52 shows up
+        started = time.monotonic()
+        mitaka = []
+        while not mitaka or mitaka[0]['bus_number'] == '鷹52':
+            update = next(events).decode('utf-8')
+            assert 'event: snapshot' in update
+            assert time.monotonic() - started < 4
+            mitaka = [d for d in json.loads(update.split('data: ', 1)[1])['destinations'] if d['destination'] == '三鷹駅']
+        assert (mitaka[0]['bus_number'], mitaka[0]['data_source']) == ('鷹51', 'timetable')
+        assert removals
+    finally:
+        response.close()
+
+def test_bus_info_stream_limit(client, monkeypatch):
+    """Streams past the per-process limit are refused so clients poll instead"""
+    monkeypatch.setattr(routes, 'SSE_MAX_SUBSCRIBERS', 1)
+
+    first = client.get('/api/bus-info/stream', buffered=False)
+    assert first.status_code == 200
+    refused = client.get('/api/bus-info/stream')
+    assert refused.status_code == 503
+    assert snapshot_cache.stats()['subscribers'] == 1
+
+    first.close()
+    assert snapshot_cache.stats()['subscribers'] == 0
+    second = client.get('/api/bus-info/stream', buffered=False)
+    assert second.status_code == 200
+    second.close()
+
+def _add_history_rows(app, count):
+    with app.app_context():
+        base = datetime.utcnow() - timedelta(hours=1)
+        for i in range(count):
+            BusInfo.query.session.add(BusInfo(
+                origin='野崎',
+                destination='三鷹駅' if i % 2 == 0 else '吉祥寺駅',
+                bus_number=f'鷹{i}',
+                # Pairs of rows share a timestamp so the id tie-breaker matters
+                created_at=base + timedelta(minutes=i // 2),
+                is_active=False
+            ))
+        BusInfo.query.session.commit()
+
+
+def test_bus_history_keyset_pagination(client, app):
+    """History pages follow the cursor without gaps or duplicates"""
+    _add_history_rows(app, 7)
+
+    seen = []
+    cursor = None
+    while True:
+        query = {'limit': 3}
+        if cursor:
+            query['cursor'] = cursor
+        data = json.loads(client.get('/api/bus-info/history', query_string=query).data)
+        seen.extend(item['id'] for item in data['items'])
+        cursor = data['next_cursor']
+        if not cursor:
+            break
+
+    assert seen == sorted(seen, reverse=True)
+    assert len(seen) == len(set(seen)) == 7
+
+    filtered = json.loads(client.get('/api/bus-info/history', query_string={'destination': '吉祥寺駅'}).data)
+    assert filtered['count'] == 3
+    assert {item['destination'] for item in filtered['items']} == {'吉祥寺駅'}
+
+
+def test_bus_history_streaming_exports(client, app, monkeypatch):
+    """NDJSON and CSV exports stream every row in batches"""
+    monkeypatch.setattr(routes, 'HISTORY_STREAM_BATCH_SIZE', 2)
+    _add_history_rows(app, 5)
+
+    response = client.get('/api/bus-info/history?format=ndjson')
+    assert response.mimetype == 'application/x-ndjson'
+    lines = response.data.decode('utf-8').splitlines()
+    assert len(lines) == 5
+    assert json.loads(lines[0])['bus_number'] == '鷹4'
+
+    response = client.get('/api/bus-info/history?format=csv&destination=三鷹駅')
+    assert response.mimetype == 'text/csv'
+    rows = response.data.decode('utf-8').splitlines()
+    assert rows[0].startswith('id,created_at,origin,destination')
+    assert len(rows) == 4
+
+
+def test_bus_history_invalid_parameters(client):
+    """Malformed history parameters are rejected with 400"""
+    assert client.get('/api/bus-info/history?from=yesterday').status_code == 400
+    assert client.get('/api/bus-info/history?cursor=not-a-cursor').status_code == 400
+    assert client.get('/api/bus-info/history?limit=0').status_code == 400
+    assert client.get('/api/bus-info/history?format=xml').status_code == 400
+
+def test_get_destination_bus_info(client, app):
+    """One destination's upcoming buses are paged from the destination index"""
+    now = datetime.now()
+    with app.app_context():
+        BusInfo.publish_snapshot({
+            ('野崎', '三鷹駅'): [
+                BusInfo(origin='野崎', destination='三鷹駅', bus_number=f'鷹5{i}', is_next_bus=i == 0,
+                        scheduled_departure_time=now + timedelta(minutes=10 * (i + 1)),
+                        estimated_departure_minutes=10 * (i + 1))
+                for i in range(3)
+            ],
+            ('野崎', '吉祥寺駅'): [BusInfo(origin='野崎', destination='吉祥寺駅', bus_number='吉64')],
+        })
+        snapshot_cache.refresh(build_bus_info_snapshot)
+
+    response = client.get('/api/bus-info/三鷹駅')
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert (data['origin'], data['total'], data['data_source']) == ('野崎', 3, 'live')
+    assert [bus['bus_number'] for bus in data['buses']] == ['鷹50', '鷹51', '鷹52']
+
+    page = json.loads(client.get('/api/bus-info/三鷹駅?offset=1&limit=1').data)
+    assert (page['offset'], page['limit'], [bus['bus_number'] for bus in page['buses']]) == (1, 1, ['鷹51'])
+
+    assert client.get('/api/bus-info/三鷹駅', headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+    assert client.get('/api/bus-info/三鷹駅?limit=4').status_code == 400
+    assert client.get('/api/bus-info/新宿駅').status_code == 404
+
+    # Served from the index until the next snapshot is published
+    rebuilds = routes.destination_index.rebuilds
+    client.get('/api/bus-info/吉祥寺駅')
+    assert routes.destination_index.rebuilds == rebuilds
+
+    with app.app_context():
+        BusInfo.publish_snapshot({('野崎', '三鷹駅'): [BusInfo(origin='野崎', destination='三鷹駅', bus_number='鷹55')]})
+        snapshot_cache.refresh(build_bus_info_snapshot)
+    data = json.loads(client.get('/api/bus-info/三鷹駅').data)
+    assert [bus['bus_number'] for bus in data['buses']] == ['鷹55']
+    assert routes.destination_index.rebuilds == rebuilds + 1
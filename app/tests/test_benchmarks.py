@@ -0,0 +1,33 @@
+import requests
+from benchmarks.run import compare
+from benchmarks.stub_site import StubTransitSite, load_fixture
+from app.services.api_client import BusApiClient
+
+
+def test_stub_site_serves_fixtures_and_failures():
+    """The stub site serves recorded pages and fails on demand"""
+    with StubTransitSite() as site:
+        page = requests.get(f"{site.page_base_url}/bus.htm", params={'from': '野崎', 'to': '三鷹駅'})
+        assert page.status_code == 200
+        assert page.content == load_fixture('三鷹駅')
+
+        client = BusApiClient(site.api_endpoint, retry_count=0)
+        entries = client.fetch_departures('野崎', '吉祥寺駅')
+        assert len(entries) == 12
+        assert entries[0]['bus_number'] == '吉64'
+        client.close()
+
+        assert requests.get(site.api_endpoint, params={'to': '新宿駅'}).status_code == 404
+
+    with StubTransitSite(failure_rate=1.0) as site:
+        assert requests.get(site.api_endpoint, params={'to': '三鷹駅'}).status_code == 503
+        assert site.failures == 1
+
+
+def test_compare_reports_regressions(capsys):
+    baseline = {"results": {"a": {"median_ms": 1.0}, "b": {"median_ms": 2.0}}}
+    current = {"results": {"a": {"median_ms": 1.5}, "b": {"median_ms": 1.0}, "c": {"median_ms": 3.0}}}
+
+    assert compare(current, baseline, threshold=0.2) == ["a"]
+    output = capsys.readouterr().out
+    assert "REGRESSION" in output and "improved" in output and "new" in output
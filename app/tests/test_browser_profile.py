@@ -0,0 +1,91 @@
+from selenium.webdriver.chrome.options import Options
+from app.services.browser_profile import BLOCKED_URL_PATTERNS, RowsStable, apply_lean_options, block_resources
+from app.services.bus_data_service import BusDataService
+from app.tests.test_bus_data_service import SAMPLE_HTML
+
+
+class RenderingDriver:
+    """Result list whose rows keep appearing for a few polls"""
+
+    def __init__(self, signatures):
+        self.signatures = list(signatures)
+        self.cdp_commands = []
+        self.visited = []
+        self.page_source = SAMPLE_HTML
+
+    def get(self, url):
+        self.visited.append(url)
+
+    def find_element(self, by, value):
+        return object()
+
+    def execute_script(self, script, *args):
+        if len(self.signatures) > 1:
+            return self.signatures.pop(0)
+        return self.signatures[0]
+
+    def execute_cdp_cmd(self, command, params):
+        self.cdp_commands.append((command, params))
+
+
+def test_rows_stable_waits_for_rows_to_settle():
+    clock = iter(range(7))
+    driver = RenderingDriver([None, [1, 40, False], [2, 80, False], [3, 120, False]])
+    condition = RowsStable('.route-result-list', '.route-result-item', settle_seconds=2,
+                           clock=lambda: next(clock))
+
+    results = [condition(driver) for _ in range(7)]
+    # Unchanged since t=3 and settled at t=5
+    assert results == [False, False, False, False, False, True, True]
+
+
+def test_rows_stable_waits_for_rows_to_appear():
+    clock = iter(range(10))
+    # The list is rendered empty and the rows only arrive at t=5
+    driver = RenderingDriver([None] + [[0, 0, False]] * 4 + [[2, 80, False]])
+    condition = RowsStable('.route-result-list', '.route-result-item', settle_seconds=2,
+                           clock=lambda: next(clock))
+
+    results = [condition(driver) for _ in range(8)]
+    assert results == [False, False, False, False, False, False, False, True]
+
+    # An explicit "no results" marker settles without rows
+    clock = iter(range(4))
+    driver = RenderingDriver([[0, 12, True]])
+    condition = RowsStable('.route-result-list', '.route-result-item', settle_seconds=2,
+                           empty_selector='.no-result', clock=lambda: next(clock))
+    assert [condition(driver) for _ in range(4)] == [False, False, True, True]
+
+
+def test_lean_options_and_blocked_resources():
+    options = apply_lean_options(Options())
+    assert options.page_load_strategy == 'eager'
+    assert '--blink-settings=imagesEnabled=false' in options.arguments
+
+    driver = RenderingDriver([[0, 0, False]])
+    assert block_resources(driver)
+    assert driver.cdp_commands[-1] == ('Network.setBlockedURLs', {'urls': list(BLOCKED_URL_PATTERNS)})
+
+
+def test_selenium_fetch_returns_once_rows_settle(caplog):
+    service = BusDataService()
+    service.rows_settle_seconds = 0.05
+    pair = service.stop_pairs['野崎→三鷹駅']
+    driver = RenderingDriver([[0, 0, False], [1, 40, False], [1, 40, False]])
+
+    with caplog.at_level('INFO', logger='app.services.bus_data_service'):
+        assert service._fetch_destination_page_with_selenium(driver, pair) == SAMPLE_HTML
+
+    assert len(driver.visited) == 1
+    assert any('ページ取得時間' in record.message for record in caplog.records)
+
+
+def test_selenium_fetch_gives_up_waiting_on_an_empty_list():
+    service = BusDataService()
+    service.rows_wait_timeout = 0.3
+    pair = service.stop_pairs['野崎→三鷹駅']
+    driver = RenderingDriver([[0, 0, False]])
+
+    # No retries: the empty page is handed to the parser as it is
+    assert service._fetch_destination_page_with_selenium(driver, pair) == SAMPLE_HTML
+    assert len(driver.visited) == 1
@@ -0,0 +1,262 @@
+import json
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from app.models.bus_info import BusInfo
+from app.services.bus_data_service import BusDataService
+from app.services.webdriver_pool import WebDriverPool
+
+SAMPLE_HTML = """
+<html><body><ul class="route-result-list">
+  <li class="route-result-item">
+    <span class="route-no">鷹52</span>
+    <span class="stop-number">4</span>
+    <span class="departure-time">12:37</span>
+    <span class="arrival-time">12:57</span>
+    <span class="remaining-time">あと13分</span>
+  </li>
+</ul></body></html>
+"""
+
+EMPTY_HTML = """
+<html><body><ul class="route-result-list"></ul></body></html>
+"""
+
+
+class FakeDriver:
+    def __init__(self):
+        self.quit_called = False
+        self.alive = True
+
+    @property
+    def current_url(self):
+        if not self.alive:
+            raise RuntimeError('session deleted')
+        return 'about:blank'
+
+    def execute_script(self, script):
+        return None
+
+    def quit(self):
+        self.quit_called = True
+
+
+def test_fetch_all_bus_data_parallel(app, monkeypatch):
+    """Destinations are fetched concurrently within the configured limit"""
+    service = BusDataService()
+    service.max_concurrency = 2
+
+    drivers = []
+    active = []
+    peak = []
+    lock = threading.Lock()
+
+    def fake_setup():
+        driver = FakeDriver()
+        drivers.append(driver)
+        return driver
+
+    def fake_fetch(driver, pair):
+        with lock:
+            active.append(pair.key)
+            peak.append(len(active))
+        time.sleep(0.05)
+        with lock:
+            active.remove(pair.key)
+        if pair.destination == '調布駅北口':
+            raise RuntimeError('page load failed')
+        return SAMPLE_HTML
+
+    monkeypatch.setattr(service, '_setup_webdriver', fake_setup)
+    monkeypatch.setattr(service, '_fetch_destination_page_with_selenium', fake_fetch)
+
+    with app.app_context():
+        # Previous snapshot: the failing destination must keep its row
+        for destination in ('三鷹駅', '調布駅北口'):
+            BusInfo.query.session.add(BusInfo(origin='野崎', destination=destination, bus_number='旧', is_active=True))
+        BusInfo.query.session.commit()
+
+        assert service.fetch_all_bus_data() is False
+
+        assert service.last_results == {
+            '野崎→三鷹駅': True,
+            '野崎→吉祥寺駅': True,
+            '野崎→武蔵境駅南口': True,
+            '野崎→調布駅北口': False,
+        }
+        assert max(peak) == 2
+        assert len(drivers) <= 2
+
+        active = {(bus.destination, bus.bus_number) for bus in BusInfo.query.filter_by(is_active=True)}
+        assert active == {
+            ('三鷹駅', '鷹52'),
+            ('吉祥寺駅', '鷹52'),
+            ('武蔵境駅南口', '鷹52'),
+            ('調布駅北口', '旧'),
+        }
+
+    service.shutdown()
+    assert all(driver.quit_called for driver in drivers)
+
+
+def test_webdriver_pool_reuses_and_recycles_sessions():
+    """Sessions are reused until unhealthy or past their use limit"""
+    drivers = []
+
+    def factory():
+        driver = FakeDriver()
+        drivers.append(driver)
+        return driver
+
+    pool = WebDriverPool(factory, max_size=1, max_uses=2)
+
+    with pool.session() as first:
+        pass
+    with pool.session() as second:
+        pass
+    assert first is second
+    assert first.quit_called  # recycled after two uses
+
+    with pool.session() as third:
+        pass
+    assert third is not first
+
+    # A dead session is replaced on the next acquire
+    third.alive = False
+    with pool.session() as fourth:
+        pass
+    assert fourth is not third
+    assert third.quit_called
+
+    pool.close()
+    assert fourth.quit_called
+    assert pool.size() == 0
+
+
+class StubApiHandler(BaseHTTPRequestHandler):
+    """Minimal stand-in for the JSON endpoint used by the bus-navigation page"""
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        destination = query['to'][0]
+        if destination == '調布駅北口':
+            self.send_response(404)
+            self.end_headers()
+            return
+
+        body = json.dumps({'routes': [
+            {'routeNo': '鷹52', 'platform': '4', 'departureTime': '12:37',
+             'arrivalTime': '12:57', 'remainingMinutes': 13},
+            {'routeNo': '鷹51', 'platform': '4', 'departureTime': '12:50',
+             'arrivalTime': '13:10', 'remainingTime': 'あと26分'},
+        ]}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def test_fetch_all_bus_data_from_api_with_selenium_fallback(app, monkeypatch):
+    """The HTTP backend is used first and Selenium only for failed destinations"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubApiHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    service = BusDataService()
+    service.api_endpoint = f'http://127.0.0.1:{server.server_port}/api/routes'
+    service.api_available = True
+    service.retry_count = 0
+
+    selenium_destinations = []
+
+    def fake_fetch(driver, pair):
+        selenium_destinations.append(pair.destination)
+        return SAMPLE_HTML
+
+    monkeypatch.setattr(service, '_setup_webdriver', FakeDriver)
+    monkeypatch.setattr(service, '_fetch_destination_page_with_selenium', fake_fetch)
+
+    try:
+        with app.app_context():
+            assert service.fetch_all_bus_data() is True
+            assert selenium_destinations == ['調布駅北口']
+
+            mitaka = BusInfo.query.filter_by(origin='野崎', destination='三鷹駅').order_by(BusInfo.id).all()
+            assert [bus.bus_number for bus in mitaka] == ['鷹52', '鷹51']
+            assert [bus.estimated_departure_minutes for bus in mitaka] == [13, 26]
+            assert mitaka[0].is_next_bus is True
+    finally:
+        service.shutdown()
+        server.shutdown()
+        server.server_close()
+
+
+def test_publish_errors_do_not_open_breakers(app, monkeypatch):
+    """Only fetch and parse errors count against a pair's circuit breaker"""
+    service = BusDataService()
+    service.breakers.failure_threshold = 1
+    monkeypatch.setattr(service, '_fetch_all_with_selenium', lambda pairs: {
+        key: service._process_html_response(pair, SAMPLE_HTML) for key, pair in pairs.items()
+    })
+
+    def failing_publish(pairs, snapshot):
+        raise RuntimeError('database is locked')
+
+    monkeypatch.setattr(service, '_publish_snapshot', failing_publish)
+
+    with app.app_context():
+        assert service.fetch_all_bus_data() is False
+
+    assert not any(service.last_results.values())
+    assert all(service.breakers.allow(key) for key in service.stop_pairs)
+    # Nothing was stored, so every pair is fetched again on the next run
+    assert service._due_pairs(datetime.now()).keys() == service.stop_pairs.keys()
+
+
+def test_empty_result_list_clears_the_pair(app, monkeypatch):
+    """A loaded page without departures deactivates the pair's rows; a broken page keeps them"""
+    service = BusDataService()
+    pages = {'三鷹駅': EMPTY_HTML, '調布駅北口': '<html><body>メンテナンス中</body></html>'}
+
+    monkeypatch.setattr(service, '_setup_webdriver', FakeDriver)
+    monkeypatch.setattr(service, '_fetch_destination_page_with_selenium',
+                        lambda driver, pair: pages.get(pair.destination, SAMPLE_HTML))
+
+    with app.app_context():
+        for destination in ('三鷹駅', '調布駅北口'):
+            BusInfo.query.session.add(BusInfo(origin='野崎', destination=destination, bus_number='旧', is_active=True))
+        BusInfo.query.session.commit()
+
+        assert service.fetch_all_bus_data() is False
+        assert service.last_results['野崎→三鷹駅'] is True
+        assert service.last_results['野崎→調布駅北口'] is False
+        assert list(service.last_errors) == ['野崎→調布駅北口']
+
+        active = {(bus.destination, bus.bus_number) for bus in BusInfo.query.filter_by(is_active=True)}
+        assert active == {('吉祥寺駅', '鷹52'), ('武蔵境駅南口', '鷹52'), ('調布駅北口', '旧')}
+
+    service.shutdown()
+
+
+def test_empty_pages_do_not_open_breakers(app, monkeypatch):
+    """Overnight pages without departures are successes, not failures"""
+    service = BusDataService()
+    service.breakers.failure_threshold = 1
+    monkeypatch.setattr(service, '_setup_webdriver', FakeDriver)
+    monkeypatch.setattr(service, '_fetch_destination_page_with_selenium', lambda driver, pair: EMPTY_HTML)
+
+    with app.app_context():
+        for _ in range(3):
+            assert service.fetch_all_bus_data() is True
+
+    assert service.last_errors == {}
+    assert all(service.breakers.allow(key) for key in service.stop_pairs)
+    assert {state['reason'] for state in service.refresh_policy.status().values()} == {'no_service'}
+
+    service.shutdown()
@@ -0,0 +1,95 @@
+import threading
+from app.services.bus_data_service import BusDataService
+from app.services.circuit_breaker import CircuitBreakers
+from app.tests.test_bus_data_service import SAMPLE_HTML, FakeDriver
+
+
+def _breakers(failures=3, base=60, maximum=1800):
+    breakers = CircuitBreakers()
+    breakers.failure_threshold, breakers.base_seconds, breakers.max_seconds = failures, base, maximum
+    return breakers
+
+
+def test_breaker_opens_half_opens_and_closes():
+    breakers = _breakers()
+
+    for _ in range(2):
+        breakers.record_failure('pair', 'timeout', now=0)
+    assert breakers.allow('pair', now=0)
+
+    breakers.record_failure('pair', 'timeout', now=0)
+    status = breakers.status(now=0)['pair']
+    assert status['state'] == 'open'
+    assert status['last_error'] == 'timeout'
+    assert 30 <= status['retry_in_seconds'] <= 60
+    assert not breakers.allow('pair', now=29)
+
+    # One trial fetch once the back-off expired
+    assert breakers.allow('pair', now=60)
+    assert breakers.status(now=60)['pair']['state'] == 'half_open'
+    assert not breakers.allow('pair', now=60)
+
+    breakers.record_success('pair')
+    assert breakers.status()['pair']['state'] == 'closed'
+    assert breakers.allow('pair', now=60)
+
+
+def test_backoff_grows_with_jitter_up_to_the_maximum():
+    breakers = _breakers(failures=1, base=60, maximum=300)
+    delays = []
+    now = 0
+    for _ in range(6):
+        assert breakers.allow('pair', now=now)
+        breakers.record_failure('pair', now=now)
+        delay = breakers.status(now=now)['pair']['retry_in_seconds']
+        delays.append(delay)
+        now += delay + 1
+
+    for delay, backoff in zip(delays, (60, 120, 240, 300, 300, 300)):
+        assert backoff / 2 - 1 <= delay <= backoff
+
+
+def test_open_breaker_skips_the_pair(app, monkeypatch):
+    service = BusDataService()
+    fetched = []
+
+    def fake_fetch(driver, pair):
+        fetched.append(pair.key)
+        return SAMPLE_HTML
+
+    monkeypatch.setattr(service, '_setup_webdriver', FakeDriver)
+    monkeypatch.setattr(service, '_fetch_destination_page_with_selenium', fake_fetch)
+    service.breakers.failure_threshold = 1
+    service.breakers.record_failure('野崎→調布駅北口', 'page load failed')
+
+    with app.app_context():
+        assert service.fetch_all_bus_data() is True
+
+    assert '野崎→調布駅北口' not in fetched
+    assert len(fetched) == 3
+    service.shutdown()
+
+
+def test_run_deadline_cuts_off_slow_fetches(app, monkeypatch):
+    service = BusDataService()
+    service.run_deadline_seconds = 0.2
+    release = threading.Event()
+
+    def fake_fetch(driver, pair):
+        if pair.destination == '調布駅北口':
+            # Stuck page load; only released after the run gave up on it
+            release.wait(5)
+        return SAMPLE_HTML
+
+    monkeypatch.setattr(service, '_setup_webdriver', FakeDriver)
+    monkeypatch.setattr(service, '_fetch_destination_page_with_selenium', fake_fetch)
+
+    with app.app_context():
+        assert service.fetch_all_bus_data() is False
+    release.set()
+
+    assert service.last_results['野崎→調布駅北口'] is False
+    assert service.last_results['野崎→三鷹駅'] is True
+    assert service.last_duration < 2
+    assert service.breakers.status()['野崎→調布駅北口']['last_error'] == '制限時間超過'
+    service.shutdown()
@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta
+from app.models.bus_info import BusInfo
+from app.models.bus_info_hourly import BusInfoHourly
+from app.services.compaction import HistoryCompactor
+
+
+def test_compaction_rolls_up_and_deletes_expired_rows(app):
+    """Expired inactive rows become hourly aggregates; recent and active rows stay"""
+    now = datetime(2025, 5, 8, 12, 0)
+    old_hour = datetime(2025, 5, 1, 8, 0)
+
+    with app.app_context():
+        for minute, delay in [(5, 2), (20, 8), (40, None)]:
+            scheduled = old_hour + timedelta(minutes=minute + 10)
+            BusInfo.query.session.add(BusInfo(
+                origin='野崎',
+                destination='三鷹駅',
+                bus_number='鷹52',
+                scheduled_departure_time=scheduled,
+                predicted_departure_time=scheduled + timedelta(minutes=delay) if delay is not None else None,
+                created_at=old_hour + timedelta(minutes=minute),
+                is_active=False
+            ))
+        # Still the current snapshot, so it must survive even though it is old
+        BusInfo.query.session.add(BusInfo(
+            origin='野崎', destination='吉祥寺駅', bus_number='吉01',
+            created_at=old_hour, is_active=True
+        ))
+        # Inside the retention window
+        BusInfo.query.session.add(BusInfo(
+            origin='野崎', destination='三鷹駅', bus_number='鷹52',
+            created_at=now - timedelta(hours=1), is_active=False
+        ))
+        BusInfo.query.session.commit()
+
+        compactor = HistoryCompactor()
+        compactor.retention_hours = 24
+        compactor.batch_size = 2
+        summary = compactor.compact(now=now)
+
+        assert summary['compacted_rows'] == 3
+        assert BusInfo.query.count() == 2
+
+        aggregate = BusInfoHourly.query.one()
+        assert aggregate.hour == old_hour
+        assert aggregate.sample_count == 3
+        assert aggregate.delay_sample_count == 2
+        assert aggregate.delay_avg_minutes == 5
+        assert aggregate.delay_min_minutes == 2
+        assert aggregate.delay_max_minutes == 8
+        assert aggregate.delayed_count == 1
+
+        # A second run has nothing left to do
+        assert compactor.compact(now=now)['compacted_rows'] == 0
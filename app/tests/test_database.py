@@ -0,0 +1,79 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from app import create_app, db
+from app.database import engine_options
+from app.models.bus_info import BusInfo
+
+
+def test_engine_options_per_backend():
+    postgres = engine_options('postgresql://bus:secret@db/bus')
+    assert postgres['pool_pre_ping'] is True
+    assert postgres['pool_size'] > 0
+
+    assert 'timeout' in engine_options('sqlite:////app/data/bus_data.db')['connect_args']
+    assert engine_options('sqlite:///:memory:') == {}
+
+
+def test_readers_are_not_blocked_by_the_writer(tmp_path):
+    """A scraper publishing snapshots never makes API reads wait or fail"""
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'bus.db'}"})
+    with app.app_context():
+        assert db.session.execute(text("PRAGMA journal_mode")).scalar() == 'wal'
+        assert db.session.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+
+    departure = datetime(2025, 5, 5, 12, 0)
+    stop = threading.Event()
+    errors = []
+    read_times = []
+    published = []
+
+    def write():
+        with app.app_context():
+            try:
+                for i in range(200):
+                    if stop.is_set():
+                        break
+                    BusInfo.publish_snapshot({
+                        ('野崎', destination): [
+                            BusInfo(origin='野崎', destination=destination, bus_number='鷹52',
+                                    scheduled_departure_time=departure + timedelta(minutes=n),
+                                    predicted_departure_time=departure + timedelta(minutes=n + i))
+                            for n in range(3)
+                        ]
+                        for destination in ('三鷹駅', '吉祥寺駅', '武蔵境駅南口', '調布駅北口')
+                    })
+                    published.append(i)
+            except Exception as e:
+                errors.append(e)
+
+    def read():
+        with app.app_context():
+            try:
+                while not stop.is_set():
+                    started = time.perf_counter()
+                    BusInfo.get_latest_active()
+                    db.session.rollback()
+                    read_times.append(time.perf_counter() - started)
+            except Exception as e:
+                errors.append(e)
+
+    writer = threading.Thread(target=write)
+    readers = [threading.Thread(target=read) for _ in range(3)]
+    for thread in [writer] + readers:
+        thread.start()
+    writer.join(timeout=30)
+    stop.set()
+    for thread in readers:
+        thread.join(timeout=10)
+
+    assert errors == []
+    assert len(published) == 200
+    assert read_times
+    # Nowhere near the 5 s busy timeout: reads never waited on the writer's lock
+    assert max(read_times) < 1.0
+
+    with app.app_context():
+        assert BusInfo.query.filter_by(is_active=True).count() == 12
+        db.engine.dispose()
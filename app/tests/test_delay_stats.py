@@ -0,0 +1,81 @@
+import json
+from datetime import datetime, timedelta
+from app.models.bus_info import BusInfo
+from app.models.delay_histogram import DelayHistogram
+from app.services.bus_data_service import BusDataService
+from app.services.delay_stats import DelayStatsEngine
+from app.services.timetable import TimetableStore
+
+
+def _bus(bus_number, scheduled, delay):
+    return BusInfo(
+        origin='野崎',
+        destination='三鷹駅',
+        bus_number=bus_number,
+        scheduled_departure_time=scheduled,
+        predicted_departure_time=scheduled + timedelta(minutes=delay)
+    )
+
+
+def test_departed_trips_are_counted_once(app):
+    """Only the last observed delay of a departed trip enters the histogram"""
+    monday_8am = datetime(2025, 5, 5, 8, 0)
+    engine = DelayStatsEngine()
+    pair = ('野崎', '三鷹駅')
+
+    with app.app_context():
+        engine.observe({pair: [_bus('鷹52', monday_8am, 2), _bus('鷹52', monday_8am + timedelta(minutes=20), 0)]})
+        engine.observe({pair: [_bus('鷹52', monday_8am, 6), _bus('鷹52', monday_8am + timedelta(minutes=20), 1)]})
+        assert DelayHistogram.query.count() == 0
+
+        # The 8:00 bus has left: its final delay (6 minutes) is recorded
+        assert engine.observe({pair: [_bus('鷹52', monday_8am + timedelta(minutes=20), 3)]}) == 1
+        # The 8:20 bus has left too
+        assert engine.observe({pair: []}) == 1
+
+        histogram = DelayHistogram.query.one()
+        assert histogram.hour_of_week == 8
+        assert histogram.sample_count == 2
+
+        stats = engine.query(destination='三鷹駅', weekday=0, hour=8)
+        assert stats['sample_count'] == 2
+        assert stats['mean_delay_minutes'] == 4.5
+        assert stats['delayed_rate'] == 0.5
+        assert 2.5 <= stats['percentiles']['p50'] <= 3.5
+        assert 5.5 <= stats['percentiles']['p95'] <= 6.5
+
+
+def test_placeholder_schedules_are_not_counted(app, tmp_path):
+    """Rows whose scheduled time is made up do not become trips"""
+    service = BusDataService()
+    service.timetable = TimetableStore(str(tmp_path))  # no timetables
+    pair = service.stop_pairs['野崎→三鷹駅']
+    engine = DelayStatsEngine()
+
+    placeholder = service._create_bus_info(pair, 0, '鷹52', '4', None, None, 5)
+    assert placeholder.is_placeholder
+    assert not service._create_bus_info(pair, 0, '鷹52', '4', '12:00', None, 5).is_placeholder
+
+    with app.app_context():
+        engine.observe({('野崎', '三鷹駅'): [placeholder]})
+        assert engine.observe({('野崎', '三鷹駅'): []}) == 0
+        assert DelayHistogram.query.count() == 0
+
+
+def test_stats_endpoint(client, app):
+    """The stats API summarizes histograms and validates its parameters"""
+    with app.app_context():
+        histogram = DelayHistogram(origin='野崎', destination='三鷹駅', bus_number='鷹52', hour_of_week=8)
+        histogram.add([0, 1, 2, 10])
+        BusInfo.query.session.add(histogram)
+        BusInfo.query.session.commit()
+
+    data = json.loads(client.get('/api/stats?route=鷹52&hour=8').data)
+    assert data['sample_count'] == 4
+    assert data['delayed_rate'] == 0.25
+
+    grouped = json.loads(client.get('/api/stats?group_by=hour_of_week').data)
+    assert [group['key'] for group in grouped['groups']] == [8]
+
+    assert client.get('/api/stats?hour=24').status_code == 400
+    assert client.get('/api/stats?group_by=stop').status_code == 400
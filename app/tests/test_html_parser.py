@@ -0,0 +1,47 @@
+import glob
+import os
+import pytest
+from app.services.html_parser import BusRow, get_html_parser, parse_bus_rows_bs4, parse_bus_rows_lxml
+
+FIXTURES = sorted(glob.glob(os.path.join(os.path.dirname(__file__), 'fixtures', '*.html')))
+
+
+@pytest.mark.parametrize('path', FIXTURES, ids=os.path.basename)
+def test_parsers_agree_on_saved_pages(path):
+    """The lxml path returns exactly what the BeautifulSoup path does"""
+    with open(path, encoding='utf-8') as f:
+        html = f.read()
+
+    found, rows = parse_bus_rows_lxml(html)
+    assert (found, rows) == parse_bus_rows_bs4(html)
+    assert found == 12
+    assert len(rows) == 3
+    assert all(isinstance(row, BusRow) for row in rows)
+
+
+def test_parser_edge_cases():
+    """Multiple classes, nested markup, missing fields and encoding declarations"""
+    html = """<?xml version="1.0" encoding="UTF-8"?>
+<html><body><ul>
+  <li class="featured
+             route-result-item">
+    <span class="bus-number">鷹<b>52</b></span>
+    <span class="time-left">あと<!-- soon --><em>７</em>分</span>
+    <span class="start-time"> 12:37 </span>
+  </li>
+  <li class="route-result-item-old"><span class="route-no">鷹51</span></li>
+</ul></body></html>"""
+
+    found, rows = parse_bus_rows_lxml(html)
+    assert (found, rows) == parse_bus_rows_bs4(html)
+    assert rows == [BusRow('鷹52', '1', '12:37', '', 7)]
+
+    assert parse_bus_rows_lxml('<html><body></body></html>') == (0, [])
+    assert parse_bus_rows_lxml('') == (0, [])
+
+
+def test_get_html_parser(monkeypatch):
+    monkeypatch.setenv('BUS_HTML_PARSER', 'bs4')
+    assert get_html_parser() is parse_bus_rows_bs4
+    assert get_html_parser('lxml') is parse_bus_rows_lxml
+    assert get_html_parser('unknown') is parse_bus_rows_lxml
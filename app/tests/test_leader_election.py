@@ -0,0 +1,29 @@
+import json
+from app.services.leader_election import LeaderElection
+
+
+def test_single_leader_and_failover(tmp_path):
+    """Only one holder of the lock file at a time; leadership passes on release"""
+    lock_path = str(tmp_path / 'scheduler.lock')
+    first = LeaderElection(lock_path, identity='web-1:100')
+    second = LeaderElection(lock_path, identity='web-2:200')
+
+    assert first.try_acquire() is True
+    assert second.try_acquire() is False
+    assert first.is_leader and not second.is_leader
+    assert second.current_leader()['identity'] == 'web-1:100'
+
+    # The leader goes away: the follower takes over on its next attempt
+    first.release()
+    assert second.current_leader() is None
+    assert second.try_acquire() is True
+    assert first.try_acquire() is False
+    with open(lock_path) as f:
+        assert json.load(f)['identity'] == 'web-2:200'
+
+    second.release()
+
+
+def test_system_status_reports_scheduler_role(client):
+    data = json.loads(client.get('/api/system-status').data)
+    assert data['scheduler']['role'] == 'inactive'
@@ -1,3 +1,5 @@
+from sqlalchemy import event
+from app import db
 from app.models.bus_info import BusInfo
 from datetime import datetime, timedelta
 
@@ -51,4 +53,66 @@ def test_bus_info_model(app):
         
         active_buses = BusInfo.get_latest_active()
         assert len(active_buses) == 1
-        assert active_buses[0].destination == '三鷹駅'
\ No newline at end of file
+        assert active_buses[0].destination == '三鷹駅'
+
+def test_get_latest_active_single_query(app):
+    """Latest active row per pair is fetched with one query"""
+    with app.app_context():
+        now = datetime.now()
+        for minutes, destination, bus_number, active in [
+            (10, '三鷹駅', '鷹52', False),
+            (5, '三鷹駅', '鷹51', True),
+            (1, '三鷹駅', '鷹55', True),
+            (3, '吉祥寺駅', '吉01', True),
+        ]:
+            BusInfo.query.session.add(BusInfo(
+                origin='野崎',
+                destination=destination,
+                bus_number=bus_number,
+                created_at=now - timedelta(minutes=minutes),
+                is_active=active
+            ))
+        BusInfo.query.session.commit()
+
+        statements = []
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            latest = BusInfo.get_latest_active()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+
+        assert len(statements) == 1
+        assert {(bus.destination, bus.bus_number) for bus in latest} == {('三鷹駅', '鷹55'), ('吉祥寺駅', '吉01')}
+
+
+def test_publish_snapshot_only_writes_changes(app):
+    """Unchanged trips get a heartbeat; any change replaces the pair's rows"""
+    departure = datetime(2025, 5, 5, 12, 30)
+
+    def rows(delay=0, minutes=10):
+        return [
+            BusInfo(origin='野崎', destination='三鷹駅', bus_number=bus_number, stop_number='4',
+                    scheduled_departure_time=departure + timedelta(minutes=offset),
+                    predicted_departure_time=departure + timedelta(minutes=offset + delay),
+                    estimated_departure_minutes=minutes + offset, is_next_bus=offset == 0)
+            for offset, bus_number in ((0, '鷹52'), (15, '鷹51'))
+        ]
+
+    with app.app_context():
+        first = datetime(2025, 5, 5, 3, 20)
+        assert BusInfo.publish_snapshot({('野崎', '三鷹駅'): rows()}, now=first) == {('野崎', '三鷹駅')}
+
+        # Same trips and times a minute later: no new rows
+        second = first + timedelta(minutes=1)
+        assert BusInfo.publish_snapshot({('野崎', '三鷹駅'): rows(minutes=9)}, now=second) == set()
+        assert BusInfo.query.count() == 2
+        active = BusInfo.query.filter_by(is_active=True).order_by(BusInfo.id).all()
+        assert [bus.estimated_departure_minutes for bus in active] == [9, 24]
+        assert all(bus.created_at == first and bus.last_seen_at == second for bus in active)
+
+        # A prediction moved by two minutes: the pair is replaced
+        third = second + timedelta(minutes=1)
+        assert BusInfo.publish_snapshot({('野崎', '三鷹駅'): rows(delay=2)}, now=third) == {('野崎', '三鷹駅')}
+        assert BusInfo.query.count() == 4
+        assert {bus.created_at for bus in BusInfo.query.filter_by(is_active=True)} == {third}
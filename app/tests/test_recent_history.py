@@ -0,0 +1,132 @@
+import json
+import time
+from datetime import datetime, timedelta
+from app import db
+from app.models.bus_info import BusInfo
+from app.services.recent_history import RecentHistory, RingBuffer, recent_history
+from app.services.snapshot_cache import CachedSnapshot, SnapshotCache, build_bus_info_snapshot, snapshot_cache
+
+NOW = datetime(2025, 5, 5, 12, 0)
+
+
+def _snapshot(moment, minutes, scheduled='12:10', predicted='12:13', data_source=None):
+    destination = {
+        "origin": "野崎",
+        "destination": "三鷹駅",
+        "scheduled_departure_time": scheduled,
+        "predicted_departure_time": predicted,
+        "estimated_departure_minutes": minutes,
+    }
+    if data_source:
+        destination["data_source"] = data_source
+    return CachedSnapshot(json.dumps({"destinations": [destination]}).encode('utf-8'), moment)
+
+
+def test_ring_buffer_keeps_the_latest_samples():
+    buffer = RingBuffer(3)
+    for timestamp in range(1, 6):
+        buffer.append(timestamp, timestamp, 0, 0)
+
+    assert buffer.size == 3
+    assert [buffer.times[i] for i in buffer.since(0)] == [3, 4, 5]
+    assert [buffer.times[i] for i in buffer.since(4)] == [4, 5]
+    assert buffer.last_time() == 5
+
+
+def test_snapshots_become_samples_and_sparklines():
+    history = RecentHistory(capacity=10)
+    history.record_snapshot(_snapshot(NOW - timedelta(minutes=50), 12))
+    history.record_snapshot(_snapshot(NOW - timedelta(minutes=50), 12))  # same snapshot seen twice
+    history.record_snapshot(_snapshot(NOW - timedelta(minutes=5), 8, '23:58', '00:02', data_source='timetable'))
+
+    samples = history.samples(minutes=60, now=NOW)[('野崎', '三鷹駅')]
+    assert [(s['estimated_departure_minutes'], s['delay_minutes'], s['data_source']) for s in samples] == [
+        (12, 3, 'live'),
+        (8, 4, 'timetable'),
+    ]
+    assert history.samples(minutes=10, now=NOW)[('野崎', '三鷹駅')][0]['time'] == '2025-05-05T11:55:00+00:00'
+
+    sparkline = history.sparklines(minutes=60, points=6, now=NOW)[('野崎', '三鷹駅')]
+    assert sparkline == [None, 12, None, None, None, 8]
+    assert history.sparklines(destination='吉祥寺駅', now=NOW) == {}
+
+
+def test_recent_endpoint_follows_published_snapshots(client):
+    now = datetime.utcnow().replace(microsecond=0)
+    snapshot_cache.refresh(lambda: _snapshot(now - timedelta(minutes=2), 9))
+    snapshot_cache.refresh(lambda: _snapshot(now - timedelta(minutes=1), 8))
+
+    response = client.get('/api/bus-info/recent?destination=三鷹駅&minutes=10')
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert len(data['destinations']) == 1
+    assert [s['estimated_departure_minutes'] for s in data['destinations'][0]['samples']] == [9, 8]
+    assert len(data['destinations'][0]['sparkline']) == 10
+
+    assert client.get('/api/bus-info/recent?minutes=0').status_code == 400
+
+
+def test_web_tier_samples_shared_snapshots_without_requests(tmp_path):
+    """The background sync picks up the scraper's snapshots on its own"""
+    path = str(tmp_path / 'snapshot.json')
+    scraper = SnapshotCache(shared_path=path)
+    web = SnapshotCache(shared_path=path, check_interval=0)
+    history = RecentHistory(capacity=10)
+    web.on_publish(history.record_snapshot)
+
+    web.start_sync(0.05)
+    try:
+        scraper.refresh(lambda: _snapshot(NOW - timedelta(minutes=2), 9))
+        deadline = time.monotonic() + 5
+        while not history.stats()['samples'] and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        web.stop_sync()
+
+    assert history.samples(minutes=10, now=NOW)[('野崎', '三鷹駅')][0]['estimated_departure_minutes'] == 9
+
+
+def test_seed_from_stored_history(app):
+    """A restarted process starts from the shown bus of the stored scrapes"""
+    now = datetime.utcnow().replace(microsecond=0)
+    departure = datetime(2025, 5, 5, 12, 10)
+    with app.app_context():
+        for minutes_ago, minutes, delay in ((30, 12, 1), (20, 9, 3), (2000, 5, 0)):
+            for is_next_bus in (True, False):
+                db.session.add(BusInfo(
+                    origin='野崎', destination='三鷹駅', bus_number='鷹52',
+                    scheduled_departure_time=departure,
+                    predicted_departure_time=departure + timedelta(minutes=delay),
+                    estimated_departure_minutes=minutes + (0 if is_next_bus else 20),
+                    is_next_bus=is_next_bus,
+                    created_at=now - timedelta(minutes=minutes_ago)
+                ))
+        db.session.commit()
+
+        history = RecentHistory(capacity=10)
+        assert history.seed(now=now) == 2
+
+    samples = history.samples(minutes=60, now=now)[('野崎', '三鷹駅')]
+    assert [(s['estimated_departure_minutes'], s['delay_minutes']) for s in samples] == [(12, 1), (9, 3)]
+
+
+def test_published_and_seeded_samples_follow_the_next_bus(app):
+    """Live samples and samples restored after a restart describe the same bus"""
+    now = datetime.now()
+    with app.app_context():
+        BusInfo.publish_snapshot({('野崎', '三鷹駅'): [
+            BusInfo(origin='野崎', destination='三鷹駅', bus_number='鷹52',
+                    scheduled_departure_time=now + timedelta(minutes=5 + 10 * n),
+                    predicted_departure_time=now + timedelta(minutes=6 + 10 * n),
+                    estimated_departure_minutes=6 + 10 * n, is_next_bus=(n == 0))
+            for n in range(3)
+        ]})
+        snapshot_cache.refresh(build_bus_info_snapshot)
+
+        restarted = RecentHistory(capacity=10)
+        restarted.seed()
+
+    live = recent_history.samples()[('野崎', '三鷹駅')]
+    seeded = restarted.samples()[('野崎', '三鷹駅')]
+    assert [(s['estimated_departure_minutes'], s['delay_minutes']) for s in live] == [(6, 1)]
+    assert [(s['estimated_departure_minutes'], s['delay_minutes']) for s in seeded] == [(6, 1)]
@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta
+from app.models.bus_info import BusInfo
+from app.services.bus_data_service import BusDataService
+from app.services.refresh_policy import RefreshPolicy
+
+NOW = datetime(2025, 5, 5, 8, 0)
+
+
+def _buses(*minutes, shift=0):
+    return [
+        BusInfo(
+            bus_number='鷹52',
+            scheduled_departure_time=NOW + timedelta(minutes=m),
+            predicted_departure_time=NOW + timedelta(minutes=m + shift),
+            estimated_departure_minutes=m + shift
+        )
+        for m in minutes
+    ]
+
+
+def test_interval_follows_next_departure():
+    """Close buses refresh often, far ones less, and gaps wait for the next bus"""
+    policy = RefreshPolicy()
+    policy.min_seconds, policy.max_seconds, policy.near_minutes = 60, 600, 10
+
+    policy.record('near', _buses(4, 20), NOW)
+    policy.record('far', _buses(30), NOW)
+    policy.record('gap', _buses(60), NOW)
+    policy.record('closed', [], NOW)
+    policy.record('failed', None, NOW)
+    status = policy.status()
+
+    assert (status['near']['reason'], status['near']['interval_seconds']) == ('near', 60)
+    assert (status['far']['reason'], status['far']['interval_seconds']) == ('scaled', 600)
+    assert (status['gap']['reason'], status['gap']['interval_seconds']) == ('gap', 50 * 60)
+    # No buses listed (overnight): keep checking at the maximum interval
+    assert (status['closed']['reason'], status['closed']['interval_seconds']) == ('no_service', 600)
+    policy.record('closed', [], NOW)
+    assert policy.status()['closed']['interval_seconds'] == 600
+    assert (status['failed']['reason'], status['failed']['interval_seconds']) == ('no_data', 120)
+
+    # Nothing read again: back off further
+    policy.record('failed', None, NOW)
+    assert policy.status()['failed']['interval_seconds'] == 240
+
+    assert policy.is_due('near', NOW + timedelta(seconds=60))
+    assert not policy.is_due('far', NOW + timedelta(seconds=60))
+    assert policy.is_due('unknown', NOW)
+    assert policy.next_due() == NOW + timedelta(seconds=60)
+
+
+def test_changing_predictions_shorten_the_interval():
+    policy = RefreshPolicy()
+    policy.record('pair', _buses(20), NOW)
+    assert policy.status()['pair']['reason'] == 'scaled'
+    steady = policy.status()['pair']['interval_seconds']
+
+    policy.record('pair', _buses(20, shift=3), NOW)
+    assert policy.status()['pair']['reason'] == 'changing'
+    assert policy.status()['pair']['interval_seconds'] < steady
+
+
+def test_due_pairs_use_the_policy():
+    service = BusDataService()
+    service.refresh_policy.enabled = True
+    service.refresh_policy.record('野崎→三鷹駅', _buses(40), NOW)
+
+    due = service._due_pairs(NOW + timedelta(minutes=1))
+    assert '野崎→三鷹駅' not in due
+    assert '野崎→吉祥寺駅' in due
+
+
+def test_near_interval_is_not_shortened_by_the_tick():
+    """A 60 s interval checked every 30 s is fetched every 60 s, not on every tick"""
+    service = BusDataService()
+    service.refresh_policy.enabled = True
+    service.refresh_policy.min_seconds = 60
+    key = '野崎→三鷹駅'
+
+    fetched = []
+    for tick in range(12):
+        # Scheduler ticks drift by a fraction of a second
+        now = NOW + timedelta(seconds=30 * tick + (0.4 if tick % 2 else -0.4))
+        if key in service._due_pairs(now):
+            fetched.append(round((now - NOW).total_seconds()))
+            service.refresh_policy.record(key, _buses(4), now)
+
+    assert fetched == [0, 60, 120, 180, 240, 300]
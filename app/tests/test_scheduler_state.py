@@ -0,0 +1,58 @@
+import json
+from datetime import datetime, timedelta, timezone
+from app.models.bus_info import BusInfo
+from app.services.scheduler_state import SchedulerState
+from app.services.snapshot_cache import snapshot_cache
+
+
+def test_state_is_shared_through_the_file(tmp_path):
+    """A web worker reads the schedule published by the scraper process"""
+    path = str(tmp_path / 'scheduler_state.json')
+    scraper = SchedulerState(path)
+    web = SchedulerState(path, check_interval=0)
+
+    assert web.read() is None
+    assert web.seconds_until_next_refresh(default=60) == 60
+
+    next_refresh = datetime.now(timezone.utc) + timedelta(seconds=120)
+    scraper.publish({"role": "leader", "next_refresh": next_refresh.isoformat(), "last_duration": 10})
+
+    assert web.read()['role'] == 'leader'
+    assert 125 <= web.seconds_until_next_refresh() <= 130
+
+    # A schedule that is already past is not trusted
+    scraper.publish({"role": "leader", "next_refresh": (next_refresh - timedelta(hours=1)).isoformat()})
+    assert web.seconds_until_next_refresh(default=60) == 60
+
+
+def test_bus_info_max_age_follows_published_schedule(client, tmp_path, monkeypatch):
+    state = SchedulerState(str(tmp_path / 'scheduler_state.json'))
+    monkeypatch.setattr('app.api.routes.scheduler_state', state)
+    next_refresh = datetime.now(timezone.utc) + timedelta(seconds=200)
+    state.publish({"role": "leader", "next_refresh": next_refresh.isoformat(), "last_duration": 0})
+
+    response = client.get('/api/bus-info')
+    assert 195 <= response.cache_control.max_age <= 200
+
+    status = json.loads(client.get('/api/system-status').data)
+    assert status['scheduler']['role'] == 'leader'
+
+
+def test_bus_info_max_age_stops_at_snapshot_expiry(client, app, tmp_path, monkeypatch):
+    """A response is not cached past the departure of the bus it shows"""
+    state = SchedulerState(str(tmp_path / 'scheduler_state.json'))
+    monkeypatch.setattr('app.api.routes.scheduler_state', state)
+    next_refresh = datetime.now(timezone.utc) + timedelta(seconds=3600)
+    state.publish({"role": "leader", "next_refresh": next_refresh.isoformat(), "last_duration": 0})
+
+    with app.app_context():
+        departure = datetime.now() + timedelta(seconds=90)
+        BusInfo.publish_snapshot({('野崎', '三鷹駅'): [
+            BusInfo(origin='野崎', destination='三鷹駅', bus_number='鷹52',
+                    scheduled_departure_time=departure, predicted_departure_time=departure,
+                    estimated_departure_minutes=1, is_next_bus=True)
+        ]})
+    snapshot_cache.invalidate()
+
+    assert 0 < client.get('/api/bus-info').cache_control.max_age <= 90
+    assert 0 < client.get('/api/bus-info/三鷹駅').cache_control.max_age <= 90
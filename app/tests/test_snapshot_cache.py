@@ -0,0 +1,70 @@
+import json
+from datetime import datetime, timedelta
+from app.models.bus_info import BusInfo
+from app.services.snapshot_cache import CachedSnapshot, SnapshotCache, build_bus_info_snapshot, snapshot_cache
+
+
+def test_bus_info_served_from_cache(client, app):
+    """Repeated requests hit the cache until a new snapshot is published"""
+    first = client.get('/api/bus-info')
+    second = client.get('/api/bus-info')
+    assert first.data == second.data
+    assert snapshot_cache.stats()['hits'] >= 1
+
+    with app.app_context():
+        BusInfo.publish_snapshot({('野崎', '三鷹駅'): [
+            BusInfo(origin='野崎', destination='三鷹駅', bus_number='鷹52', is_active=True)
+        ]})
+        # Data committed outside the scraper is not visible until the cache refreshes
+        assert json.loads(client.get('/api/bus-info').data)['destinations'] == []
+        snapshot_cache.refresh(build_bus_info_snapshot)
+
+    data = json.loads(client.get('/api/bus-info').data)
+    assert [bus['bus_number'] for bus in data['destinations']] == ['鷹52']
+
+
+def test_unknown_origin_is_not_cached(client):
+    entries = snapshot_cache.stats()['entries']
+    for origin in ('新宿', '渋谷'):
+        assert client.get(f'/api/bus-info?origin={origin}').status_code == 404
+    assert snapshot_cache.stats()['entries'] == entries
+
+    assert client.get('/api/bus-info?origin=野崎').status_code == 200
+
+
+def test_shared_snapshot_between_processes(tmp_path):
+    """A snapshot published by one cache is picked up by another via the shared file"""
+    path = str(tmp_path / 'snapshot.json')
+    writer = SnapshotCache(shared_path=path)
+    reader = SnapshotCache(shared_path=path, check_interval=0)
+
+    assert reader.get(None, lambda: CachedSnapshot(b'old')).body == b'old'
+    assert reader.get(None, lambda: CachedSnapshot(b'unused')).body == b'old'
+
+    published = datetime(2025, 5, 8, 3, 30, 40)
+    writer.refresh(lambda: CachedSnapshot(b'new', published))
+
+    entry = reader.get(None, lambda: CachedSnapshot(b'unused'))
+    assert entry.body == b'new'
+    assert entry.etag == CachedSnapshot(b'new').etag
+    assert entry.last_modified == published
+    assert reader.stats() == {'hits': 2, 'misses': 1, 'rebuilds': 0, 'entries': 1, 'subscribers': 0, 'shared': True}
+
+
+def test_failed_rebuild_is_retried(monkeypatch):
+    """A stale body kept after a failed rebuild still expires, so it is rebuilt later"""
+    cache = SnapshotCache()
+    stale = CachedSnapshot(b'stale', expires=datetime.now() - timedelta(seconds=1))
+    cache.refresh(lambda: stale)
+
+    def failing():
+        raise RuntimeError('database is locked')
+
+    assert cache.wait_for_update(stale.etag, 0.2, failing) is None
+    kept = cache.get(None, lambda: CachedSnapshot(b'unused'))
+    assert kept.body == b'stale'
+    assert kept.expires is not None
+
+    # Once the retry delay has passed, the next request rebuilds it
+    monkeypatch.setattr(CachedSnapshot, 'expired', lambda self, now=None: True)
+    assert cache.get(None, lambda: CachedSnapshot(b'fresh')).body == b'fresh'
@@ -0,0 +1,26 @@
+import os
+from sqlalchemy import inspect
+from app import create_app, db
+from benchmarks.startup_profile import measure_cold_start
+
+# Cold-start budget for importing the web entry point in a fresh interpreter
+COLD_START_BUDGET_SECONDS = float(os.environ.get('BUS_COLD_START_BUDGET_SECONDS', 2.0))
+
+
+def test_web_cold_start_within_budget():
+    """The read-only web tier starts without the scraping stack and within budget"""
+    result = measure_cold_start('wsgi')
+
+    assert result['status'] == 200
+    assert result['heavy_modules'] == []
+    assert result['import_seconds'] < COLD_START_BUDGET_SECONDS
+
+
+def test_db_auto_init_can_be_disabled():
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+        'DB_AUTO_INIT': False,
+    })
+    with app.app_context():
+        assert inspect(db.engine).get_table_names() == []
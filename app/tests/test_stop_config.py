@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+from app.services.stop_config import load_stop_pairs
+from app.services.bus_data_service import BusDataService
+
+
+def test_default_config_generates_original_urls():
+    """URLs generated from config/stops.yml match the hand-written ones"""
+    pairs = load_stop_pairs()
+
+    assert list(pairs) == ['野崎→三鷹駅', '野崎→吉祥寺駅', '野崎→武蔵境駅南口', '野崎→調布駅北口']
+    assert pairs['野崎→三鷹駅'].url_suffix == (
+        'bus.htm?tabName=searchTab&from=%E9%87%8E%E5%B4%8E'
+        '&to=%E4%B8%89%E9%B7%B9%E9%A7%85&toType=1&locale=ja'
+    )
+
+
+def test_load_stop_pairs_with_options(tmp_path):
+    """Destinations may be plain names or mappings with per-pair options"""
+    config = tmp_path / 'stops.yml'
+    config.write_text(
+        'stops:\n'
+        '  - origin: 野崎\n'
+        '    destinations:\n'
+        '      - 三鷹駅\n'
+        '      - name: 調布駅北口\n'
+        '        backend: selenium\n'
+        '        interval_minutes: 10\n'
+        '  - origin: 大沢\n'
+        '    interval_minutes: 15\n'
+        '    destinations: [武蔵境駅南口]\n',
+        encoding='utf-8'
+    )
+
+    pairs = load_stop_pairs(str(config))
+
+    assert list(pairs) == ['野崎→三鷹駅', '野崎→調布駅北口', '大沢→武蔵境駅南口']
+    assert pairs['野崎→三鷹駅'].interval_minutes is None
+    assert pairs['野崎→調布駅北口'].backend == 'selenium'
+    assert pairs['野崎→調布駅北口'].interval_minutes == 10
+    assert pairs['大沢→武蔵境駅南口'].interval_minutes == 15
+
+
+def test_due_pairs_respect_interval(tmp_path):
+    """Pairs with an interval are skipped until it has elapsed"""
+    config = tmp_path / 'stops.yml'
+    config.write_text(
+        'stops:\n'
+        '  - origin: 野崎\n'
+        '    destinations:\n'
+        '      - 三鷹駅\n'
+        '      - name: 調布駅北口\n'
+        '        interval_minutes: 10\n',
+        encoding='utf-8'
+    )
+    service = BusDataService()
+    service.stop_pairs = load_stop_pairs(str(config))
+
+    now = datetime(2025, 5, 8, 12, 0)
+    service._last_fetched = {'野崎→三鷹駅': now, '野崎→調布駅北口': now}
+
+    assert list(service._due_pairs(now + timedelta(minutes=5))) == ['野崎→三鷹駅']
+    assert list(service._due_pairs(now + timedelta(minutes=10))) == ['野崎→三鷹駅', '野崎→調布駅北口']
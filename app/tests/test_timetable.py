@@ -0,0 +1,79 @@
+import json
+from datetime import datetime, timedelta
+from app.services import snapshot_cache as snapshot_cache_module
+from app.services.snapshot_cache import build_bus_info_snapshot
+from app.services.stop_config import StopPair
+from app.services.timetable import TimetableStore
+
+TIMETABLE = """
+origin: 野崎
+destination: 三鷹駅
+weekday:
+  鷹52:
+    stop_number: "4"
+    ride_minutes: 20
+    departures: ["06:05", "07:00", "23:50", "24:20"]
+  鷹51:
+    departures: [06:30]
+holiday:
+  鷹52:
+    ride_minutes: 18
+    departures: ["08:00"]
+holidays: [2025-05-06]
+"""
+
+PAIR = StopPair('野崎', '三鷹駅')
+
+
+def _store(tmp_path):
+    (tmp_path / 'mitaka.yml').write_text(TIMETABLE, encoding='utf-8')
+    return TimetableStore(str(tmp_path))
+
+
+def test_upcoming_follows_the_service_day(tmp_path):
+    """Late-night trips belong to the previous service day; holidays use the holiday table"""
+    store = _store(tmp_path)
+
+    # Thursday: weekday table, in departure order across routes
+    upcoming = store.upcoming(PAIR, datetime(2025, 5, 8, 6, 0), count=3)
+    assert [(entry.bus_number, entry.departure.strftime('%H:%M')) for entry in upcoming] == [
+        ('鷹52', '06:05'), ('鷹51', '06:30'), ('鷹52', '07:00')
+    ]
+    assert upcoming[0].stop_number == '4'
+    assert upcoming[0].arrival == datetime(2025, 5, 8, 6, 25)
+    assert upcoming[1].arrival is None
+
+    # 24:20 on Thursday's service day is Friday 0:20
+    assert store.upcoming(PAIR, datetime(2025, 5, 9, 0, 10), count=1)[0].departure == datetime(2025, 5, 9, 0, 20)
+
+    # Saturday falls back to the holiday table, as does a listed holiday
+    assert store.upcoming(PAIR, datetime(2025, 5, 10, 7, 0), count=1)[0].departure == datetime(2025, 5, 10, 8, 0)
+    assert store.day_type(datetime(2025, 5, 6).date()) == 'holiday'
+
+    assert store.upcoming(StopPair('野崎', '吉祥寺駅'), datetime(2025, 5, 8, 6, 0)) == []
+
+
+def test_find_matches_route_and_time(tmp_path):
+    store = _store(tmp_path)
+
+    entry = store.find(PAIR, datetime(2025, 5, 8, 7, 4), bus_number='鷹52')
+    assert entry.departure == datetime(2025, 5, 8, 7, 0)
+    assert store.find(PAIR, datetime(2025, 5, 8, 6, 28), bus_number='鷹52', window=timedelta(minutes=10)) is None
+    assert store.find(PAIR, datetime(2025, 5, 8, 6, 28)).bus_number == '鷹51'
+
+
+def test_snapshot_falls_back_to_timetable(app, tmp_path, monkeypatch):
+    """Without scraped data the API shows the next departure from the timetable"""
+    monkeypatch.setattr(snapshot_cache_module, 'timetable_store', _store(tmp_path))
+
+    with app.app_context():
+        snapshot = build_bus_info_snapshot(now=datetime(2025, 5, 8, 6, 50))
+    body = json.loads(snapshot.body)
+
+    mitaka = [d for d in body['destinations'] if d['destination'] == '三鷹駅']
+    assert mitaka == [dict(mitaka[0], data_source='timetable')]
+    assert mitaka[0]['scheduled_departure_time'] == '07:00'
+    assert mitaka[0]['estimated_departure_minutes'] == 10
+    assert body['system_status']['health'] == 'DEGRADED'
+    assert snapshot.expires == datetime(2025, 5, 8, 6, 51)
+    assert snapshot.expired(datetime(2025, 5, 8, 6, 51))
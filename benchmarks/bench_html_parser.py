@@ -0,0 +1,76 @@
+"""
+Compare the HTML extraction paths on the saved route-result pages
+
+    python benchmarks/bench_html_parser.py [--repeat 200] [FIXTURE ...]
+
+Reports the mean parse time per page and the peak Python heap allocated while
+parsing (tracemalloc). libxml2's own C allocations are not visible to
+tracemalloc, so the lxml figure covers the Python side only.
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app.services.html_parser import PARSERS  # noqa: E402
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app', 'tests', 'fixtures')
+
+
+def measure(parser, html, repeat):
+    parser(html)  # warm up
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        parser(html)
+    elapsed = (time.perf_counter() - start) / repeat
+
+    tracemalloc.start()
+    parser(html)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return elapsed, peak
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('fixtures', nargs='*', help='HTML files (default: app/tests/fixtures/*.html)')
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args(argv)
+
+    paths = args.fixtures or sorted(glob.glob(os.path.join(FIXTURE_DIR, '*.html')))
+    if not paths:
+        parser.error('no fixture pages found')
+
+    print(f"{'page':<32} {'parser':<6} {'ms/page':>9} {'peak KiB':>9}")
+    totals = {name: [0.0, 0] for name in PARSERS}
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            html = f.read()
+
+        outputs = {name: func(html) for name, func in PARSERS.items()}
+        if len(set(map(repr, outputs.values()))) != 1:
+            print(f"{os.path.basename(path)}: parsers disagree: {outputs}", file=sys.stderr)
+            return 1
+
+        for name, func in PARSERS.items():
+            elapsed, peak = measure(func, html, args.repeat)
+            totals[name][0] += elapsed
+            totals[name][1] = max(totals[name][1], peak)
+            print(f"{os.path.basename(path):<32} {name:<6} {elapsed * 1000:>9.3f} {peak / 1024:>9.1f}")
+
+    baseline_time, baseline_peak = totals['bs4']
+    fast_time, fast_peak = totals['lxml']
+    print()
+    print(f"lxml vs bs4: {baseline_time / fast_time:.1f}x faster, "
+          f"peak Python heap {fast_peak / 1024:.1f} KiB vs {baseline_peak / 1024:.1f} KiB")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,331 @@
+"""
+Offline benchmark suite
+
+    python -m benchmarks.run [--repeat 50] [--save results.json] [--compare baseline.json]
+
+Runs against a temporary SQLite database seeded with history and the local
+stub transit site (benchmarks/stub_site.py), so no network is needed:
+
+    parse.*     BusDataService._process_html_response on the recorded pages
+    db.*        BusInfo.publish_snapshot and BusInfo.get_latest_active
+    recent.*    last hour of one destination: in-memory ring buffer vs. SQL
+    api.*       GET /api/bus-info (cache miss, cache hit, 304) and /api/bus-info/<destination>
+    scrape.*    BusDataService.fetch_all_bus_data against the stub site
+
+``--save`` writes the results as JSON; ``--compare`` prints the change
+against a saved run and exits with status 1 when a median regressed by more
+than ``--threshold``.
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import requests
+
+from app import create_app, db
+from app.models.bus_info import BusInfo
+from app.services.bus_data_service import BusDataService
+from app.services.html_parser import PARSERS
+from app.services.recent_history import RecentHistory
+from app.services.snapshot_cache import snapshot_cache
+from app.services.stop_config import get_stop_pairs
+from benchmarks.stub_site import DESTINATION_FIXTURES, StubTransitSite, load_fixture
+
+
+def measure(func, repeat, setup=None, warmup=1):
+    """Run ``func`` ``repeat`` times and summarize the wall-clock samples (ms)"""
+    for _ in range(warmup):
+        if setup:
+            setup()
+        func()
+
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+
+    samples.sort()
+    return {
+        "runs": repeat,
+        "median_ms": round(statistics.median(samples), 4),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 4),
+        "min_ms": round(samples[0], 4),
+    }
+
+
+class StubDriver:
+    """Plays the browser for the Selenium path by fetching pages over plain HTTP"""
+
+    def __init__(self):
+        self.session = requests.Session()
+        self.current_url = 'about:blank'
+        self.page_source = ''
+
+    def get(self, url):
+        response = self.session.get(url, timeout=10)
+        response.raise_for_status()
+        self.current_url = url
+        self.page_source = response.text
+
+    def execute_script(self, script):
+        return None
+
+    def quit(self):
+        self.session.close()
+
+
+def seed_history(snapshots):
+    """Insert ``snapshots`` past scrapes (3 rows per pair) of inactive history"""
+    now = datetime.utcnow()
+    pairs = list(get_stop_pairs().values())
+    rows = []
+    for n in range(snapshots):
+        created_at = now - timedelta(minutes=5 * (snapshots - n))
+        for pair in pairs:
+            for i in range(3):
+                departure = created_at + timedelta(minutes=10 * (i + 1))
+                rows.append({
+                    "origin": pair.origin,
+                    "destination": pair.destination,
+                    "bus_number": "鷹52",
+                    "stop_number": "4",
+                    "scheduled_departure_time": departure,
+                    "predicted_departure_time": departure + timedelta(minutes=n % 7),
+                    "scheduled_arrival_time": departure + timedelta(minutes=20),
+                    "predicted_arrival_time": departure + timedelta(minutes=20 + n % 7),
+                    "estimated_departure_minutes": 10 * (i + 1),
+                    "is_next_bus": i == 0,
+                    "is_active": False,
+                    "created_at": created_at,
+                })
+        if len(rows) >= 5000:
+            db.session.execute(BusInfo.__table__.insert(), rows)
+            rows = []
+    if rows:
+        db.session.execute(BusInfo.__table__.insert(), rows)
+    db.session.commit()
+
+
+def bench_parse(results, service, repeat):
+    pairs = get_stop_pairs()
+    pages = [
+        (pairs[key], load_fixture(pair.destination).decode('utf-8'))
+        for key, pair in pairs.items() if pair.destination in DESTINATION_FIXTURES
+    ]
+    for name, parser in PARSERS.items():
+        service.html_parser = parser
+        cycle = itertools.cycle(pages)
+        results[f"parse.process_html_response.{name}"] = measure(
+            lambda: service._process_html_response(*next(cycle)), repeat
+        )
+    service.html_parser = PARSERS['lxml']
+
+
+def bench_db(results, service, repeat):
+    pairs = get_stop_pairs()
+    rows_source = {
+        pair: load_fixture(pair.destination).decode('utf-8')
+        for pair in pairs.values() if pair.destination in DESTINATION_FIXTURES
+    }
+
+    def publish():
+        BusInfo.publish_snapshot({
+            (pair.origin, pair.destination): service._process_html_response(pair, html)
+            for pair, html in rows_source.items()
+        })
+
+    results["db.publish_snapshot"] = measure(publish, repeat)
+    results["db.get_latest_active"] = measure(BusInfo.get_latest_active, repeat)
+
+
+def bench_recent(results, repeat):
+    """The same "last hour" samples from the ring buffer and from bus_info"""
+    now = datetime.utcnow()
+    history = RecentHistory()
+    for row in BusInfo.query.filter(BusInfo.is_next_bus.is_(True)).order_by(BusInfo.created_at):
+        history.append(row.origin, row.destination, row.created_at,
+                       minutes=row.estimated_departure_minutes, delay=row.delay_minutes)
+    db.session.rollback()
+
+    pair = next(iter(get_stop_pairs().values()))
+    since = now - timedelta(hours=1)
+
+    def query_sql():
+        rows = BusInfo.history_query(start=since, origin=pair.origin, destination=pair.destination).filter(
+            BusInfo.is_next_bus.is_(True)
+        ).all()
+        samples = [
+            {"time": row.created_at, "estimated_departure_minutes": row.estimated_departure_minutes,
+             "delay_minutes": row.delay_minutes}
+            for row in reversed(rows)
+        ]
+        db.session.rollback()
+        return samples
+
+    def query_ring():
+        return history.samples(origin=pair.origin, destination=pair.destination, minutes=60, now=now)
+
+    assert len(query_sql()) == len(query_ring()[(pair.origin, pair.destination)])
+    results["recent.last_hour.sql"] = measure(query_sql, repeat)
+    results["recent.last_hour.ring_buffer"] = measure(query_ring, repeat)
+    results["recent.sparkline.ring_buffer"] = measure(
+        lambda: history.sparklines(origin=pair.origin, destination=pair.destination, minutes=60, now=now), repeat
+    )
+
+
+def bench_api(results, client, repeat):
+    def get():
+        response = client.get('/api/bus-info')
+        assert response.status_code == 200, response.status_code
+
+    results["api.get_bus_info.cold"] = measure(get, repeat, setup=snapshot_cache.invalidate)
+    results["api.get_bus_info.warm"] = measure(get, repeat)
+
+    etag = client.get('/api/bus-info').headers['ETag']
+
+    def get_not_modified():
+        response = client.get('/api/bus-info', headers={'If-None-Match': etag})
+        assert response.status_code == 304, response.status_code
+
+    results["api.get_bus_info.not_modified"] = measure(get_not_modified, repeat)
+
+    destination = next(iter(get_stop_pairs().values())).destination
+
+    def get_destination():
+        response = client.get(f'/api/bus-info/{destination}?limit=2')
+        assert response.status_code == 200, response.status_code
+
+    results["api.get_destination.warm"] = measure(get_destination, repeat)
+
+
+def bench_scrape(results, service, site, repeat):
+    service.base_url = site.page_base_url
+    service.api_endpoint = site.api_endpoint
+    service.retry_count = 0
+    service._setup_webdriver = StubDriver
+
+    # The real method waits for the page's scripts; the stub pages are static
+    def fetch_page(driver, pair):
+        driver.get(f"{service.base_url}/{pair.url_suffix}")
+        return driver.page_source
+
+    service._fetch_destination_page_with_selenium = fetch_page
+
+    for backend in ('api', 'selenium'):
+        service.api_available = backend == 'api'
+        site.requests = site.failures = 0
+        results[f"scrape.fetch_all_bus_data.{backend}"] = measure(service.fetch_all_bus_data, repeat)
+        results[f"scrape.fetch_all_bus_data.{backend}"]["stub_failures"] = site.failures
+
+
+def run(args):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+        })
+        service = BusDataService()
+
+        with app.app_context():
+            seed_history(args.history_snapshots)
+
+            bench_parse(results, service, args.repeat)
+            bench_recent(results, args.repeat)
+            bench_db(results, service, args.repeat)
+            bench_api(results, app.test_client(), args.repeat)
+
+            site = StubTransitSite(latency=args.latency, jitter=args.jitter,
+                                   failure_rate=args.failure_rate, seed=0)
+            with site:
+                bench_scrape(results, service, site, args.scrape_repeat)
+
+            service.shutdown()
+            db.engine.dispose()
+
+    return {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec='seconds'),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "history_rows": args.history_snapshots * len(get_stop_pairs()) * 3,
+            "latency": args.latency,
+            "failure_rate": args.failure_rate,
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline, threshold):
+    """Print a comparison table; returns the names of regressed benchmarks"""
+    regressions = []
+    print(f"{'benchmark':<44} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, result in current["results"].items():
+        before = baseline["results"].get(name)
+        if before is None:
+            print(f"{name:<44} {'-':>10} {result['median_ms']:>10.3f} {'new':>8}")
+            continue
+
+        change = result["median_ms"] / before["median_ms"] - 1 if before["median_ms"] else 0.0
+        status = ''
+        if change > threshold:
+            status = '  REGRESSION'
+            regressions.append(name)
+        elif change < -threshold:
+            status = '  improved'
+        print(f"{name:<44} {before['median_ms']:>10.3f} {result['median_ms']:>10.3f} {change:>+8.1%}{status}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark suite")
+    parser.add_argument('--repeat', type=int, default=50, help='iterations per microbenchmark')
+    parser.add_argument('--scrape-repeat', type=int, default=5, help='iterations per scrape benchmark')
+    parser.add_argument('--history-snapshots', type=int, default=2000, help='past scrapes seeded into bus_info')
+    parser.add_argument('--latency', type=float, default=0.05, help='stub site response latency (s)')
+    parser.add_argument('--jitter', type=float, default=0.0, help='extra random stub latency (s)')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='fraction of stub requests answered with 503')
+    parser.add_argument('--save', metavar='PATH', help='write the results as JSON')
+    parser.add_argument('--compare', metavar='PATH', help='compare against saved results')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed slowdown before a regression is reported')
+    parser.add_argument('--verbose', action='store_true', help='keep application logging')
+    args = parser.parse_args(argv)
+
+    if not args.verbose:
+        logging.disable(logging.CRITICAL)
+
+    report = run(args)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+            f.write('\n')
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}")
+            return 1
+        return 0
+
+    print(f"{'benchmark':<44} {'median ms':>10} {'p95 ms':>10}")
+    for name, result in report["results"].items():
+        print(f"{name:<44} {result['median_ms']:>10.3f} {result['p95_ms']:>10.3f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
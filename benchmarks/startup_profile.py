@@ -0,0 +1,107 @@
+"""
+Cold-start profile of a web entry point
+
+    python -m benchmarks.startup_profile [--entry wsgi] [--top 25] [--with-scheduler]
+
+Imports the entry module in a fresh interpreter with ``-X importtime``,
+serves one request to /api/bus-info, and reports the import time per
+top-level package, the slowest individual modules, and whether heavy
+scraping dependencies were loaded. By default the web tier is profiled
+as deployed (BUS_RUN_SCHEDULER=false).
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules the web tier should not need before its first request
+HEAVY_MODULES = ('selenium', 'bs4', 'apscheduler', 'requests', 'app.services.bus_data_service')
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {entry} as entry
+imported = time.perf_counter()
+response = entry.app.test_client().get('/api/bus-info')
+served = time.perf_counter()
+print(json.dumps({{
+    "import_seconds": imported - start,
+    "first_request_seconds": served - imported,
+    "status": response.status_code,
+    "heavy_modules": sorted(name for name in {heavy!r} if name in sys.modules),
+}}))
+"""
+
+
+def measure_cold_start(entry='wsgi', env=None):
+    """
+    Run the probe in a new interpreter; returns the probe's timings plus the
+    parsed ``-X importtime`` records as (module, self_us, cumulative_us, depth)
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        probe_env = dict(os.environ)
+        probe_env.update({
+            'PYTHONPATH': REPO_ROOT + os.pathsep + probe_env.get('PYTHONPATH', ''),
+            'DATABASE_URL': f"sqlite:///{os.path.join(tmp, 'startup.db')}",
+            'BUS_RUN_SCHEDULER': 'false',
+            'BUS_SNAPSHOT_CACHE_PATH': os.path.join(tmp, 'snapshot.json'),
+            'BUS_SCHEDULER_STATE_PATH': os.path.join(tmp, 'scheduler_state.json'),
+        })
+        probe_env.update(env or {})
+
+        # Run from a scratch directory so logs/ and instance files stay out of the tree
+        completed = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', _PROBE.format(entry=entry, heavy=HEAVY_MODULES)],
+            cwd=tmp, env=probe_env, capture_output=True, text=True, timeout=120
+        )
+    if completed.returncode != 0:
+        raise RuntimeError(f"startup probe failed:\n{completed.stderr[-2000:]}")
+
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result['imports'] = [
+        (match.group(4), int(match.group(1)), int(match.group(2)), len(match.group(3)) // 2)
+        for match in map(IMPORTTIME_LINE.match, completed.stderr.splitlines()) if match
+    ]
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cold-start profile of a web entry point")
+    parser.add_argument('--entry', default='wsgi', help='module exposing `app` (default: wsgi)')
+    parser.add_argument('--top', type=int, default=25, help='number of slowest modules to list')
+    parser.add_argument('--with-scheduler', action='store_true',
+                        help='import the scheduler too (BUS_RUN_SCHEDULER=true); starts scraping jobs')
+    args = parser.parse_args(argv)
+
+    env = {'BUS_RUN_SCHEDULER': 'true'} if args.with_scheduler else None
+    result = measure_cold_start(args.entry, env)
+
+    by_package = defaultdict(int)
+    for name, self_us, _, _ in result['imports']:
+        by_package[name.split('.')[0]] += self_us
+    total_us = sum(by_package.values())
+
+    print(f"import {args.entry}: {result['import_seconds'] * 1000:.1f} ms, "
+          f"first request: {result['first_request_seconds'] * 1000:.1f} ms (status {result['status']})")
+    print(f"heavy modules loaded: {', '.join(result['heavy_modules']) or 'none'}")
+
+    print(f"\n{'package':<32} {'ms':>8} {'share':>7}")
+    for package, self_us in sorted(by_package.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{package:<32} {self_us / 1000:>8.1f} {self_us / total_us:>7.1%}")
+
+    print(f"\n{'module (self time)':<48} {'self ms':>8} {'cumul ms':>9}")
+    for name, self_us, cumulative_us, _ in sorted(result['imports'], key=lambda item: -item[1])[:args.top]:
+        print(f"{name:<48} {self_us / 1000:>8.1f} {cumulative_us / 1000:>9.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,139 @@
+"""
+Local stand-in for the bus-navigation site
+
+Serves the recorded route-result pages (``/wgsys/wgp/bus.htm``) and JSON
+departures (``/api/routes``) from app/tests/fixtures for each destination,
+with a configurable response latency and failure rate, so the whole scrape
+pipeline can be exercised without network access.
+"""
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app', 'tests', 'fixtures')
+
+# Destination name -> fixture file slug
+DESTINATION_FIXTURES = {
+    '三鷹駅': 'mitaka',
+    '吉祥寺駅': 'kichijoji',
+    '武蔵境駅南口': 'musashisakai',
+    '調布駅北口': 'chofu',
+}
+
+PAGE_PATH = '/wgsys/wgp/bus.htm'
+API_PATH = '/api/routes'
+
+
+def load_fixture(destination, kind='html'):
+    """Return the recorded page (``html``) or JSON body (``json``) as bytes"""
+    slug = DESTINATION_FIXTURES[destination]
+    filename = f'route_result_{slug}.html' if kind == 'html' else f'api_routes_{slug}.json'
+    with open(os.path.join(FIXTURE_DIR, filename), 'rb') as f:
+        return f.read()
+
+
+class StubTransitSite:
+    """
+    Threaded HTTP server serving the fixtures
+
+    Every request waits ``latency`` seconds (plus up to ``jitter``) and fails
+    with 503 with probability ``failure_rate``. Use as a context manager or
+    call ``start()`` / ``stop()``.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, failure_rate=0.0, seed=None, host='127.0.0.1', port=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self._bodies = {
+            (kind, destination): load_fixture(destination, kind)
+            for destination in DESTINATION_FIXTURES
+            for kind in ('html', 'json')
+        }
+        self.requests = 0
+        self.failures = 0
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def page_base_url(self):
+        """Value for ``BusDataService.base_url``"""
+        return self.base_url + os.path.dirname(PAGE_PATH)
+
+    @property
+    def api_endpoint(self):
+        """Value for ``BusDataService.api_endpoint``"""
+        return self.base_url + API_PATH
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='stub-transit-site', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _delay_and_outcome(self):
+        with self._random_lock:
+            self.requests += 1
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+            failed = self._random.random() < self.failure_rate
+            if failed:
+                self.failures += 1
+        return delay, failed
+
+    def _make_handler(self):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                kind = {PAGE_PATH: 'html', API_PATH: 'json'}.get(url.path)
+                destination = parse_qs(url.query).get('to', [None])[0]
+
+                delay, failed = site._delay_and_outcome()
+                if delay:
+                    time.sleep(delay)
+
+                body = site._bodies.get((kind, destination))
+                if failed:
+                    self._send(503, b'Service Unavailable', 'text/plain')
+                elif body is None:
+                    self._send(404, b'Not Found', 'text/plain')
+                else:
+                    content_type = 'text/html; charset=utf-8' if kind == 'html' else 'application/json'
+                    self._send(200, body, content_type)
+
+            def _send(self, status, body, content_type):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
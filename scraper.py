@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+"""
+Scraper worker: runs the scheduler and the browser outside the web tier
+
+Scrapes are published to the database and to the shared snapshot file
+(data/bus_info_snapshot.json), which the web workers pick up. Start the web
+tier with BUS_RUN_SCHEDULER=false when this process is used.
+"""
+import signal
+import threading
+from app import create_app
+from app.services.scheduler import bus_scheduler
+from app.utils.logging_config import setup_logging
+
+
+def main():
+    app = create_app()
+    setup_logging(app)
+    bus_scheduler.init_app(app)
+
+    stopped = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *args: stopped.set())
+
+    app.logger.info('Bus data scraper started')
+    stopped.wait()
+
+    bus_scheduler.shutdown()
+    app.logger.info('Bus data scraper stopped')
+
+
+if __name__ == '__main__':
+    main()